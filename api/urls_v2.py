@@ -35,6 +35,9 @@ with api.register(r'courses',
     courses.register(r'submissiondata',
                      exercise.api.csv.views.CourseSubmissionDataViewSet,
                      base_name='course-submissiondata')
+    courses.register(r'submissionchanges',
+                     exercise.api.views.CourseSubmissionChangesViewSet,
+                     base_name='course-submissionchanges')
     courses.register(r'aggregatedata',
                      exercise.api.csv.views.CourseAggregateDataViewSet,
                      base_name='course-aggregatedata')
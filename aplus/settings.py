@@ -82,6 +82,11 @@ Request fields:
 {request_fields}
 """
 
+# Course hook delivery settings
+COURSE_HOOK_HTTP_TIMEOUT = 10
+COURSE_HOOK_RETRY_DELAY = 30 # seconds, doubled after each failed attempt
+COURSE_HOOK_MAX_ATTEMPTS = 10
+
 INSTALLED_APPS = (
     'django.contrib.contenttypes',
     'django.contrib.staticfiles',
@@ -142,6 +147,7 @@ SOCIAL_AUTH_USERNAME_IS_FULL_EMAIL = True
 ##########################################################################
 
 MIDDLEWARE_CLASSES = (
+    'lib.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -244,6 +250,47 @@ STATIC_ROOT = join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = join(BASE_DIR, 'media')
 
+# Submitted files are sent by Django (None), by Apache mod_xsendfile
+# ('xsendfile') or by nginx ('nginx') from the internal SENDFILE_URL
+# location that maps to MEDIA_ROOT.
+SENDFILE_MODE = None
+SENDFILE_URL = '/protected_media/'
+
+# New submitted files are stored once per content (sha256) and shared by
+# identical submissions. Existing files are moved to the content store
+# with the deduplicate_submitted_files management command.
+SUBMITTED_FILE_DEDUPLICATION = False
+
+# The submission change feed holds back changes younger than this many
+# seconds, so that transactions still running can not be skipped.
+SUBMISSION_CHANGES_DELAY = 10
+
+# Exercise service host names are resolved for grader authentication.
+# Addresses are refreshed in the background after DNS_CACHE_TTL seconds,
+# failed lookups are cached for DNS_FAILURE_CACHE_TTL seconds and a lookup
+# waits for the resolver at most DNS_RESOLVE_TIMEOUT seconds.
+DNS_CACHE_TTL = 30
+DNS_FAILURE_CACHE_TTL = 5
+DNS_RESOLVE_TIMEOUT = 2
+
+# Rendered tables of contents and results are cached for this many seconds.
+# The cache keys include the versions of the points and the content, so an
+# entry is never stale, only unused.
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Views of learning objects are saved in bulk when this many are waiting or,
+# at the end of a request, the oldest has waited this many seconds. A
+# crashing worker loses at most these. The last view per user and course is
+# cached for the front page.
+DISPLAY_BUFFER_SIZE = 100
+DISPLAY_BUFFER_SECONDS = 10
+DISPLAY_LAST_VIEW_TIMEOUT = 24 * 3600
+
+# Share of the requests profiled, from 0 (off) to 1. Each sampled request
+# is logged to aplus.profiling and summed per view in the profiling report
+# at /admin/profiling.
+PROFILING_SAMPLE_RATE = 0
+
 # Django REST Framework settings
 # http://www.django-rest-framework.org/api-guide/settings/
 REST_FRAMEWORK = {
@@ -12,6 +12,7 @@ $(function() {
     $('[data-toggle="tooltip"]').tooltip();
     $('.menu-groups').aplusGroupSelect();
     $('.ajax-tail-list').aplusListTail();
+    $('.ajax-table-tail').aplusTableTail();
     $('.page-modal').aplusModalLink();
     $('.file-modal').aplusModalLink({file:true});
     $('.search-select').aplusSearchSelect();
@@ -310,6 +311,7 @@ $.fn.highlightCode = function(options) {
             }
             var c = modal.aplusModal("content", { content: data });
             c.find('.file-modal').aplusModalLink({file:true});
+            c.find('.ajax-table-tail').aplusTableTail();
             c.find('pre.hljs').highlightCode();
             modal.trigger("opened.aplus.modal");
           }
@@ -393,6 +395,69 @@ $.fn.highlightCode = function(options) {
   };
 })(jQuery, window, document);
 
+/**
+ * Ajax loaded table rows that follow the next page link of each page.
+ * The rows can be filtered once all of them are loaded.
+ */
+(function($, window, document, undefined) {
+  "use strict";
+
+  var pluginName = "aplusTableTail";
+  var defaults = {
+    more_selector: ".more-link",
+    link_selector: "a",
+    loader_selector: ".progress",
+    next_selector: "tr.next-page",
+    next_attr: "data-next-url",
+  };
+
+  function AplusTableTail(element, options) {
+    this.element = $(element);
+    this.settings = $.extend({}, defaults, options);
+    this.init();
+  }
+
+  $.extend(AplusTableTail.prototype, {
+
+    init: function() {
+      var settings = this.settings;
+      var body = this.element.find("tbody");
+      var tail = this.element.find(settings.more_selector);
+      var link = tail.find(settings.link_selector);
+      var loader = tail.find(settings.loader_selector);
+      body.find(settings.next_selector).remove();
+      link.on("click", function(event) {
+        event.preventDefault();
+        link.hide();
+        loader.removeClass("hide").show();
+        $.get(link.attr("href"), function(html) {
+          loader.hide();
+          var rows = $(html).filter("tr");
+          var next = rows.filter(settings.next_selector);
+          body.append(rows.not(settings.next_selector));
+          if (next.size() > 0) {
+            link.attr("href", next.attr(settings.next_attr)).show();
+          } else {
+            tail.hide();
+            body.closest("table").addClass("filtered-table").aplusTableFilter();
+          }
+        }).fail(function() {
+          loader.hide();
+          link.show();
+        });
+      });
+    }
+  });
+
+  $.fn[pluginName] = function(options) {
+    return this.each(function() {
+      if (!$.data(this, "plugin_" + pluginName)) {
+        $.data(this, "plugin_" + pluginName, new AplusTableTail(this, options));
+      }
+    });
+  };
+})(jQuery, window, document);
+
 /**
  * Multiple select as search and remove.
  */
@@ -0,0 +1,96 @@
+"""
+Measures the time and the peak memory use (RSS) of the export management
+command on a synthetic course. The course is generated with
+lib.testdata.generate_course into a temporary SQLite database, which is
+removed afterwards.
+
+Usage (from the project root):
+    python benchmarks/export.py [--submissions N] [--exercises N]
+        [--students N] [--workers N]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aplus.settings')
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def setup_django(db_path):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    import django
+    django.setup()
+
+
+def generate(args):
+    from django.db import connection
+    from lib.testdata import generate_course
+    course = generate_course(url='bench', students=args.students, modules=1,
+        chapters=1, exercises=args.exercises, groups=0, deviations=0,
+        notifications=0, tags=0, submissions=args.submissions)
+    connection.close()
+    return course.instance.id
+
+
+def export(args):
+    from django.core.management import call_command
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        call_command('export', 'course', str(args.instance), output=args.output,
+            gzip=args.gzip, workers=args.workers, verbosity=0, stdout=devnull)
+    print("workers={:d} gzip={!s:5} {:7.2f} s {:8.1f} MB peak RSS "
+          "({:.1f} MB largest worker) {:8.1f} MB output".format(
+        args.workers, args.gzip, time.time() - start, peak_rss_mb(),
+        peak_rss_mb(resource.RUSAGE_CHILDREN),
+        os.path.getsize(args.output) / 1024 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--submissions', type=int, default=500000)
+    parser.add_argument('--exercises', type=int, default=100)
+    parser.add_argument('--students', type=int, default=3000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--instance', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    parser.add_argument('--gzip', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.instance:
+        setup_django(args.db)
+        export(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'bench.sqlite3')
+        setup_django(db)
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        start = time.time()
+        instance = generate(args)
+        print("Generated {:d} submissions in {:.1f} s".format(
+            args.submissions, time.time() - start))
+        output = os.path.join(tmp, 'export.out')
+        for workers, compress in ((1, False), (1, True), (args.workers, False)):
+            # Fresh process per run, so that the peak RSS is not shared.
+            command = [sys.executable, __file__, '--db', db,
+                '--instance', str(instance), '--output', output,
+                '--workers', str(workers)]
+            if compress:
+                command.append('--gzip')
+            subprocess.check_call(command)
+
+
+if __name__ == '__main__':
+    main()
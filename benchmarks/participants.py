@@ -0,0 +1,102 @@
+"""
+Times the generation of the participant cache (CachedStudents) and the
+participants page on a large synthetic course. The course is generated
+with lib.testdata.generate_course into a temporary SQLite database, which
+is removed afterwards.
+
+Usage (from the project root):
+    python benchmarks/participants.py [--students N] [--tags N]
+        [--repeat N]
+"""
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aplus.settings')
+
+
+def setup_django(db_path):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    # Log every query of a case, however many there are.
+    connection.queries_log = collections.deque()
+
+
+def timed(function):
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+    return elapsed, len(queries)
+
+
+def run(course, repeat):
+    from django.core.cache import cache
+    from django.test import Client
+    from course.cache.students import CachedStudents
+    from lib.testdata import SYNTHETIC_PASSWORD
+
+    instance = course.instance
+    client = Client()
+    client.login(username=course.teacher.username, password=SYNTHETIC_PASSWORD)
+    url = instance.get_url('participants')
+
+    def page():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError("{} returned {:d}".format(url, response.status_code))
+
+    cases = (
+        ('CachedStudents generation', lambda: CachedStudents(instance)),
+        ('participants page (cold)', page),
+    )
+    for name, function in cases:
+        best = None
+        for i in range(repeat):
+            cache.clear()
+            result = timed(function)
+            if best is None or result[0] < best[0]:
+                best = result
+        print("{:28} {:9.1f} ms {:6d} queries".format(name, best[0] * 1000, best[1]))
+    students = CachedStudents(instance).students()
+    print("{:d} participants, {:d} distinct tag renders".format(
+        len(students), len(set(s['tags'] for s in students))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--tags', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.sqlite3'))
+        from django.core.management import call_command
+        from lib.testdata import generate_course
+        call_command('migrate', verbosity=0)
+        start = time.time()
+        course = generate_course(students=args.students, tags=args.tags,
+            modules=1, chapters=1, exercises=1, groups=0, deviations=0,
+            notifications=0, submissions=0)
+        print("Generated {:d} students and {:d} tags in {:.1f} s".format(
+            args.students, args.tags, time.time() - start))
+        run(course, args.repeat)
+        from exercise.exercise_models import display_buffer
+        display_buffer.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Measures the serialization cost per object of the API serializers with
+all fields, which include the hyperlinks, and with a sparse fieldset
+without them. The objects are generated into a temporary SQLite database,
+which is removed afterwards.
+
+Usage (from the project root):
+    python benchmarks/serializers.py [--objects N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aplus.settings')
+
+
+def setup_django(db_path):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    import django
+    django.setup()
+
+
+def generate(args):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from course.models import Course, CourseInstance, CourseModule, \
+        LearningObjectCategory
+    from exercise.models import BaseExercise, Submission
+
+    now = timezone.now()
+    course = Course.objects.create(name="Benchmark", code="B-1", url="bench")
+    instance = CourseInstance.objects.create(course=course, url="i",
+        instance_name="Benchmark", starting_time=now, ending_time=now)
+    module = CourseModule.objects.create(course_instance=instance, url="m",
+        name="Module", opening_time=now, closing_time=now)
+    category = LearningObjectCategory.objects.create(course_instance=instance,
+        name="Exercises")
+    exercises = [
+        BaseExercise.objects.create(course_module=module, category=category,
+            url="e{:d}".format(i), name="Exercise {:d}".format(i), order=i,
+            max_points=100)
+        for i in range(args.objects)
+    ]
+    user = User.objects.create(username="student", is_superuser=True)
+    for exercise in exercises:
+        submission = Submission.objects.create(exercise=exercise,
+            status='ready', grade=50, submission_data=[["answer", "42"]])
+        submission.submitters.add(user.userprofile)
+    return user
+
+
+def measure(serializer_class, queryset, user, query, repeat):
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIRequestFactory
+    request = Request(APIRequestFactory().get('/api/v2/' + query))
+    request.user = user
+    request.version = '2'
+    request.versioning_scheme = api_settings.DEFAULT_VERSIONING_CLASS()
+    objects = list(queryset)
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        serializer_class(objects, many=True, context={'request': request}).data
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(objects) * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--objects', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.sqlite3'))
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        user = generate(args)
+
+        from exercise.api.full_serializers import ExerciseSerializer, \
+            SubmissionSerializer
+        from exercise.models import BaseExercise, Submission
+        cases = (
+            ('ExerciseSerializer', ExerciseSerializer,
+                BaseExercise.objects.select_related(
+                    'course_module__course_instance__course'),
+                '?fields=id,display_name,name,max_points,max_submissions'),
+            ('SubmissionSerializer', SubmissionSerializer,
+                Submission.objects.select_related('exercise', 'grader')
+                    .prefetch_related('submitters', 'files'),
+                '?fields=id,submission_time,status,grade,feedback'),
+        )
+        for name, serializer_class, queryset, query in cases:
+            full = measure(serializer_class, queryset, user, '', args.repeat)
+            sparse = measure(serializer_class, queryset, user, query, args.repeat)
+            print("{:22} {:8.1f} us/object all fields  {:8.1f} us/object "
+                  "without hyperlinks ({:.1f}x)".format(
+                name, full, sparse, full / sparse))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Times the hot views, APIs and cache generations on a synthetic course and
+compares the times with a stored baseline. The course is generated with
+lib.testdata.generate_course into a temporary SQLite database, which is
+removed afterwards. Each page is timed with empty caches (cold) and again
+with the caches filled by the first request (warm).
+
+Usage (from the project root):
+    python benchmarks/suite.py [--students N] [--submissions N]
+        [--modules N] [--chapters N] [--exercises N] [--repeat N]
+        [--baseline FILE] [--save] [--tolerance FRACTION] [--min-ms MS]
+
+With --baseline the times are compared with the file and the exit status
+is 1 when any case runs more queries than in the baseline or is slower by
+more than the tolerance.
+With --save the times are written to the baseline file instead.
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aplus.settings')
+
+SIZES = ('students', 'submissions', 'modules', 'chapters', 'exercises')
+
+
+def setup_django(db_path):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    # Log every query of a case, however many there are.
+    connection.queries_log = collections.deque()
+
+
+def page_cases(course):
+    instance = course.instance
+    exercise = course.exercises[0]
+    api = '/api/v2/courses/{:d}/'.format(instance.id)
+    return (
+        ('front page', 'student', '/'),
+        ('course page', 'student', instance.get_absolute_url()),
+        ('exercise page', 'student', exercise.get_absolute_url()),
+        ('results', 'student', instance.get_url('results')),
+        ('all results', 'teacher', instance.get_url('all-results')),
+        ('participants', 'teacher', instance.get_url('participants')),
+        ('diploma list', 'teacher', '/diploma/list/{:d}/'.format(course.diploma.id)),
+        ('submission data CSV', 'teacher', api + 'submissiondata/?format=csv'),
+        ('aggregate data CSV', 'teacher', api + 'aggregatedata/?format=csv'),
+        ('points API', 'teacher', api + 'points/'),
+        ('my points API', 'student', api + 'points/me/'),
+    )
+
+
+def cache_cases(course):
+    from course.cache.menu import CachedTopMenu
+    from course.cache.students import CachedStudents
+    from exercise.cache.content import CachedContent
+    from exercise.cache.points import CachedPoints
+    instance = course.instance
+
+    def points():
+        CachedPoints(instance, course.student, CachedContent(instance))
+
+    return (
+        ('CachedContent', lambda: CachedContent(instance)),
+        ('CachedPoints', points),
+        ('CachedStudents', lambda: CachedStudents(instance)),
+        ('CachedTopMenu teacher', lambda: CachedTopMenu(course.teacher)),
+        ('CachedTopMenu student', lambda: CachedTopMenu(course.student)),
+    )
+
+
+def timed(function):
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+    return elapsed, len(queries)
+
+
+def run(course, repeat):
+    from django.core.cache import cache
+    from django.test import Client
+    from lib.testdata import SYNTHETIC_PASSWORD
+
+    clients = {}
+    for role, user in (('student', course.student), ('teacher', course.teacher)):
+        clients[role] = Client()
+        clients[role].login(username=user.username, password=SYNTHETIC_PASSWORD)
+
+    results = {}
+
+    def get(client, url):
+        response = client.get(url)
+        # A streamed response is generated only when it is read.
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def record(name, elapsed, queries):
+        best = results.get(name)
+        if best is None or elapsed < best['seconds']:
+            results[name] = {'seconds': elapsed, 'queries': queries}
+
+    for name, role, url in page_cases(course):
+        client = clients[role]
+        for i in range(repeat):
+            cache.clear()
+            response = []
+            record(name + ' (cold)', *timed(lambda: response.append(get(client, url))))
+            if response[0].status_code != 200:
+                raise RuntimeError("{} returned {:d}".format(url, response[0].status_code))
+            record(name + ' (warm)', *timed(lambda: get(client, url)))
+    for name, generate in cache_cases(course):
+        for i in range(repeat):
+            cache.clear()
+            record(name + ' generation', *timed(generate))
+    return results
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """
+    Prints the results next to the baseline and returns the names of the
+    cases that regressed: ran more queries or were slower by more than the
+    tolerance and min_ms milliseconds.
+    """
+    regressions = []
+    for name in sorted(results):
+        result = results[name]
+        line = "{:32} {:9.1f} ms {:6d} queries".format(
+            name, result['seconds'] * 1000, result['queries'])
+        old = baseline.get(name)
+        if old:
+            ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1.0
+            line += "  {:5.2f}x baseline ({:d} queries)".format(ratio, old['queries'])
+            slower = (result['seconds'] - old['seconds']) * 1000
+            if (ratio > 1 + tolerance and slower > min_ms) or \
+                    result['queries'] > old['queries']:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--students', type=int, default=3000)
+    parser.add_argument('--submissions', type=int, default=200000)
+    parser.add_argument('--modules', type=int, default=10)
+    parser.add_argument('--chapters', type=int, default=3)
+    parser.add_argument('--exercises', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help="JSON file of earlier results")
+    parser.add_argument('--save', action='store_true',
+        help="write the results to the baseline file")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+        help="allowed slowdown as a fraction of the baseline")
+    parser.add_argument('--min-ms', type=float, default=5,
+        help="slowdowns of fewer milliseconds are noise")
+    args = parser.parse_args()
+    if args.save and not args.baseline:
+        parser.error("--save requires --baseline")
+    sizes = {size: getattr(args, size) for size in SIZES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.sqlite3'))
+        from django.core.management import call_command
+        from lib.testdata import generate_course
+        call_command('migrate', verbosity=0)
+        start = time.time()
+        course = generate_course(groups=args.students // 10,
+            deviations=args.students // 10, notifications=args.students,
+            **sizes)
+        print("Generated {} in {:.1f} s".format(
+            ", ".join("{}={:d}".format(k, v) for k, v in sorted(sizes.items())),
+            time.time() - start))
+        results = run(course, args.repeat)
+        from exercise.exercise_models import display_buffer
+        display_buffer.flush()
+
+    baseline = {}
+    if args.baseline and not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored['sizes'] != sizes:
+            print("The baseline was measured with different sizes: {}".format(
+                stored['sizes']))
+        baseline = stored['results']
+    regressions = compare(results, baseline, args.tolerance, args.min_ms)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'sizes': sizes, 'results': results}, f, indent=2, sort_keys=True)
+        print("Saved the baseline to {}".format(args.baseline))
+    if regressions:
+        print("{:d} regression(s): {}".format(len(regressions), ", ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
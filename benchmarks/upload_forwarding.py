@@ -0,0 +1,92 @@
+"""
+Measures the peak memory use (RSS) of forwarding a large submitted file to
+an exercise service. Compares the multipart body built in memory by
+requests to the body streamed from the disk by lib.multipart.
+
+Usage (from the project root):
+    python benchmarks/upload_forwarding.py [--size MB]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class DiscardHandler(BaseHTTPRequestHandler):
+    """ Reads and discards the request body like a grader would store it. """
+
+    def do_POST(self):
+        left = int(self.headers.get('Content-Length', 0))
+        while left > 0:
+            left -= len(self.rfile.read(min(left, 64 * 1024)))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def forward(mode, url, path):
+    import requests
+    from lib.multipart import MultipartStream
+    data = {'key': ['value']}
+    before = peak_rss_mb()
+    start = time.time()
+    with open(path, 'rb') as f:
+        files = {'file1': (os.path.basename(path), f)}
+        if mode == 'stream':
+            body = MultipartStream(data, files)
+            response = requests.post(url, data=body,
+                headers={'Content-Type': body.content_type})
+        else:
+            response = requests.post(url, data=data, files=files)
+    response.raise_for_status()
+    print("{:<8s} {:8.1f} MB peak RSS ({:+.1f} MB) {:6.2f} s".format(
+        mode, peak_rss_mb(), peak_rss_mb() - before, time.time() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--size', type=int, default=200, help="File size in MB.")
+    parser.add_argument('--mode', choices=('requests', 'stream'), help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        forward(args.mode, args.url, args.path)
+        return
+
+    server = HTTPServer(('127.0.0.1', 0), DiscardHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{:d}/'.format(server.server_port)
+
+    with tempfile.NamedTemporaryFile(suffix='.zip') as f:
+        block = os.urandom(1024 * 1024)
+        for i in range(args.size):
+            f.write(block)
+        f.flush()
+        print("Forwarding a {:d} MB submission".format(args.size))
+        for mode in ('requests', 'stream'):
+            # Fresh process per mode, so that the peak RSS is not shared.
+            subprocess.check_call([sys.executable, __file__,
+                '--mode', mode, '--url', url, '--path', f.name])
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
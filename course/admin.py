@@ -7,6 +7,7 @@ from course.models import (
     Enrollment,
     StudentGroup,
     CourseHook,
+    CourseHookDelivery,
     CourseModule,
     LearningObjectCategory,
     UserTag,
@@ -62,6 +63,13 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_filter = ("course_instance",)
 
 
+class CourseHookDeliveryAdmin(admin.ModelAdmin):
+    list_display_links = ("id",)
+    list_display = ("id", "hook", "status", "attempts", "created_time",
+        "delivered_time", "response_time")
+    list_filter = ("status", "hook")
+
+
 class CourseModuleAdmin(admin.ModelAdmin):
     list_display_links = ("__str__",)
     list_display = ("course_instance", "__str__",
@@ -81,6 +89,7 @@ admin.site.register(CourseInstance, CourseInstanceAdmin)
 admin.site.register(Enrollment, EnrollmentAdmin)
 admin.site.register(StudentGroup)
 admin.site.register(CourseHook)
+admin.site.register(CourseHookDelivery, CourseHookDeliveryAdmin)
 admin.site.register(CourseModule, CourseModuleAdmin)
 admin.site.register(LearningObjectCategory, LearningObjectCategoryAdmin)
 admin.site.register(UserTag)
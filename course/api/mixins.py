@@ -33,3 +33,19 @@ class CourseModuleResourceMixin(CourseModuleBaseMixin, ApiResourceMixin):
             return CourseModule.objects.get(id=module_id, course_instance=self.instance)
         except CourseModule.DoesNotExist:
             return None
+
+
+def course_etag_parts(instance, content):
+    """
+    Returns the versions of the course instance and its cached content.
+    The course itself has no modification time, so the fields that the
+    responses show of it are included as they are.
+    """
+    return (
+        instance.last_modified,
+        content.created(),
+        instance.course.code,
+        instance.course.name,
+        instance.course.url,
+    )
+
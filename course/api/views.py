@@ -6,7 +6,7 @@ from rest_framework.reverse import reverse
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
 from lib.viewbase import BaseMixin
-from lib.api.mixins import ListSerializerMixin, MeUserMixin
+from lib.api.mixins import ConditionalGetMixin, ListSerializerMixin, MeUserMixin
 from lib.api.constants import REGEX_INT, REGEX_INT_ME
 from userprofile.models import UserProfile
 from userprofile.permissions import IsAdminOrUserObjIsSelf
@@ -20,6 +20,7 @@ from ..models import (
 from .mixins import (
     CourseResourceMixin,
     CourseModuleResourceMixin,
+    course_etag_parts,
 )
 from ..permissions import (
     OnlyCourseTeacherPermission,
@@ -29,7 +30,8 @@ from .serializers import *
 from .full_serializers import *
 
 
-class CourseViewSet(ListSerializerMixin,
+class CourseViewSet(ConditionalGetMixin,
+                    ListSerializerMixin,
                     CourseResourceMixin,
                     viewsets.ReadOnlyModelViewSet):
     lookup_url_kwarg = 'course_id'
@@ -45,8 +47,14 @@ class CourseViewSet(ListSerializerMixin,
     def get_object(self):
         return self.get_member_object('instance', 'Course')
 
+    def get_etag_parts(self):
+        if self.action == 'retrieve' and hasattr(self, 'instance'):
+            return course_etag_parts(self.instance, self.content)
+        return None
 
-class CourseExercisesViewSet(NestedViewSetMixin,
+
+class CourseExercisesViewSet(ConditionalGetMixin,
+                             NestedViewSetMixin,
                              CourseModuleResourceMixin,
                              CourseResourceMixin,
                              viewsets.ReadOnlyModelViewSet):
@@ -63,6 +71,12 @@ class CourseExercisesViewSet(NestedViewSetMixin,
     def get_object(self):
         return self.get_member_object('module', 'Exercise module')
 
+    def get_etag_parts(self):
+        if not hasattr(self, 'instance'):
+            return None
+        return (course_etag_parts(self.instance, self.content)
+                + self.content.module_states())
+
 
 class CourseStudentsViewSet(NestedViewSetMixin,
                             MeUserMixin,
@@ -107,7 +121,8 @@ class CourseUsertaggingsViewSet(NestedViewSetMixin,
     queryset = ( UserTagging.objects
                  .select_related('tag', 'user', 'user__user')
                  .only('tag__id', 'tag__course_instance',
-                       'user__user__id', 'user__user__username', 'user__student_id',
+                       'user__user__id', 'user__user__username', 'user__user__email',
+                       'user__student_id',
                        'course_instance__id')
                  .all() )
     parent_lookup_map = {'course_id': 'course_instance_id'}
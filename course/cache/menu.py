@@ -1,7 +1,9 @@
+from django.db.models import Prefetch, Q
 from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.utils import timezone
 
 from lib.cached import CachedAbstract
+from userprofile.models import UserProfile
 from ..models import StudentGroup, Enrollment, CourseInstance, Course
 from ..renders import render_group_info
 
@@ -35,16 +37,18 @@ class CachedTopMenu(CachedAbstract):
             }
 
         enrolled = []
-        for instance in profile.enrolled.all():
+        for instance in profile.enrolled.select_related('course').order_by('id'):
             enrolled.append(course_entry(instance))
 
         teaching = []
-        for course in profile.teaching_courses.all():
-            for instance in course.instances.all():
-                teaching.append(course_entry(instance))
+        for instance in CourseInstance.objects\
+                .filter(course__teachers=profile)\
+                .select_related('course')\
+                .order_by('course_id', 'id'):
+            teaching.append(course_entry(instance))
 
         assisting = []
-        for instance in profile.assisting_courses.all():
+        for instance in profile.assisting_courses.select_related('course').order_by('id'):
             assisting.append(course_entry(instance))
 
         courses = []
@@ -64,23 +68,37 @@ class CachedTopMenu(CachedAbstract):
         def group_entry(group):
             return {
                 'id': group.id,
-                'size': group.members.count(),
+                'size': len(group.members.all()),
                 'collaborators': group.collaborator_names(profile),
             }
 
+        selected = dict(
+            Enrollment.objects.filter(user_profile=profile)
+            .values_list('course_instance_id', 'selected_group_id')
+        )
+        groups = {}
+        member_of = {}
+        for group in StudentGroup.objects\
+                .filter(course_instance_id__in=list(selected))\
+                .filter(Q(members=profile) | Q(id__in=[
+                    g for g in selected.values() if g is not None
+                ]))\
+                .distinct()\
+                .prefetch_related(Prefetch('members',
+                    queryset=UserProfile.objects.select_related('user'))):
+            groups[group.id] = group
+            if profile in group.members.all():
+                member_of.setdefault(group.course_instance_id, []).append(group)
+
+        # The same group info is rendered for every enrollment without a group.
+        rendered = {}
         group_map = {}
-        for enrollment in Enrollment.objects\
-                .filter(user_profile=profile)\
-                .select_related('selected_group')\
-                .prefetch_related('selected_group__members'):
-            instance_id = enrollment.course_instance_id
+        for instance_id, group_id in selected.items():
+            if group_id not in rendered:
+                rendered[group_id] = render_group_info(groups.get(group_id), profile)
             group_map[instance_id] = (
-                [
-                    group_entry(g) for g in profile.groups\
-                        .filter(course_instance_id=instance_id)\
-                        .prefetch_related('members')
-                ],
-                render_group_info(enrollment.selected_group, profile)
+                [group_entry(g) for g in member_of.get(instance_id, [])],
+                rendered[group_id],
             )
         return group_map
 
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 
 from lib.cached import CachedAbstract
@@ -12,23 +13,30 @@ class CachedStudents(CachedAbstract):
         super().__init__(course_instance)
 
     def _generate_data(self, instance, data=None):
-        participants = instance.students.all()\
-            .prefetch_related('taggings')
+        participants = instance.students.all().select_related('user')
+        if settings.SOCIAL_AUTH:
+            participants = participants.prefetch_related('user__social_auth')
+        user_tags = {}
+        for tagging in UserTagging.objects.filter(course_instance=instance)\
+                .select_related('tag'):
+            user_tags.setdefault(tagging.user_id, []).append(tagging.tag)
+        # Most participants share one of a few tag sets.
+        rendered = {}
         data = []
         for participant in participants:
-            tags = [
-                t.tag for t in participant.taggings.all()
-                if t.course_instance == instance
-            ]
+            tags = user_tags.get(participant.id, [])
+            key = (participant.is_external, tuple(t.id for t in tags))
+            if key not in rendered:
+                rendered[key] = render_tags(participant, tags)
             data.append({
                 'id': participant.student_id or '',
                 'last_name': participant.user.last_name or '',
                 'first_name': participant.user.first_name or '',
                 'email': participant.user.email or participant.user.username,
                 'link': participant.get_url(instance),
-                'tags': render_tags(participant, tags),
+                'tags': rendered[key],
                 'tag_ids': [t.id for t in tags],
-                'external': participant.is_external,
+                'external': key[0],
             })
         return {
             'students': data,
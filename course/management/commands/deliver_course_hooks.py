@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand
+
+from course.models import CourseHook, CourseHookDelivery
+
+
+class Command(BaseCommand):
+    help = "Deliver queued course hook events to the hook urls."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-l', '--loop', metavar="SECONDS", type=int, default=0,
+                            help="Keep running and deliver due events every SECONDS.")
+        parser.add_argument('-n', '--limit', type=int, default=1000,
+                            help="Maximum number of events handled in one round.")
+        parser.add_argument('-s', '--stats', action='store_true',
+                            help="Print delivery metrics per hook and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        while True:
+            delivered, failed = CourseHookDelivery.objects.deliver_due(options['limit'])
+            if delivered or failed:
+                self.stdout.write("Delivered {:d} and failed {:d} hook events."
+                    .format(delivered, failed))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def print_stats(self):
+        STATUS = CourseHookDelivery.STATUS
+        stats = CourseHookDelivery.objects.stats()
+        for hook in CourseHook.objects.filter(id__in=stats.keys()):
+            entry = stats[hook.id]
+            self.stdout.write(
+                "{}\n  pending {:d}, delivered {:d}, failed {:d}, attempts {:d}, "
+                "response time avg {} max {}".format(
+                    hook,
+                    entry.get(STATUS.PENDING, 0),
+                    entry.get(STATUS.DELIVERED, 0),
+                    entry.get(STATUS.FAILED, 0),
+                    entry['attempts'],
+                    self.format_time(entry['avg_response_time']),
+                    self.format_time(entry['max_response_time']),
+                )
+            )
+
+    def format_time(self, seconds):
+        return "-" if seconds is None else "{:.3f}s".format(seconds)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from course.models import Course
+from lib.testdata import SYNTHETIC_PASSWORD, generate_course
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic course instance with students and submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help="URL of the new course, also prefixes the user names")
+        for name, default in (
+                ('students', 3000),
+                ('modules', 10),
+                ('chapters', 3),
+                ('exercises', 5),
+                ('categories', 3),
+                ('groups', 300),
+                ('deviations', 300),
+                ('notifications', 3000),
+                ('tags', 5),
+                ('submissions', 200000),
+                ('seed', 1)):
+            parser.add_argument('--' + name, type=int, default=default)
+
+    def handle(self, *args, **options):
+        url = options['url']
+        if Course.objects.filter(url=url).exists():
+            raise CommandError("Course {} already exists.".format(url))
+        sizes = { k: options[k] for k in (
+            'students', 'modules', 'chapters', 'exercises', 'categories',
+            'groups', 'deviations', 'notifications', 'tags', 'submissions',
+            'seed') }
+        course = generate_course(url=url, **sizes)
+        self.stdout.write("Generated {} with {:d} exercises, {:d} students and "
+            "{:d} submissions. Users {}-teacher, {}-assistant and {}-s0... "
+            "have the password {}.".format(
+                course.instance.get_absolute_url(), len(course.exercises),
+                len(course.student_profile_ids), course.submissions,
+                url, url, url, SYNTHETIC_PASSWORD))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 22:01
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import lib.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0037_auto_20180108_1850'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseHookDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', lib.fields.JSONField(blank=True)),
+                ('status', models.CharField(choices=[('delivered', 'Delivered'), ('failed', 'Failed'), ('pending', 'Pending')], default='pending', max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('delivered_time', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('response_time', models.FloatField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='coursehook',
+            name='batch_size',
+            field=models.PositiveIntegerField(default=1, help_text='Maximum number of queued events posted in a single request. Each event adds its own values, e.g. submission_id, to the POST.'),
+        ),
+        migrations.AddField(
+            model_name='coursehookdelivery',
+            name='hook',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='course.CourseHook'),
+        ),
+        migrations.AlterIndexTogether(
+            name='coursehookdelivery',
+            index_together=set([('status', 'next_attempt_time')]),
+        ),
+    ]
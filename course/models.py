@@ -1,6 +1,8 @@
 import datetime
 import logging
+import time
 import urllib.request, urllib.parse
+from collections import OrderedDict
 
 from django.conf import settings
 from django.contrib import messages
@@ -9,7 +11,8 @@ from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Sum, Avg, Max
+from django.db.models.expressions import RawSQL
 from django.db.models.signals import post_save
 from django.utils import timezone
 from django.utils.functional import cached_property
@@ -18,7 +21,7 @@ from colorfield.fields import ColorField
 
 from apps.models import BaseTab, BasePlugin
 from lib.email_messages import email_course_error
-from lib.fields import PercentField
+from lib.fields import JSONField, PercentField
 from lib.helpers import (
     safe_file_name,
     resize_image,
@@ -98,7 +101,7 @@ class StudentGroup(models.Model):
         for group in cls.objects.filter(
             course_instance=course_instance,
             members=member_profiles[0]
-        ):
+        ).prefetch_related('members'):
             if group.equals(member_profiles):
                 return group
         return None
@@ -145,6 +148,83 @@ def create_enrollment_code(sender, instance, created, **kwargs):
 post_save.connect(create_enrollment_code, sender=Enrollment)
 
 
+def remember_course_roles(user):
+    """
+    Makes the course instances remember the roles of the user object for
+    the rest of the request. Anything remembered for the object before is
+    forgotten, as the same object may serve many requests, e.g. in tests.
+    Roles of other user objects are always queried.
+    """
+    if user is not None:
+        user._course_roles = {}
+
+
+class CourseRoles(object):
+    """
+    The relations of a user to a course instance, resolved with one query.
+    """
+
+    def __init__(self, instance, user):
+        self.instance = instance
+        self.is_teacher = False
+        self.is_assistant = False
+        self.enrollment_id = None
+        self.selected_group_id = None
+        self._enrollment = None
+        if not user or not user.is_authenticated():
+            return
+        if not isinstance(user, User):
+            # Graders are not members of the course.
+            self.is_teacher = instance.course.is_teacher(user)
+            return
+        profile_id = user.userprofile.id
+        teachers = Course.teachers.through._meta
+        assistants = CourseInstance.assistants.through._meta
+        enrollments = Enrollment._meta
+        enrollment = lambda column: RawSQL(
+            "SELECT MIN({}) FROM {} WHERE {} = %s AND {} = %s".format(
+                column,
+                enrollments.db_table,
+                enrollments.get_field('course_instance').column,
+                enrollments.get_field('user_profile').column),
+            (instance.id, profile_id))
+        self.is_teacher, self.is_assistant, self.enrollment_id, self.selected_group_id = (
+            CourseInstance.objects.filter(id=instance.id).annotate(
+                teacher=RawSQL(
+                    "SELECT COUNT(*) FROM {} WHERE {} = %s AND {} = %s".format(
+                        teachers.db_table,
+                        teachers.get_field('course').column,
+                        teachers.get_field('userprofile').column),
+                    (instance.course_id, profile_id)),
+                assistant=RawSQL(
+                    "SELECT COUNT(*) FROM {} WHERE {} = %s AND {} = %s".format(
+                        assistants.db_table,
+                        assistants.get_field('courseinstance').column,
+                        assistants.get_field('userprofile').column),
+                    (instance.id, profile_id)),
+                enrollment_id=enrollment('id'),
+                selected_group_id=enrollment(
+                    enrollments.get_field('selected_group').column),
+            ).values_list('teacher', 'assistant', 'enrollment_id', 'selected_group_id').get()
+        )
+        self.is_teacher = user.is_superuser or self.is_teacher > 0
+        self.is_assistant = self.is_assistant > 0
+
+    @property
+    def is_student(self):
+        return self.enrollment_id is not None
+
+    @property
+    def is_course_staff(self):
+        return self.is_teacher or self.is_assistant
+
+    @property
+    def enrollment(self):
+        if self._enrollment is None and self.enrollment_id is not None:
+            self._enrollment = Enrollment.objects.get(id=self.enrollment_id)
+        return self._enrollment
+
+
 class UserTag(UrlMixin, models.Model):
     name = models.CharField(max_length=200)
     course_instance = models.ForeignKey('CourseInstance', related_name="usertags", on_delete=models.CASCADE)
@@ -173,6 +253,16 @@ class UserTaggingManager(models.Manager):
             .select_related('tag')
         return [t.tag for t in ts]
 
+    def prefetch(self, lookup, course_instance):
+        """
+        Returns a Prefetch of the taggings in the course instance for the
+        profiles at the lookup ending in 'taggings'. The tags template tag
+        uses the prefetched taggings instead of querying them per profile.
+        """
+        return models.Prefetch(lookup,
+            queryset=self.filter(course_instance=course_instance).select_related('tag'),
+            to_attr='instance_taggings')
+
     def set(self, profile, tag):
         self.get_or_create(
             tag=tag,
@@ -372,27 +462,25 @@ class CourseInstance(UrlMixin, models.Model):
         if self.image:
             resize_image(self.image.path, (800,600))
 
+    def get_roles(self, user):
+        remembered = getattr(user, '_course_roles', None)
+        if remembered is None:
+            return CourseRoles(self, user)
+        if self.id not in remembered:
+            remembered[self.id] = CourseRoles(self, user)
+        return remembered[self.id]
+
     def is_assistant(self, user):
-        return (
-            user and
-            user.is_authenticated() and
-            isinstance(user, User) and
-            self.assistants.filter(id=user.userprofile.id).exists()
-        )
+        return self.get_roles(user).is_assistant
 
     def is_teacher(self, user):
-        return self.course.is_teacher(user)
+        return self.get_roles(user).is_teacher
 
     def is_course_staff(self, user):
-        return self.is_teacher(user) or self.is_assistant(user)
+        return self.get_roles(user).is_course_staff
 
     def is_student(self, user):
-        return (
-            user and
-            user.is_authenticated() and
-            isinstance(user, User) and
-            self.students.filter(id=user.userprofile.id).exists()
-        )
+        return self.get_roles(user).is_student
 
     def is_enrollable(self, user):
         if user and user.is_authenticated():
@@ -406,12 +494,13 @@ class CourseInstance(UrlMixin, models.Model):
     def enroll_student(self, user):
         if user and user.is_authenticated():
             Enrollment.objects.get_or_create(course_instance=self, user_profile=user.userprofile)
+            getattr(user, '_course_roles', {}).pop(self.id, None)
 
     def tag_user(self, user, tag):
         UserTagging.objects.create(tag=tag, user=user.userprofile, course_instance=self)
 
     def get_enrollment_for(self, user):
-        return Enrollment.objects.filter(course_instance=self, user_profile=user.userprofile).first()
+        return self.get_roles(user).enrollment
 
     def get_user_tags(self, user):
         return self.taggings.filter(user=user.uesrprofile).select_related('tag')
@@ -492,8 +581,9 @@ class CourseHook(models.Model):
     action. Currently only hook implemented is post-grading, i.e. after a
     student submission has been successfully graded by the external service.
 
-    When a hook is triggered it will do a HTTP POST to a defined URL
-    passing along data (e.g. submission id).
+    When a hook is triggered the data (e.g. submission id) is queued and
+    later delivered as a HTTP POST to a defined URL by the
+    deliver_course_hooks management command.
     """
 
     HOOK_CHOICES = (
@@ -503,20 +593,158 @@ class CourseHook(models.Model):
     hook_url = models.URLField()
     hook_type = models.CharField(max_length=12, choices=HOOK_CHOICES, default="post-grading")
     course_instance = models.ForeignKey(CourseInstance, related_name="course_hooks")
+    batch_size = models.PositiveIntegerField(default=1,
+        help_text=_("Maximum number of queued events posted in a single request. "
+            "Each event adds its own values, e.g. submission_id, to the POST."))
 
     def __str__(self):
         return "{} -> {}".format(self.course_instance, self.hook_url)
 
     def trigger(self, data):
+        """
+        Queues the data for an asynchronous delivery to the hook url.
+        """
+        CourseHookDelivery.objects.create(hook=self, data=data)
+
+    def post(self, data_list):
+        """
+        Posts the data dictionaries to the hook url in a single request.
+        Raises an exception when the delivery fails.
+        """
+        params = [(key, value) for data in data_list for key, value in sorted(data.items())]
+        response = urllib.request.urlopen(self.hook_url,
+            urllib.parse.urlencode(params).encode('utf-8'),
+            timeout=settings.COURSE_HOOK_HTTP_TIMEOUT)
+        response.close()
+
+
+class CourseHookDeliveryManager(models.Manager):
+
+    def due(self, when=None):
+        when = when or timezone.now()
+        return self.filter(
+            status=CourseHookDelivery.STATUS.PENDING,
+            next_attempt_time__lte=when,
+        )
+
+    def deliver_due(self, limit=None):
+        """
+        Posts the due deliveries in batches per hook. Failed batches are
+        rescheduled with an exponential backoff and the rest of the hook's
+        deliveries wait for the next round. Returns (delivered, failed).
+        """
+        deliveries = self.due().select_related('hook', 'hook__course_instance')\
+            .order_by('id')
+        if limit:
+            deliveries = deliveries[:limit]
+
+        batches = OrderedDict()
+        for delivery in deliveries:
+            hook_batches = batches.setdefault(delivery.hook_id, [[]])
+            if len(hook_batches[-1]) >= max(delivery.hook.batch_size, 1):
+                hook_batches.append([])
+            hook_batches[-1].append(delivery)
+
+        delivered = failed = 0
+        for hook_batches in batches.values():
+            for batch in hook_batches:
+                if self._deliver_batch(batch):
+                    delivered += len(batch)
+                else:
+                    failed += len(batch)
+                    break
+        return delivered, failed
+
+    def _deliver_batch(self, batch):
         logger = logging.getLogger("plus.hooks")
+        hook = batch[0].hook
+        start = time.time()
         try:
-            urllib.request.urlopen(self.hook_url,
-                urllib.parse.urlencode(data).encode('utf-8'), timeout=10)
-            logger.info("%s posted to %s on %s with %s",
-                        self.hook_type, self.hook_url, self.course_instance, data)
-        except:
-            logger.error("HTTP POST failed on %s hook to %s (%s)",
-                         self.hook_type, self.hook_url, self.course_instance)
+            hook.post([d.data or {} for d in batch])
+        except Exception as e:
+            response_time = time.time() - start
+            logger.warning("HTTP POST failed on %s hook to %s (%s): %s",
+                hook.hook_type, hook.hook_url, hook.course_instance, e)
+            for delivery in batch:
+                delivery.set_failed_attempt(str(e), response_time)
+                delivery.save()
+            return False
+        response_time = time.time() - start
+        logger.info("%s posted to %s on %s with %d events",
+            hook.hook_type, hook.hook_url, hook.course_instance, len(batch))
+        self.filter(id__in=[d.id for d in batch]).update(
+            status=CourseHookDelivery.STATUS.DELIVERED,
+            attempts=models.F('attempts') + 1,
+            delivered_time=timezone.now(),
+            response_time=response_time,
+            last_error="",
+        )
+        return True
+
+    def stats(self):
+        """
+        Returns delivery metrics per hook id.
+        """
+        stats = {}
+        for row in self.values('hook_id', 'status').annotate(
+                count=Count('id'),
+                attempts=Sum('attempts'),
+                avg_response_time=Avg('response_time'),
+                max_response_time=Max('response_time')):
+            entry = stats.setdefault(row['hook_id'], {
+                'attempts': 0,
+                'avg_response_time': None,
+                'max_response_time': None,
+            })
+            entry[row['status']] = row['count']
+            entry['attempts'] += row['attempts'] or 0
+            if row['status'] == CourseHookDelivery.STATUS.DELIVERED:
+                entry['avg_response_time'] = row['avg_response_time']
+                entry['max_response_time'] = row['max_response_time']
+        return stats
+
+
+class CourseHookDelivery(models.Model):
+    """
+    Stores a triggered hook event until it has been delivered to the hook url.
+    """
+    STATUS = Enum([
+        ('PENDING', 'pending', _("Pending")),
+        ('DELIVERED', 'delivered', _("Delivered")),
+        ('FAILED', 'failed', _("Failed")),
+    ])
+    hook = models.ForeignKey(CourseHook, related_name="deliveries",
+        on_delete=models.CASCADE)
+    data = JSONField(blank=True)
+    status = models.CharField(max_length=32,
+        choices=STATUS.choices, default=STATUS.PENDING)
+    created_time = models.DateTimeField(auto_now_add=True)
+    next_attempt_time = models.DateTimeField(default=timezone.now)
+    delivered_time = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    response_time = models.FloatField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = CourseHookDeliveryManager()
+
+    class Meta:
+        ordering = ['id']
+        index_together = (
+            ('status', 'next_attempt_time'),
+        )
+
+    def __str__(self):
+        return "{} {}: {}".format(self.hook, self.status, self.data)
+
+    def set_failed_attempt(self, error, response_time=None):
+        self.attempts += 1
+        self.last_error = error
+        self.response_time = response_time
+        if self.attempts >= settings.COURSE_HOOK_MAX_ATTEMPTS:
+            self.status = self.STATUS.FAILED
+        else:
+            delay = settings.COURSE_HOOK_RETRY_DELAY * 2 ** (self.attempts - 1)
+            self.next_attempt_time = timezone.now() + datetime.timedelta(seconds=delay)
 
 
 class CourseModuleManager(models.Manager):
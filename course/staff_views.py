@@ -8,7 +8,7 @@ from lib.helpers import settings_text
 from lib.viewbase import BaseFormView, BaseTemplateView, BaseRedirectMixin
 from .cache.students import CachedStudents
 from .forms import GroupEditForm
-from .models import StudentGroup
+from .models import StudentGroup, UserTagging
 from .viewbase import CourseInstanceBaseView, CourseInstanceMixin
 
 
@@ -34,7 +34,9 @@ class GroupsView(CourseInstanceBaseView):
 
     def get_common_objects(self):
         super().get_common_objects()
-        self.groups = list(self.instance.groups.all())
+        self.groups = list(self.instance.groups.prefetch_related(
+            'members__user',
+            UserTagging.objects.prefetch('members__taggings', self.instance)))
         self.note('groups')
 
 
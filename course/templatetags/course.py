@@ -93,4 +93,7 @@ def profiles(profiles, instance):
 
 @register.inclusion_tag("course/_tags.html")
 def tags(profile, instance):
-    return tags_context(profile, profile.taggings.tags_for_instance(instance))
+    taggings = getattr(profile, 'instance_taggings', None)
+    if taggings is None:
+        return tags_context(profile, profile.taggings.tags_for_instance(instance))
+    return tags_context(profile, [t.tag for t in taggings])
@@ -1,15 +1,23 @@
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.db import connection
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from course.models import Course, CourseInstance, CourseHook, CourseModule, \
-    LearningObjectCategory, StudentGroup
+from course.models import Course, CourseInstance, CourseHook, \
+    CourseHookDelivery, CourseModule, Enrollment, LearningObjectCategory, \
+    StudentGroup, UserTag, UserTagging
+from course.cache.menu import CachedTopMenu
+from course.cache.students import CachedStudents
 from exercise.models import BaseExercise, Submission
 from exercise.exercise_models import LearningObject
+from lib import query_budget
+from lib.query_budget import Budget, Route
 
 
 class CourseTest(TestCase):
@@ -243,6 +251,56 @@ class CourseTest(TestCase):
     def test_course_hook_unicode_string(self):
         self.assertEquals("123456 test course: Fall 2011 day 1 -> test_hook_url", str(self.course_hook))
 
+    def test_course_hook_delivery(self):
+        self.submission.set_ready()
+        self.submission.save()
+        delivery = CourseHookDelivery.objects.get(hook=self.course_hook)
+        self.assertEqual(delivery.status, CourseHookDelivery.STATUS.PENDING)
+        self.assertEqual(delivery.data, {"submission_id": self.submission.id})
+
+        with patch('course.models.urllib.request.urlopen', side_effect=IOError("down")) as urlopen:
+            self.assertEqual(CourseHookDelivery.objects.deliver_due(), (0, 1))
+            self.assertEqual(urlopen.call_count, 1)
+            delivery.refresh_from_db()
+            self.assertEqual(delivery.status, CourseHookDelivery.STATUS.PENDING)
+            self.assertEqual(delivery.attempts, 1)
+            self.assertEqual(delivery.last_error, "down")
+            self.assertTrue(delivery.next_attempt_time > self.today)
+            self.assertEqual(CourseHookDelivery.objects.deliver_due(), (0, 0))
+            self.assertEqual(urlopen.call_count, 1)
+
+        CourseHookDelivery.objects.update(next_attempt_time=self.today)
+        with patch('course.models.urllib.request.urlopen') as urlopen:
+            self.assertEqual(CourseHookDelivery.objects.deliver_due(), (1, 0))
+            self.assertEqual(urlopen.call_args[0][0], "test_hook_url")
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, CourseHookDelivery.STATUS.DELIVERED)
+        self.assertEqual(delivery.attempts, 2)
+
+        stats = CourseHookDelivery.objects.stats()[self.course_hook.id]
+        self.assertEqual(stats[CourseHookDelivery.STATUS.DELIVERED], 1)
+        self.assertEqual(stats['attempts'], 2)
+
+    def test_course_hook_delivery_batches(self):
+        self.course_hook.batch_size = 2
+        self.course_hook.save()
+        for i in range(3):
+            self.course_hook.trigger({"submission_id": i})
+        with patch('course.models.urllib.request.urlopen') as urlopen:
+            self.assertEqual(CourseHookDelivery.objects.deliver_due(), (3, 0))
+            self.assertEqual(urlopen.call_count, 2)
+            self.assertEqual(urlopen.call_args_list[0][0][1], b"submission_id=0&submission_id=1")
+            self.assertEqual(urlopen.call_args_list[1][0][1], b"submission_id=2")
+
+    def test_course_hook_delivery_gives_up(self):
+        self.course_hook.trigger({"submission_id": 1})
+        delivery = CourseHookDelivery.objects.get(hook=self.course_hook)
+        with self.settings(COURSE_HOOK_MAX_ATTEMPTS=2):
+            delivery.set_failed_attempt("error")
+            self.assertEqual(delivery.status, CourseHookDelivery.STATUS.PENDING)
+            delivery.set_failed_attempt("error")
+            self.assertEqual(delivery.status, CourseHookDelivery.STATUS.FAILED)
+
     def test_course_module_late_submission_point_worth(self):
         self.assertEquals(0, self.course_module.get_late_submission_point_worth())
         self.assertEquals(80, self.course_module_with_late_submissions_allowed.get_late_submission_point_worth())
@@ -328,3 +386,111 @@ class CourseTest(TestCase):
             [self.user.userprofile,self.grader.userprofile]), group)
         self.assertEqual(StudentGroup.get_exact(self.current_course_instance,
             [self.user.userprofile,self.superuser.userprofile]), None)
+
+    def test_top_menu_queries(self):
+        profile = self.user.userprofile
+        self.grader.first_name = "Grace"
+        self.grader.last_name = "Grader"
+        self.grader.save()
+
+        def generate():
+            CachedTopMenu.invalidate(self.user)
+            with CaptureQueriesContext(connection) as queries:
+                menu = CachedTopMenu(self.user)
+            return menu, len(queries)
+
+        self.current_course_instance.enroll_student(self.user)
+        StudentGroup.objects.create(course_instance=self.current_course_instance)\
+            .members.add(profile, self.grader.userprofile)
+        menu, few = generate()
+        self.assertEqual(len(menu.groups(self.current_course_instance)[0]), 1)
+
+        for i in range(3):
+            course = Course.objects.create(name="Course {:d}".format(i),
+                code="C-{:d}".format(i), url="c{:d}".format(i))
+            course.teachers.add(profile)
+            for j in range(2):
+                instance = CourseInstance.objects.create(course=course,
+                    instance_name="Instance {:d}".format(j), url="i{:d}".format(j),
+                    starting_time=self.today, ending_time=self.tomorrow)
+                instance.assistants.add(profile)
+                instance.enroll_student(self.user)
+                group = StudentGroup.objects.create(course_instance=instance)
+                group.members.add(profile, self.grader.userprofile)
+        enrollment = Enrollment.objects.get(course_instance=instance, user_profile=profile)
+        enrollment.selected_group = group
+        enrollment.save()
+
+        menu, many = generate()
+        self.assertEqual(many, few)
+        self.assertLessEqual(many, 6)
+        names = [c['name'] for c in menu.courses() if 'name' in c]
+        self.assertEqual(len(names), 1 + 6 + 6 + 6)
+        self.assertEqual(names[7], "C-0 Course 0: Instance 0")
+        entries, info = menu.groups(instance)
+        self.assertEqual(entries, [{
+            'id': group.id,
+            'size': 2,
+            'collaborators': "Grace Grader",
+        }])
+        self.assertIn("Grace Grader", info)
+        self.assertIn('data-group-id="{:d}"'.format(group.id), info)
+        entries, info = menu.groups(self.current_course_instance)
+        self.assertIn('data-group-id="0"', info)
+
+    def test_cached_students(self):
+        instance = self.current_course_instance
+        tag = UserTag.objects.create(course_instance=instance, name="Current")
+        other = UserTag.objects.create(course_instance=self.future_course_instance,
+            name="Other")
+        instance.enroll_student(self.user)
+        UserTagging.objects.set(self.user.userprofile, tag)
+        UserTagging.objects.set(self.user.userprofile, other)
+
+        def generate():
+            CachedStudents.invalidate(instance)
+            with CaptureQueriesContext(connection) as queries:
+                students = CachedStudents(instance).students()
+            return students, len(queries)
+
+        students, few = generate()
+        self.assertEqual(students[0]['tag_ids'], [tag.id])
+        self.assertIn("Current", students[0]['tags'])
+        self.assertNotIn("Other", students[0]['tags'])
+
+        for i in range(5):
+            user = User.objects.create(username="student{:d}".format(i))
+            instance.enroll_student(user)
+            if i % 2:
+                UserTagging.objects.set(user.userprofile, tag)
+        students, many = generate()
+        self.assertEqual(many, few)
+        self.assertEqual(len(students), 6)
+        self.assertEqual(
+            sorted(len(s['tag_ids']) for s in students), [0, 0, 0, 1, 1, 1])
+
+
+class CourseQueryBudgetTest(query_budget.QueryBudgetTestCase):
+    routes = (
+        Route("front page", 'student', lambda c: '/',
+            Budget(4), Budget(11)),
+        Route("course", 'student', lambda c: c.instance.get_absolute_url(),
+            Budget(8), Budget(22, learning_objects=3)),
+        Route("module", 'student', lambda c: c.modules[0].get_absolute_url(),
+            Budget(10), Budget(23, learning_objects=3)),
+        Route("groups", 'student', lambda c: c.instance.get_url('groups'),
+            Budget(10), Budget(23, learning_objects=3)),
+        Route("participants", 'teacher', lambda c: c.instance.get_url('participants'),
+            Budget(9), Budget(20, learning_objects=3)),
+        Route("groups list", 'teacher', lambda c: c.instance.get_url('groups-list'),
+            Budget(11), Budget(20, learning_objects=3)),
+        Route("user tags", 'teacher', lambda c: c.instance.get_url('course-tags'),
+            Budget(9), Budget(18, learning_objects=3)),
+        Route("diploma list", 'teacher',
+            lambda c: reverse('diploma-list', kwargs={'coursediploma_id': c.diploma.id}),
+            Budget(10), Budget(22, learning_objects=3)),
+        Route("enrollment admin", 'superuser',
+            lambda c: '/admin/course/enrollment/?course_instance__id__exact={:d}'.format(c.instance.id),
+            Budget(6)),
+    )
+
@@ -13,7 +13,7 @@ from .permissions import (
     CourseVisiblePermission,
     CourseModulePermission,
 )
-from .models import Course, CourseInstance, CourseModule
+from .models import Course, CourseInstance, CourseModule, remember_course_roles
 
 
 class CourseMixin(UserProfileMixin):
@@ -55,10 +55,13 @@ class CourseInstanceBaseMixin(object):
             self.instance = instance
             self.course = self.instance.course
             self.content = CachedContent(self.instance)
-            self.is_student = self.instance.is_student(user)
-            self.is_assistant = self.instance.is_assistant(user)
-            self.is_teacher = self.course.is_teacher(user)
-            self.is_course_staff = self.is_teacher or self.is_assistant
+            # Permissions, models and templates reuse the roles.
+            remember_course_roles(user)
+            roles = self.instance.get_roles(user)
+            self.is_student = roles.is_student
+            self.is_assistant = roles.is_assistant
+            self.is_teacher = roles.is_teacher
+            self.is_course_staff = roles.is_course_staff
             self.note(
                 "course", "instance", "content",
                 "is_student", "is_assistant", "is_teacher", "is_course_staff",
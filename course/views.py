@@ -130,7 +130,8 @@ class GroupsView(CourseInstanceMixin, BaseFormView):
     def get_common_objects(self):
         super().get_common_objects()
         self.enrollment = self.instance.get_enrollment_for(self.request.user)
-        self.groups = list(self.profile.groups.filter(course_instance=self.instance))
+        self.groups = list(self.profile.groups.filter(course_instance=self.instance)\
+            .prefetch_related('members__user'))
         self.note('enrollment','groups')
 
     def get_form_kwargs(self):
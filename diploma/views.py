@@ -36,11 +36,12 @@ class DiplomaMixin(CourseInstanceMixin):
 class DiplomaListView(DiplomaMixin, BaseTemplateView):
     access_mode = ACCESS.ASSISTANT
     template_name = "diploma/list.html"
+    batch_size = 200
 
     def get_common_objects(self):
         super().get_common_objects()
 
-        students = self.instance.students.all()
+        students = self.instance.students.select_related('user')
         group = self.request.GET.get("group")
         if group == "internal":
             students = [s for s in students if not s.is_external]
@@ -49,13 +50,17 @@ class DiplomaListView(DiplomaMixin, BaseTemplateView):
 
         point_limits = self.design.point_limits
         pad_points = self.design.pad_points
+        students = list(students)
         student_grades = []
-        for profile in students:
-            points = CachedPoints(self.instance, profile.user, self.content)
-            student_grades.append((
-                profile,
-                calculate_grade(points.total(), point_limits, pad_points),
-            ))
+        for i in range(0, len(students), self.batch_size):
+            batch = students[i:i + self.batch_size]
+            points = CachedPoints.for_users(
+                self.instance, [p.user for p in batch], self.content)
+            for profile, p in zip(batch, points):
+                student_grades.append((
+                    profile,
+                    calculate_grade(p.total(), point_limits, pad_points),
+                ))
         self.student_grades = student_grades
         self.group = group
         self.internal_user_label = settings_text('INTERNAL_USER_LABEL')
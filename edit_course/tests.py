@@ -1,5 +1,11 @@
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+
 from course.models import CourseInstance
+from exercise.exercise_models import display_buffer
 from exercise.models import BaseExercise
+from lib.helpers import host_resolver
 from lib.testdata import CourseTestCase
 
 
@@ -100,3 +106,48 @@ class BatchAssessTest(CourseTestCase):
         sub = subs.first()
         self.assertEqual(sub.feedback, 'Generic exercise feedback')
         self.assertEqual(sub.grade, 99)
+
+
+class ProfilingTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+        cache.clear()
+        # The profiled exercise views are saved before the test is rolled back.
+        self.addCleanup(display_buffer.flush)
+
+    def test_profiling_off(self):
+        self.client.login(username='testStudent', password='testPassword')
+        self.client.get(self.exercise.get_absolute_url())
+        self.assertIsNone(cache.get('profiling:views'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_profiling_report(self):
+        self.client.login(username='testStudent', password='testPassword')
+        response = self.client.get(self.exercise.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.client.get(self.exercise.get_absolute_url())
+
+        url = reverse('profiling-report')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.login(username='testUser', password='testPassword')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        rows = { row['view']: row for row in response.context['views'] }
+        row = rows['exercise']
+        self.assertEqual(row['requests'], 2)
+        self.assertGreater(row['queries'], 0)
+        self.assertGreater(row['cache_misses'], 0)
+        self.assertGreater(row['cache_hits'], 0)
+        self.assertGreater(row['wall_seconds'], row['query_seconds'])
+        self.assertContains(response, "<td>exercise</td>")
+        self.assertEqual(set(response.context['resolver']), set(host_resolver.stats()))
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+        # The clearing request itself was profiled after the reset.
+        self.assertEqual(cache.get('profiling:views'), {'profiling-report'})
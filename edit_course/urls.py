@@ -43,6 +43,9 @@ urlpatterns = [
     url(r'^admin/signin-as-user$',
         views.SignInAsUser.as_view(),
         name='signin-as-user'),
+    url(r'^admin/profiling$',
+        views.ProfilingReportView.as_view(),
+        name='profiling-report'),
 
     url(MODEL_URL_PREFIX + r'add/$',
         views.ModelEditView.as_view(),
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login as auth_login
 from django.contrib.auth.models import User
@@ -6,6 +7,8 @@ from django.http.response import Http404, HttpResponse
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
+from lib import profiling
+from lib.helpers import host_resolver
 from lib.viewbase import (
     BaseViewMixin,
     BaseTemplateMixin,
@@ -320,3 +323,20 @@ class SignInAsUser(BaseRedirectMixin, BaseTemplateView):
         user.backend = "django.contrib.auth.backends.ModelBackend"
         auth_login(request, user)
         return self.redirect("/")
+
+
+class ProfilingReportView(BaseRedirectMixin, BaseTemplateView):
+    access_mode = ACCESS.SUPERUSER
+    template_name = "edit_course/profiling_report.html"
+
+    def get_common_objects(self):
+        super().get_common_objects()
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.views = profiling.report()
+        self.resolver = host_resolver.stats()
+        self.note("sample_rate", "views", "resolver")
+
+    def post(self, request, *args, **kwargs):
+        profiling.reset()
+        messages.success(request, _("Profiling data has been cleared."))
+        return self.redirect(request.path)
@@ -1,8 +1,11 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import ugettext_lazy as _
 
 from exercise.models import (
     CourseChapter,
+    LearningObject,
     BaseExercise,
     StaticExercise,
     ExerciseWithAttachment,
@@ -15,7 +18,7 @@ def real_class(obj):
     """
     Returns the leaf class name of an exercise.
     """
-    return obj.as_leaf_class().__class__.__name__
+    return ContentType.objects.get_for_id(obj.content_type_id).model_class().__name__
 
 
 def course_wrapper(obj):
@@ -42,6 +45,58 @@ course_wrapper.short_description = _('Course instance')
 submitters_wrapper.short_description = _('Submitters')
 
 
+class RelatedListFilter(admin.RelatedFieldListFilter):
+    """
+    Lists the choices of a foreign key with the objects that their names
+    need fetched in the same query.
+    """
+    related = ()
+
+    def field_choices(self, field, request, model_admin):
+        objects = list(field.related_model._default_manager.select_related(*self.related))
+        self.prepare(objects)
+        return [(obj.pk, str(obj)) for obj in objects]
+
+    def prepare(self, objects):
+        pass
+
+
+class CourseInstanceListFilter(RelatedListFilter):
+    related = ('course',)
+
+
+class CourseModuleListFilter(RelatedListFilter):
+    related = ('course_instance__course',)
+
+
+class ExerciseListFilter(RelatedListFilter):
+    related = ('course_module__course_instance__course',)
+
+    def prepare(self, objects):
+        LearningObject.objects.set_parents(objects)
+
+
+class ExerciseChangeList(ChangeList):
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = list(self.result_list)
+        LearningObject.objects.set_parents(self.result_list)
+
+
+class SubmissionChangeList(ChangeList):
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = list(self.result_list)
+        # The submissions of an exercise share one exercise object.
+        exercises = {}
+        for submission in self.result_list:
+            submission.exercise = exercises.setdefault(
+                submission.exercise_id, submission.exercise)
+        LearningObject.objects.set_parents(list(exercises.values()))
+
+
 class CourseChapterAdmin(admin.ModelAdmin):
     list_display_links = ("__str__",)
     list_display = ("course_instance", "__str__", "service_url")
@@ -51,16 +106,29 @@ class CourseChapterAdmin(admin.ModelAdmin):
 class BaseExerciseAdmin(admin.ModelAdmin):
     list_display_links = ["__str__"]
     list_display = ["course_instance", "__str__", "max_points", real_class]
-    list_filter = ["course_module__course_instance", "course_module"]
+    list_filter = [
+        ("course_module__course_instance", CourseInstanceListFilter),
+        ("course_module", CourseModuleListFilter),
+    ]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request)\
+            .select_related('course_module__course_instance__course')
+
+    def get_changelist(self, request, **kwargs):
+        return ExerciseChangeList
 
 
 class SubmissionAdmin(admin.ModelAdmin):
     list_display_links = ("id",)
     list_display = ("id", "exercise", course_wrapper, submitters_wrapper,
                     "status", "grade", "submission_time")
-    list_filter = ["exercise", "status", "grade", "submission_time",
-                   "exercise__course_module__course_instance",
-                   "exercise__course_module", "submitters__user__username"]
+    list_filter = [("exercise", ExerciseListFilter), "status", "grade",
+                   "submission_time",
+                   ("exercise__course_module__course_instance",
+                    CourseInstanceListFilter),
+                   ("exercise__course_module", CourseModuleListFilter),
+                   "submitters__user__username"]
     search_fields = ["id", "exercise__name",
                      "exercise__course_module__course_instance__instance_name",
                      "submitters__student_id", "submitters__user__username",
@@ -72,7 +140,11 @@ class SubmissionAdmin(admin.ModelAdmin):
         return super().get_queryset(request)\
             .defer("feedback", "assistant_feedback",
                 "submission_data", "grading_data")\
-            .prefetch_related('submitters')
+            .select_related('exercise__course_module__course_instance__course')\
+            .prefetch_related('submitters__user')
+
+    def get_changelist(self, request, **kwargs):
+        return SubmissionChangeList
 
 
 admin.site.register(CourseChapter, CourseChapterAdmin)
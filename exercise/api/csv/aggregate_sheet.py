@@ -34,12 +34,12 @@ def aggregate_sheet(request, profiles, taggings, exercises, aggregate, number):
 
     agg = {}
     for row in aggregate:
-        uid = row['submitters__user_id']
+        uid = row['profile__user_id']
         num = exercise_map[row['exercise_id']]
         user_row = agg.get(uid, {})
         values = user_row.get(num, [0,0])
-        values[0] += row['count']
-        values[1] += row['total']
+        values[0] += row['submission_count']
+        values[1] += row['points'] if row['graded'] else 0
         user_row[num] = values
         agg[uid] = user_row
 
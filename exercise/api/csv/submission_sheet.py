@@ -1,111 +1,212 @@
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from itertools import islice
+from django.db.models import Q
 from rest_framework.reverse import reverse
 
-
-def filter_best_submissions(submissions):
-    best = {}
-    eid = None
-
-    for i,s in enumerate(submissions):
-        if s.exercise_id != eid:
-            eid = s.exercise_id
-            best[eid] = {}
-
-        if s.status == 'ready':
-            user = s.submitters.first()
-            uid = user.id if user else 0
-            old = best[eid].get(uid)
-            if not old or s.grade >= old[1]:
-                best[eid][uid] = (i,s.grade)
-
-    filtered = []
-    for ebest in best.values():
-        for i,g in ebest.values():
-            filtered.append(submissions[i])
-    return filtered
+from notification.models import Notification
+from userprofile.models import UserProfile
+from ...models import BaseExercise, Submission, SubmittedFile
+
+
+def iter_submissions(queryset, chunk_size=500):
+    """
+    Iterates the submissions ordered by the exercise in chunks. Each chunk
+    is a separate query (and prefetch), so the memory use does not grow
+    with the number of submissions.
+    """
+    queryset = queryset.order_by('exercise_id', 'id')
+    last = None
+    while True:
+        chunk_qs = queryset
+        if last:
+            chunk_qs = chunk_qs.filter(
+                Q(exercise_id__gt=last.exercise_id)
+                | Q(exercise_id=last.exercise_id, id__gt=last.id)
+            )
+        chunk = list(chunk_qs[:chunk_size])
+        for s in chunk:
+            yield s
+        if len(chunk) < chunk_size:
+            break
+        last = chunk[-1]
+
+
+DEFAULT_FIELDS = [
+    'ExerciseID', 'Category', 'Exercise', 'SubmissionID', 'Time',
+    'UserID', 'StudentID', 'Email', 'Status',
+    'Grade', 'Penalty', 'Graded', 'GraderEmail', 'Notified', 'NSeen',
+]
+
+
+def add_form_spec_fields(exercise, fields, files):
+    if exercise.exercise_info:
+        for e in exercise.exercise_info.get('form_spec', []):
+            t = e['type']
+            k = e['key']
+            if t == 'file':
+                if not k in files:
+                    files.append(k)
+            elif t != 'static':
+                if not k in fields:
+                    fields.append(k)
+
+
+def submissions_sheet_header(queryset):
+    """
+    Resolves the sheet header without loading the submissions. The columns
+    are collected in the order of the sheet rows: the form specification
+    fields of each exercise and then the keys and files submitted to it.
+    Only the submitted data and the file names are read for that.
+    """
+    fields = []
+    files = []
+    exercises = BaseExercise.objects.in_bulk(list(
+        queryset.order_by().values_list('exercise_id', flat=True).distinct()))
+    file_names = SubmittedFile.objects\
+        .filter(submission__in=queryset.values('id'))\
+        .order_by('submission__exercise_id', 'submission_id', 'id')\
+        .values_list('submission_id', 'param_name').iterator()
+    next_file = next(file_names, None)
+    exercise_id = None
+    data = queryset.order_by('exercise_id', 'id')\
+        .values_list('exercise_id', 'id', 'submission_data')
+    for submission_exercise_id, submission_id, submission_data in data.iterator():
+        if submission_exercise_id != exercise_id:
+            exercise_id = submission_exercise_id
+            add_form_spec_fields(exercises[exercise_id], fields, files)
+        for k,v in submission_data or []:
+            if (v or not k in files) and not k in fields:
+                fields.append(k)
+        while next_file and next_file[0] == submission_id:
+            if not next_file[1] in files:
+                files.append(next_file[1])
+            next_file = next(file_names, None)
+    return DEFAULT_FIELDS + fields + files
 
 
 def submissions_sheet(request, submissions):
-    DEFAULT_FIELDS = [
-        'ExerciseID', 'Category', 'Exercise', 'SubmissionID', 'Time',
-        'UserID', 'StudentID', 'Email', 'Status',
-        'Grade', 'Penalty', 'Graded', 'GraderEmail', 'Notified', 'NSeen',
-    ]
-    sheet = []
     fields = []
     files = []
+    sheet = list(submissions_sheet_rows(request, submissions, fields, files))
+    return sheet, DEFAULT_FIELDS + fields + files
+
 
-    def url(submission, obj):
-        return reverse(
-            'api:submission-files-detail',
-            kwargs={
-                'submission_id': submission.id,
-                'submittedfile_id': obj.id,
-            },
-            request=request
-        )
-
-    exercise = None
-    for s in submissions:
-        if s.exercise != exercise:
-            exercise = s.exercise
-            if exercise.exercise_info:
-                for e in exercise.exercise_info.get('form_spec', []):
-                    t = e['type']
-                    k = e['key']
-                    if t == 'file':
-                        if not k in files:
-                            files.append(k)
-                    elif t != 'static':
+def submissions_sheet_rows(request, submissions, fields=None, files=None,
+        batch_size=500):
+    """
+    Yields the sheet rows of the submissions, which must be ordered by the
+    exercise. The found data and file fields are added to the lists. The
+    related objects are fetched in bulk for each batch of submissions.
+    """
+    fields = [] if fields is None else fields
+    files = [] if files is None else files
+    url = file_url_template(request)
+    exercises = {}
+
+    submissions = iter(submissions)
+    while True:
+        batch = list(islice(submissions, batch_size))
+        if not batch:
+            break
+        ids = [s.id for s in batch]
+
+        submitters = defaultdict(list)
+        for link in Submission.submitters.through.objects\
+                .filter(submission_id__in=ids)\
+                .select_related('userprofile__user')\
+                .order_by('userprofile_id'):
+            submitters[link.submission_id].append(link.userprofile)
+
+        submitted_files = defaultdict(list)
+        for f in SubmittedFile.objects.filter(submission_id__in=ids).order_by('id'):
+            submitted_files[f.submission_id].append(f)
+
+        notifications = {}
+        for n in Notification.objects\
+                .filter(submission_id__in=ids)\
+                .order_by('submission_id', '-timestamp')\
+                .only('submission_id', 'seen'):
+            notifications.setdefault(n.submission_id, n)
+
+        grader_ids = set(s.grader_id for s in batch if s.grader_id)
+        graders = {
+            p.id: p.user.email for p in
+            UserProfile.objects.filter(id__in=grader_ids).select_related('user')
+        } if grader_ids else {}
+
+        new_ids = set(s.exercise_id for s in batch) - exercises.keys()
+        if new_ids:
+            for e in BaseExercise.objects.filter(id__in=new_ids)\
+                    .select_related('category', 'course_module__course_instance'):
+                exercises[e.id] = (e, e.category.name, str(e))
+
+        for s in batch:
+            exercise, category, name = exercises[s.exercise_id]
+            add_form_spec_fields(exercise, fields, files)
+
+            grader = graders.get(s.grader_id)
+
+            # Find reviewer email from rubyric feedback.
+            t = s.feedback
+            if not grader and t and t.startswith("\n<p>\nReviewer:"):
+                grader = t[t.find("<a href=\"mailto:")+16:t.find("\">")]
+
+            n = notifications.get(s.id)
+            row = OrderedDict([
+                ('ExerciseID', exercise.id),
+                ('Category', category),
+                ('Exercise', name),
+                ('SubmissionID', s.id),
+                ('Time', str(s.submission_time)),
+                ('UserID', None),
+                ('StudentID', None),
+                ('Email', None),
+                ('Status', s.status),
+                ('Grade', s.grade),
+                ('Penalty', s.late_penalty_applied),
+                ('Graded', str(s.grading_time)),
+                ('GraderEmail', grader),
+                ('Notified', not n is None),
+                ('NSeen', n.seen if n else False),
+            ])
+
+            if s.submission_data:
+                for k,v in s.submission_data:
+                    if v or not k in files:
                         if not k in fields:
                             fields.append(k)
-
-        grader = s.grader.user.email if s.grader else None
-
-        # Find reviewer email from rubyric feedback.
-        t = s.feedback
-        if not grader and t and t.startswith("\n<p>\nReviewer:"):
-            grader = t[t.find("<a href=\"mailto:")+16:t.find("\">")]
-
-        n = s.notifications.first()
-        row = OrderedDict([
-            ('ExerciseID', exercise.id),
-            ('Category', exercise.category.name),
-            ('Exercise', str(exercise)),
-            ('SubmissionID', s.id),
-            ('Time', str(s.submission_time)),
-            ('UserID', None),
-            ('StudentID', None),
-            ('Email', None),
-            ('Status', s.status),
-            ('Grade', s.grade),
-            ('Penalty', s.late_penalty_applied),
-            ('Graded', str(s.grading_time)),
-            ('GraderEmail', grader),
-            ('Notified', not n is None),
-            ('NSeen', n.seen if n else False),
-        ])
-
-        if s.submission_data:
-            for k,v in s.submission_data:
-                if v or not k in files:
-                    if not k in fields:
-                        fields.append(k)
-                    if k in row:
-                        row[k] += "|" + str(v)
-                    else:
-                        row[k] = str(v)
-
-        for f in s.files.all():
-            if not f.param_name in files:
-                files.append(f.param_name)
-            row[f.param_name] = url(s,f)
-
-        for i,profile in enumerate(s.submitters.all()):
-            r = row.copy() if i > 0 else row
-            r['UserID'] = profile.user.id
-            r['StudentID'] = profile.student_id
-            r['Email'] = profile.user.email
-            sheet.append(r)
-
-    return sheet, DEFAULT_FIELDS + fields + files
+                        if k in row:
+                            row[k] += "|" + str(v)
+                        else:
+                            row[k] = str(v)
+
+            for f in submitted_files[s.id]:
+                if not f.param_name in files:
+                    files.append(f.param_name)
+                row[f.param_name] = url.format(submission_id=s.id, file_id=f.id)
+
+            for i,profile in enumerate(submitters[s.id]):
+                r = row.copy() if i > 0 else row
+                r['UserID'] = profile.user.id
+                r['StudentID'] = profile.student_id
+                r['Email'] = profile.user.email
+                yield r
+
+
+def file_url_template(request):
+    """
+    Returns a format string for the submitted file urls, so that reverse
+    is called only once per sheet.
+    """
+    submission_id, file_id = 1234567890, 9876543210
+    url = reverse(
+        'api:submission-files-detail',
+        kwargs={
+            'submission_id': submission_id,
+            'submittedfile_id': file_id,
+        },
+        request=request
+    )
+    return url.replace('{', '{{').replace('}', '}}')\
+        .replace('/{:d}/'.format(submission_id), '/{submission_id}/')\
+        .replace('/{:d}/'.format(file_id), '/{file_id}/')
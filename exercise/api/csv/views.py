@@ -1,4 +1,5 @@
-from django.db.models.aggregates import Max, Count
+import csv
+from django.http.response import StreamingHttpResponse
 from rest_framework import mixins, permissions, viewsets
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
@@ -15,6 +16,7 @@ from userprofile.models import UserProfile
 from ...cache.hierarchy import NoSuchContent
 from ...cache.points import CachedPoints
 from ...models import (
+    ExerciseResult,
     Submission,
 )
 from .submission_sheet import *
@@ -62,11 +64,17 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
         profiles = self.filter_queryset(self.get_queryset())
         search_args = self.get_search_args(request)
         ids = [e['id'] for e in self.content.search_exercises(**search_args)]
-        queryset = Submission.objects.filter(
-            exercise_id__in=ids,
-            submitters__in=profiles
-        )
-        return self.serialize_submissions(request, queryset, best=search_args['best'])
+        if search_args['best']:
+            queryset = Submission.objects.best(
+                exercises=ids,
+                submitters=profiles.order_by().values('id'),
+            )
+        else:
+            queryset = Submission.objects.filter(
+                exercise_id__in=ids,
+                submitters__in=profiles
+            ).distinct()
+        return self.serialize_submissions(request, queryset)
 
     def retrieve(self, request, version=None, course_id=None, user_id=None):
         profile = self.get_object()
@@ -75,10 +83,8 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
         queryset = Submission.objects.filter(id__in=ids)
         return self.serialize_submissions(request, queryset)
 
-    def serialize_submissions(self, request, queryset, best=False):
-        submissions = list(queryset.order_by('exercise_id', 'id'))
-        if best:
-            submissions = filter_best_submissions(submissions)
+    def serialize_submissions(self, request, queryset):
+        submissions = iter_submissions(queryset)
 
         # Pick out a single field.
         field = request.GET.get('field')
@@ -88,15 +94,24 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
                     if key == name:
                         return val
                 return ""
-            vals = [submitted_field(s, field) for s in submissions]
+            vals = (submitted_field(s, field) for s in submissions)
             return Response([v for v in vals if v != ""])
 
-        data,fields = submissions_sheet(request, submissions)
-        self.renderer_fields = fields
-        response = Response(data)
+        # Stream the sheet rows as they are generated.
         if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
+            response = StreamingHttpResponse(
+                csv_stream(
+                    submissions_sheet_header(queryset),
+                    submissions_sheet_rows(request, submissions),
+                ),
+                content_type='text/csv; charset=utf-8',
+            )
             response['Content-Disposition'] = 'attachment; filename="submissions.csv"'
-        return response
+            return response
+
+        data,fields = submissions_sheet(request, submissions)
+        self.renderer_fields = fields
+        return Response(data)
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
@@ -150,11 +165,9 @@ class CourseAggregateDataViewSet(NestedViewSetMixin,
         search_args = self.get_search_args(request)
         entry, exercises = self.content.search_entries(**search_args)
         ids = [e['id'] for e in exercises if e['type'] == 'exercise']
-        aggr = Submission.objects\
-            .filter(exercise__in=ids, submitters__in=profiles)\
-            .values('submitters__user_id','exercise_id')\
-            .annotate(total=Max('grade'),count=Count('id'))\
-            .order_by()
+        aggr = ExerciseResult.objects\
+            .filter(course_instance=self.instance, exercise__in=ids, profile__in=profiles)\
+            .values('profile__user_id', 'exercise_id', 'submission_count', 'points', 'graded')
         data,fields = aggregate_sheet(request, profiles, self.instance.taggings.all(),
             exercises, aggr, entry['number'] if entry else "")
         self.renderer_fields = fields
@@ -176,3 +189,21 @@ def int_or_none(value):
         except ValueError:
             pass
     return None
+
+
+class Echo(object):
+    """
+    Pseudo file that returns the written value for streaming.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_stream(header, rows):
+    """
+    Yields the header and the rows (dicts) as CSV lines.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([row.get(key) for key in header])
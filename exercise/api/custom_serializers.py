@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 from course.api.serializers import CourseUsertagBriefSerializer
-from lib.api.serializers import AlwaysListSerializer
+from lib.api.serializers import (
+    AlwaysListSerializer,
+    get_field_path,
+    get_requested_fields,
+)
 from userprofile.api.serializers import UserBriefSerializer, UserListField
 from ..cache.points import CachedPoints
+from ..models import Submission
 from .full_serializers import SubmissionSerializer
 
 
@@ -25,9 +30,14 @@ class UserWithTagsSerializer(UserBriefSerializer):
 
     def get_tags(self, obj):
         view = self.context['view']
+        tags = self.context.get('tags')
+        if tags is None:
+            tags = obj.taggings.tags_for_instance(view.instance)
+        else:
+            tags = tags.get(obj.id, [])
         ser = UserToTagSerializer(
-            obj.taggings.tags_for_instance(view.instance),
-            context=self.context
+            tags,
+            context=dict(self.context, field_path=get_field_path(self) + ('tags',))
         )
         return ser.data
 
@@ -67,8 +77,20 @@ class UserPointsSerializer(UserWithTagsSerializer):
 
     def to_representation(self, obj):
         rep = super().to_representation(obj)
+        requested = get_requested_fields(self)
+        if requested is not None and requested.isdisjoint(
+                ('submission_count', 'points', 'points_by_difficulty', 'modules')):
+            return rep
         view = self.context['view']
-        points = CachedPoints(view.instance, obj.user, view.content)
+        points = self.context.get('points', {}).get(obj.user_id)
+        if points is None:
+            points = CachedPoints(view.instance, obj.user, view.content)
+        total = points.total()
+        for key in ['submission_count', 'points', 'points_by_difficulty']:
+            if requested is None or key in requested:
+                rep[key] = total[key]
+        if requested is not None and 'modules' not in requested:
+            return rep
         modules = []
         for module in points.modules_flatted():
             module_data = {}
@@ -87,15 +109,42 @@ class UserPointsSerializer(UserWithTagsSerializer):
                     )
             module_data['exercises'] = exercises
             modules.append(module_data)
-
-        total = points.total()
-        for key in ['submission_count', 'points', 'points_by_difficulty']:
-            rep[key] = total[key]
         rep['modules'] = modules
 
         return rep
 
 
+class UserPointsCompactSerializer(serializers.Serializer):
+    """
+    Points of a user as ids and numbers only. Modules are listed as
+    [id, points, passed] and exercises as [id, points, submission count,
+    passed]. Requires the CachedPoints of the user in context['points'].
+    """
+
+    def to_representation(self, obj):
+        points = self.context['points'][obj.user_id]
+        modules = []
+        exercises = []
+        for module in points.modules_flatted():
+            modules.append([module['id'], module['points'], int(module['passed'])])
+            for entry in module['flatted']:
+                if entry['type'] == 'exercise' and entry['submittable']:
+                    exercises.append([
+                        entry['id'],
+                        entry['points'],
+                        entry['submission_count'],
+                        int(entry['passed']),
+                    ])
+        total = points.total()
+        return {
+            'id': obj.user_id,
+            'submission_count': total['submission_count'],
+            'points': total['points'],
+            'modules': modules,
+            'exercises': exercises,
+        }
+
+
 class SubmitterStatsSerializer(UserWithTagsSerializer):
 
     def to_representation(self, obj):
@@ -107,3 +156,25 @@ class SubmitterStatsSerializer(UserWithTagsSerializer):
         for key,value in data.items():
             rep[key] = value
         return rep
+
+
+class SubmissionChangeSerializer(serializers.ModelSerializer):
+    submitters = serializers.SerializerMethodField()
+    submission_data = serializers.JSONField()
+
+    class Meta:
+        model = Submission
+        fields = (
+            'id',
+            'exercise',
+            'submitters',
+            'submission_time',
+            'grading_time',
+            'status',
+            'grade',
+            'late_penalty_applied',
+            'submission_data',
+        )
+
+    def get_submitters(self, obj):
+        return [profile.user_id for profile in obj.submitters.all()]
@@ -1,9 +1,25 @@
+import csv
+import gzip
+import io
+import json
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.datastructures import MultiValueDict
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
-from course.models import Course, CourseInstance
-from exercise.models import LearningObjectCategory
+from course.models import Course, CourseInstance, UserTag, UserTagging
+from exercise.api.csv.submission_sheet import iter_submissions
+from exercise.models import LearningObjectCategory, Submission
+from lib.testdata import CourseTestCase
+from lib import query_budget
+from lib.query_budget import Budget, Route
+from notification.models import Notification
 from userprofile.models import UserProfile
 from django.utils import timezone
 from datetime import timedelta
@@ -85,3 +101,403 @@ class ExerciceSubmissionAPITest(TestCase):
         client.force_authenticate(user=self.student)
         response = client.get('/api/v2/submissions/1/')
         self.assertEqual(response.data, {'detail': 'Not found.'})
+
+
+class CourseSubmissionDataTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+        self.exercise0.exercise_info = {'form_spec': [
+            {'type': 'static', 'key': 'intro'},
+            {'type': 'text', 'key': 'answer'},
+            {'type': 'file', 'key': 'code'},
+        ]}
+        self.exercise0.save()
+        for i in range(5):
+            for exercise, data in (
+                (self.exercise0, [['answer', 'a{:d}'.format(i)]]),
+                (self.exercise3, [['x', str(i)], ['y', ''], ['x', 'z']]),
+            ):
+                submission = Submission.objects.create(
+                    exercise=exercise,
+                    submission_data=data,
+                )
+                submission.submitters.add(self.student.userprofile)
+                submission.set_points(i, 5)
+                submission.set_ready()
+                submission.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+        self.url = reverse('api:course-submissiondata-list', kwargs={
+            'version': 2,
+            'course_id': self.instance.id,
+        })
+
+    def add_submissions(self, count):
+        for i in range(count):
+            submission = Submission.objects.create(
+                exercise=self.exercise0,
+                submission_data=[['answer', str(i)]],
+                grader=self.teacher.userprofile,
+            )
+            submission.submitters.add(self.student.userprofile, self.user.userprofile)
+            submission.files.create(param_name='code', file_object='code.py')
+            Notification.objects.create(
+                recipient=self.student.userprofile,
+                course_instance=self.instance,
+                submission=submission,
+            )
+
+    def count_sheet_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url + '?format=csv&best=no')
+            rows = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        return len(context), rows
+
+    def test_sheet_query_count(self):
+        self.add_submissions(2)
+        self.count_sheet_queries() # Fills the course caches.
+        queries, rows = self.count_sheet_queries()
+        self.add_submissions(20)
+        queries_after, rows_after = self.count_sheet_queries()
+        self.assertEqual(len(rows_after), len(rows) + 40)
+        self.assertEqual(queries_after, queries)
+        url = reverse('api:submission-files-detail', kwargs={
+            'version': 2,
+            'submission_id': Submission.objects.first().id,
+            'submittedfile_id': Submission.objects.first().files.first().id,
+        })
+        self.assertTrue(any(url in row for row in rows_after))
+
+    def test_iter_submissions(self):
+        queryset = Submission.objects.filter(exercise__course_module__course_instance=self.instance)
+        ids = [s.id for s in iter_submissions(queryset, chunk_size=3)]
+        self.assertEqual(ids, [s.id for s in queryset.order_by('exercise_id', 'id')])
+
+    def test_sheet_header(self):
+        submission = Submission.objects.create(
+            exercise=self.exercise0,
+            submission_data=[['answer', 'b'], ['comment', 'c']],
+        )
+        submission.submitters.add(self.student.userprofile)
+        submission.files.create(param_name='extra', file_object='extra.txt')
+        response = self.client.get(self.url + '?format=csv&best=no')
+        header = next(csv.reader(io.StringIO(
+            b''.join(response.streaming_content).decode('utf-8'))))
+        # The submitted key and file are not in the form specification.
+        self.assertEqual(header[-4:], ['answer', 'comment', 'code', 'extra'])
+        response = self.client.get(self.url + '?format=json&best=no')
+        self.assertEqual(header, response.renderer_context['header'])
+
+    def test_streamed_csv(self):
+        for query in ('best=no', 'best=yes'):
+            response = self.client.get(self.url + '?format=csv&' + query)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            rows = list(csv.DictReader(
+                io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+            data = self.client.get(self.url + '?format=json&' + query).data
+            self.assertEqual(len(rows), 10 if query == 'best=no' else 2)
+            self.assertEqual(len(rows), len(data))
+            for row, expected in zip(rows, data):
+                self.assertEqual(row['SubmissionID'], str(expected['SubmissionID']))
+                self.assertEqual(row['answer'], expected.get('answer') or '')
+                self.assertEqual(row['x'], expected.get('x') or '')
+                self.assertEqual(row['code'], '')
+                self.assertEqual(row['StudentID'], '123TEST')
+
+
+@override_settings(SUBMISSION_CHANGES_DELAY=0)
+class CourseSubmissionChangesTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+        self.submissions = []
+        for i in range(5):
+            submission = Submission.objects.create(
+                exercise=self.exercise if i % 2 else self.exercise2,
+                submission_data=[['answer', str(i)]],
+            )
+            submission.submitters.add(self.student.userprofile)
+            self.submissions.append(submission)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+        self.url = reverse('api:course-submissionchanges-list', kwargs={
+            'version': 2,
+            'course_id': self.instance.id,
+        })
+
+    def sync(self, cursor=None, limit=2):
+        ids = []
+        while True:
+            query = '?limit={:d}'.format(limit)
+            if cursor:
+                query += '&cursor=' + cursor
+            response = self.client.get(self.url + query)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(s['id'] for s in response.data['results'])
+            if response.data['cursor']:
+                cursor = response.data['cursor']
+            if not response.data['more']:
+                return ids, cursor
+
+    def test_changes(self):
+        ids, cursor = self.sync()
+        self.assertEqual(ids, [s.id for s in self.submissions])
+        self.assertEqual(self.sync(cursor), ([], cursor))
+
+        graded = self.submissions[1]
+        graded.set_points(1, 2)
+        graded.set_ready()
+        graded.save()
+        submission = Submission.objects.create(exercise=self.exercise)
+        submission.submitters.add(self.user.userprofile)
+        ids, cursor = self.sync(cursor, limit=1)
+        self.assertEqual(ids, [graded.id, submission.id])
+        response = self.client.get(self.url + '?cursor=' + cursor)
+        self.assertEqual(response.data['results'], [])
+
+        ids, _ = self.sync(limit=100)
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(ids[-2:], [graded.id, submission.id])
+        response = self.client.get(self.url + '?exercise_id={:d}'.format(self.exercise.id))
+        self.assertEqual(response.data['results'][-1]['submitters'], [self.user.id])
+        self.assertEqual(len(response.data['results']), 3)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('export', 'changes', str(self.instance.id),
+            cursor=cursor, verbosity=0, stdout=out, stderr=err)
+        self.assertEqual(out.getvalue().splitlines()[0].split(',')[0], 'SID')
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+        self.assertEqual(err.getvalue().strip(), 'Cursor: ' + cursor)
+
+    def test_delay(self):
+        with self.settings(SUBMISSION_CHANGES_DELAY=60):
+            response = self.client.get(self.url)
+            self.assertEqual(response.data['results'], [])
+            self.assertIsNone(response.data['next'])
+
+    def test_access(self):
+        response = self.client.get(self.url + '?cursor=x-1')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+
+class CoursePointsListTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+        self.setUpSubmissions()
+        self.instance.enroll_student(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+        self.url = reverse('api:course-points-all', kwargs={
+            'version': 2,
+            'course_id': self.instance.id,
+        })
+
+    def get_points(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_points(self):
+        points = self.get_points()
+        self.assertEqual([p['id'] for p in points], [self.user.id, self.student.id])
+        for data in points:
+            response = self.client.get(reverse('api:course-points-detail', kwargs={
+                'version': 2,
+                'course_id': self.instance.id,
+                'user_id': data['id'],
+            }))
+            self.assertEqual(data, json.loads(json.dumps(response.data)))
+
+        compact = self.get_points('?compact=yes&user_id={:d}'.format(self.student.id))
+        self.assertEqual(len(compact), 1)
+        self.assertEqual(compact[0]['points'], points[1]['points'])
+        self.assertIn([self.exercise.id, 50, 2, 1], compact[0]['exercises'])
+
+        response = self.client.get(self.url + '?compact=yes', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(json.loads(data.decode('utf-8'))), 2)
+
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual([p['id'] for p in self.get_points('?compact=yes')], [self.student.id])
+
+    def test_query_count(self):
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.get_points('?compact=yes')
+            return len(context)
+        queries = count_queries()
+        for i in range(5):
+            user = User.objects.create(username='extra{:d}'.format(i))
+            self.instance.enroll_student(user)
+            submission = Submission.objects.create(exercise=self.exercise)
+            submission.submitters.add(user.userprofile)
+        self.assertEqual(count_queries(), queries)
+
+
+class ConditionalGetTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+        self.setUpSubmissions()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_course(self):
+        url = reverse('api:course-detail', kwargs={
+            'version': 2, 'course_id': self.instance.id})
+        self.assertRevalidates(url, lambda: self.instance.save())
+
+        url = reverse('api:course-exercises-list', kwargs={
+            'version': 2, 'course_id': self.instance.id})
+        self.assertRevalidates(url, lambda: self.exercise.save())
+
+    def test_points(self):
+        url = reverse('api:course-points-detail', kwargs={
+            'version': 2,
+            'course_id': self.instance.id,
+            'user_id': self.student.id,
+        })
+        def grade():
+            self.submission.grade = 10
+            self.submission.save()
+        self.assertRevalidates(url, grade)
+
+        def rename():
+            self.student.username = 'renamed'
+            self.student.save()
+        def tag():
+            UserTagging.objects.set(self.student.userprofile,
+                UserTag.objects.create(course_instance=self.instance, name='tag'))
+        def rename_tag():
+            UserTag.objects.filter(course_instance=self.instance).update(name='other')
+        self.assertRevalidates(url, rename)
+        self.assertRevalidates(url, tag)
+        self.assertRevalidates(url, rename_tag)
+
+        url = reverse('api:course-points-all', kwargs={
+            'version': 2, 'course_id': self.instance.id})
+        self.client.get(url)
+        self.assertRevalidates(url, grade)
+        self.assertRevalidates(url, lambda: UserTagging.objects.all().delete())
+
+    def test_submission(self):
+        url = reverse('api:submission-detail', kwargs={
+            'version': 2, 'submission_id': self.submission.id})
+        def feedback():
+            self.submission.feedback = 'Changed'
+            self.submission.save()
+        self.assertRevalidates(url, feedback)
+        self.assertRevalidates(url,
+            lambda: self.submission.submitters.add(self.teacher.userprofile))
+        self.assertRevalidates(url, lambda: self.submission.add_files(
+            MultiValueDict({ 'file1': [SimpleUploadedFile('a.py', b'a')] })))
+        self.submission.files.all().delete()
+
+    def test_user_variance(self):
+        url = reverse('api:course-detail', kwargs={
+            'version': 2, 'course_id': self.instance.id})
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SparseFieldsTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+        self.setUpSubmissions()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def get(self, name, query, **kwargs):
+        kwargs['version'] = 2
+        response = self.client.get(reverse(name, kwargs=kwargs) + query)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_submission(self):
+        full = self.get('api:submission-detail', '',
+            submission_id=self.submission.id)
+        data = self.get('api:submission-detail', '?fields=id,grade',
+            submission_id=self.submission.id)
+        self.assertEqual(list(data.keys()), ['id', 'grade'])
+        self.assertEqual(data['grade'], full['grade'])
+        data = self.get('api:submission-detail', '?fields=exercise.id,submitters',
+            submission_id=self.submission.id)
+        self.assertEqual(list(data.keys()), ['exercise', 'submitters'])
+        self.assertEqual(dict(data['exercise']), {'id': self.exercise.id})
+        self.assertEqual(data['submitters'], full['submitters'])
+
+    def test_points(self):
+        full = self.get('api:course-points-detail', '',
+            course_id=self.instance.id, user_id=self.student.id)
+        data = self.get('api:course-points-detail', '?fields=id,points',
+            course_id=self.instance.id, user_id=self.student.id)
+        self.assertEqual(data, {'id': self.student.id, 'points': full['points']})
+        data = self.get('api:course-points-detail', '?fields=tags.name,modules',
+            course_id=self.instance.id, user_id=self.student.id)
+        self.assertEqual(list(data.keys()), ['tags', 'modules'])
+        self.assertEqual(data['modules'], full['modules'])
+
+
+def course_api(path):
+    return lambda c: '/api/v2/courses/{:d}/{}'.format(c.instance.id, path)
+
+
+def exercise_api(path):
+    return lambda c: '/api/v2/exercises/{:d}/{}'.format(c.exercises[0].id, path)
+
+
+class APIQueryBudgetTest(query_budget.QueryBudgetTestCase):
+    routes = (
+        Route("course", 'teacher', course_api(''),
+            Budget(5), Budget(7, learning_objects=3)),
+        # The learning objects of the module are serialized one by one.
+        Route("exercise module", 'student',
+            lambda c: '/api/v2/courses/{:d}/exercises/{:d}/'.format(
+                c.instance.id, c.modules[0].id),
+            Budget(17, learning_objects=2), Budget(19, learning_objects=5)),
+        Route("students", 'teacher', course_api('students/'),
+            Budget(7), Budget(9, learning_objects=3)),
+        Route("points", 'teacher', course_api('points/'),
+            Budget(7), Budget(9, learning_objects=3)),
+        Route("my points", 'student', course_api('points/me/'),
+            Budget(9), Budget(14, learning_objects=3)),
+        Route("all points", 'teacher', course_api('points/all/'),
+            Budget(8), Budget(13, learning_objects=3)),
+        Route("taggings", 'teacher', course_api('taggings/'),
+            Budget(7), Budget(9, learning_objects=3)),
+        Route("submission data CSV", 'teacher', course_api('submissiondata/?format=csv'),
+            Budget(15, exercises=2), Budget(17, learning_objects=3, exercises=2)),
+        Route("aggregate data CSV", 'teacher', course_api('aggregatedata/?format=csv'),
+            Budget(8), Budget(10, learning_objects=3)),
+        Route("submission changes", 'teacher', course_api('submissionchanges/'),
+            Budget(6), Budget(8, learning_objects=3)),
+        Route("exercise submissions", 'teacher', exercise_api('submissions/'),
+            Budget(12), Budget(14, learning_objects=3)),
+        Route("submitter stats", 'teacher', exercise_api('submitter_stats/'),
+            Budget(12), Budget(14, learning_objects=3)),
+    )
+
@@ -1,26 +1,37 @@
+import json
+import re
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
-from django.http.response import HttpResponse
-from wsgiref.util import FileWrapper
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from rest_framework import mixins, permissions, viewsets
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.response import Response
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
-from lib.api.mixins import MeUserMixin, ListSerializerMixin
+from lib.api.mixins import ConditionalGetMixin, MeUserMixin, ListSerializerMixin
 from lib.api.constants import REGEX_INT, REGEX_INT_ME
+from lib.api.pagination import KeysetPagination
+from lib.sendfile import serve_file
 from userprofile.models import UserProfile, GraderUser
 from userprofile.permissions import IsAdminOrUserObjIsSelf, GraderUserCanOnlyRead
 from course.permissions import (
     IsCourseAdminOrUserObjIsSelf,
     OnlyCourseTeacherPermission,
 )
-from course.api.mixins import CourseResourceMixin
+from course.api.mixins import CourseResourceMixin, course_etag_parts
 from course.api.serializers import StudentBriefSerializer
+from course.models import UserTagging
 from exercise.async_views import _post_async_submission
+from exercise.cache.points import CachedPoints
+from exercise.change_feed import submission_changes
 
 from ..models import (
     Submission,
@@ -48,7 +59,8 @@ GRADER_PERMISSION = api_settings.DEFAULT_PERMISSION_CLASSES + [
 GRADER_PERMISSION = [p for p in GRADER_PERMISSION if p is not GraderUserCanOnlyRead]
 
 
-class ExerciseViewSet(mixins.RetrieveModelMixin,
+class ExerciseViewSet(ConditionalGetMixin,
+                      mixins.RetrieveModelMixin,
                       ExerciseResourceMixin,
                       viewsets.GenericViewSet):
     """
@@ -61,6 +73,11 @@ class ExerciseViewSet(mixins.RetrieveModelMixin,
     serializer_class = ExerciseSerializer
     queryset = BaseExercise.objects.all()
 
+    def get_etag_parts(self):
+        if self.action == 'retrieve':
+            return course_etag_parts(self.instance, self.content)
+        return None
+
     @detail_route(
         url_path='grader',
         methods=['get', 'post'],
@@ -133,11 +150,14 @@ class ExerciseSubmissionsViewSet(NestedViewSetMixin,
     * POST: Make a submission. Returns brief information about submission
     (including link to submission resource: /api/v2/exercises/{exercise_id}/
     submissions/{submissions_id})
-    * GET: User can also get his old submission with GET.
+    * GET: User can also get his old submission with GET. With the GET
+    parameter limit the list is paged newest first, follow the next link
+    (GET parameter cursor).
     """
     filter_backends = (
         SubmissionVisibleFilter,
     )
+    pagination_class = KeysetPagination
     lookup_url_kwarg = 'user_id'
     lookup_field = 'submitters__user__id'
     lookup_value_regex = REGEX_INT_ME
@@ -214,7 +234,8 @@ class ExerciseSubmitterStatsViewSet(ListSerializerMixin,
     queryset = UserProfile.objects.all()
 
 
-class SubmissionViewSet(mixins.RetrieveModelMixin,
+class SubmissionViewSet(ConditionalGetMixin,
+                        mixins.RetrieveModelMixin,
                         SubmissionResourceMixin,
                         viewsets.GenericViewSet):
     """
@@ -227,6 +248,22 @@ class SubmissionViewSet(mixins.RetrieveModelMixin,
     serializer_class = SubmissionSerializer
     queryset = Submission.objects.all()
 
+    def get_etag_parts(self):
+        if self.action != 'retrieve':
+            return None
+        # Submissions have no modification time but the loaded row, the
+        # submitters and the files are compared as a whole.
+        submission = self.submission
+        return course_etag_parts(self.instance, self.content) + tuple(
+            getattr(submission, field.attname)
+            for field in Submission._meta.concrete_fields
+        ) + (
+            tuple(submission.submitters.order_by('id').values_list(
+                'id', 'student_id', 'user__username', 'user__email')),
+            tuple(submission.files.order_by('id').values_list(
+                'id', 'param_name', 'original_name', 'file_object')),
+        )
+
     @detail_route(
         url_path='grader',
         methods=['get', 'post'],
@@ -279,13 +316,12 @@ class SubmissionFileViewSet(NestedViewSetMixin,
 
     def retrieve(self, request, version=None, submission_id=None, submittedfile_id=None):
         sfile = self.get_object()
-        f = open(sfile.file_object.path, 'rb')
-        response = HttpResponse(FileWrapper(f), content_type='application/octet-stream')
-        response['Content-Disposition'] = 'attachment; filename="{}"'.format(sfile.filename)
-        return response
+        return serve_file(request, sfile.file_object.path,
+            'application/octet-stream', filename=sfile.filename)
 
 
-class CoursePointsViewSet(ListSerializerMixin,
+class CoursePointsViewSet(ConditionalGetMixin,
+                          ListSerializerMixin,
                           NestedViewSetMixin,
                           MeUserMixin,
                           CourseResourceMixin,
@@ -303,3 +339,147 @@ class CoursePointsViewSet(ListSerializerMixin,
     listserializer_class = StudentBriefSerializer
     serializer_class = UserPointsSerializer
     queryset = UserProfile.objects.all()
+    batch_size = 200
+
+    def get_etag_parts(self):
+        if self.action == 'retrieve':
+            profile = self.get_object()
+            return (
+                CachedPoints(self.instance, profile.user, self.content).created(),
+                self.get_profile_etag_parts([profile]),
+            )
+        if self.action == 'list_points':
+            # The stale points are generated here and the stream then
+            # reads them from the cache.
+            profiles = self.get_point_profiles()
+            parts = [
+                bool(accepts_gzip.search(self.request.META.get('HTTP_ACCEPT_ENCODING', ''))),
+                self.content.created(),
+            ]
+            for i in range(0, len(profiles), self.batch_size):
+                batch = profiles[i:i + self.batch_size]
+                points = CachedPoints.for_users(
+                    self.instance, [p.user for p in batch], self.content)
+                parts.extend((p.id, q.created()) for p, q in zip(batch, points))
+                parts.extend(self.get_profile_etag_parts(batch))
+            return tuple(parts)
+        return None
+
+    def get_profile_etag_parts(self, profiles):
+        """
+        Returns the user fields and the course tags of the profiles, which
+        the points responses show but which do not update the points.
+        """
+        tags = {}
+        for user_id, tag_id, name in UserTagging.objects.filter(
+                course_instance=self.instance, user__in=profiles)\
+                .values_list('user_id', 'tag_id', 'tag__name'):
+            tags.setdefault(user_id, []).append((tag_id, name))
+        return tuple(
+            (p.id, p.student_id, p.user.username, p.user.email,
+                tuple(tags.get(p.id, ())))
+            for p in profiles
+        )
+
+    def get_point_profiles(self):
+        if not hasattr(self, '_point_profiles'):
+            profiles = self.filter_queryset(self.get_queryset())\
+                .select_related('user').order_by('id')
+            user_ids = self.request.GET.get('user_id')
+            if user_ids:
+                try:
+                    profiles = profiles.filter(
+                        user_id__in=[int(i) for i in user_ids.split(',')])
+                except ValueError:
+                    raise ParseError("Invalid user_id.")
+            self._point_profiles = list(profiles)
+        return self._point_profiles
+
+    @list_route(url_path='all')
+    def list_points(self, request, version=None, course_id=None):
+        """
+        Streams the points of the students as a JSON list. Following GET
+        parameters may be used: user_id (comma separated ids to include)
+        and compact ("yes" for ids and numbers only).
+        """
+        serializer_class = (
+            UserPointsCompactSerializer if request.GET.get('compact') == 'yes'
+            else self.serializer_class
+        )
+        return gzipped(request, StreamingHttpResponse(
+            self.stream_points(self.get_point_profiles(), serializer_class),
+            content_type='application/json',
+        ))
+
+    def stream_points(self, profiles, serializer_class):
+        context = self.get_serializer_context()
+        separator = '['
+        for i in range(0, len(profiles), self.batch_size):
+            batch = profiles[i:i + self.batch_size]
+            points = CachedPoints.for_users(
+                self.instance, [p.user for p in batch], self.content)
+            context['points'] = {p.user.id: p for p in points}
+            context['tags'] = {}
+            for tagging in UserTagging.objects.filter(
+                    course_instance=self.instance, user__in=batch)\
+                    .select_related('tag'):
+                context['tags'].setdefault(tagging.user_id, []).append(tagging.tag)
+            for profile in batch:
+                yield separator + json.dumps(
+                    serializer_class(profile, context=context).data,
+                    cls=JSONEncoder)
+                separator = ','
+        yield ']' if separator == ',' else '[]'
+
+
+accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def gzipped(request, response):
+    """
+    Compresses a streaming response when the client accepts gzip.
+    """
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response.streaming_content = compress_sequence(response.streaming_content)
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+class CourseSubmissionChangesViewSet(NestedViewSetMixin,
+                                     CourseResourceMixin,
+                                     viewsets.GenericViewSet):
+    """
+    Feed of the course submissions that were created or graded after a
+    cursor, in the order of change. Following GET parameters may be used:
+    cursor (from the previous response, starts from the beginning when
+    omitted), limit (max 1000) and exercise_id.
+    The response includes the changes, the cursor of the next request and
+    whether more changes are waiting.
+    """
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES + [
+        OnlyCourseTeacherPermission,
+    ]
+    parent_lookup_map = {'course_id': 'exercise.course_module.course_instance.id'}
+    serializer_class = SubmissionChangeSerializer
+    queryset = Submission.objects.all()
+    max_limit = 1000
+
+    def list(self, request, version=None, course_id=None):
+        queryset = self.get_queryset()
+        try:
+            limit = min(int(request.GET.get('limit', api_settings.PAGE_SIZE)), self.max_limit)
+            exercise_id = request.GET.get('exercise_id')
+            if exercise_id:
+                queryset = queryset.filter(exercise_id=int(exercise_id))
+            submissions, cursor, more = submission_changes(
+                queryset, request.GET.get('cursor'), max(limit, 1))
+        except ValueError:
+            raise ParseError("Invalid cursor, limit or exercise_id.")
+        return Response({
+            'results': self.get_serializer(submissions, many=True).data,
+            'cursor': cursor,
+            'more': more,
+            'next': replace_query_param(
+                request.build_absolute_uri(), 'cursor', cursor) if cursor else None,
+        })
@@ -1,3 +1,5 @@
+from django.utils import timezone
+
 from course.models import CourseModule, LearningObjectCategory
 from ..models import LearningObject
 
@@ -105,6 +107,17 @@ class ContentMixin(object):
     def total(self):
         return self.data['total']
 
+    def module_states(self, when=None):
+        """
+        Returns whether each module has opened and closed at the time. The
+        states change with time and not with the cached data.
+        """
+        when = when or timezone.now()
+        return tuple(
+            (m['id'], m['opening_time'] <= when, m['closing_time'] < when)
+            for m in self.data['modules']
+        )
+
     def modules(self):
         return self.data['modules']
 
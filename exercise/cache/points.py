@@ -2,7 +2,7 @@ from copy import deepcopy
 from django.db.models.signals import post_save, post_delete
 from django.utils import timezone
 
-from lib.cached import CachedAbstract
+from lib.cached import CachedAbstract, NOT_FETCHED
 from notification.models import Notification
 from ..models import LearningObject, Submission
 from .hierarchy import ContentMixin
@@ -10,14 +10,76 @@ from .hierarchy import ContentMixin
 class CachedPoints(ContentMixin, CachedAbstract):
     KEY_PREFIX = 'points'
 
-    def __init__(self, course_instance, user, content):
+    def __init__(self, course_instance, user, content,
+            prefetched=NOT_FETCHED, submissions=None):
         self.content = content
         self.instance = course_instance
         self.user = user
-        super().__init__(course_instance, user)
+        self.submissions = submissions
+        super().__init__(course_instance, user, prefetched=prefetched)
+
+    @classmethod
+    def for_users(cls, course_instance, users, content):
+        """
+        Returns the points of many users. The cache is read with a single
+        request and the missing points are generated from one query for
+        the submissions, one for their notifications and one for the
+        parents of their exercises.
+        """
+        users = list(users)
+        cached = cls.get_many_data([(course_instance, user) for user in users])
+        stale = [
+            user.userprofile.id for user, data in zip(users, cached)
+            if cls._is_stale(data, content)
+        ]
+        submissions = cls._submissions_by_profile(course_instance, stale)
+        return [
+            cls(course_instance, user, content, prefetched=data,
+                submissions=submissions.get(user.userprofile.id, []))
+            for user, data in zip(users, cached)
+        ]
+
+    @classmethod
+    def _submissions_by_profile(cls, course_instance, profile_ids):
+        if not profile_ids:
+            return {}
+        submitters = Submission.submitters.through.objects\
+            .filter(
+                userprofile_id__in=profile_ids,
+                submission__exercise__course_module__course_instance=course_instance,
+            )\
+            .exclude(submission__status__in=(
+                Submission.STATUS.ERROR,
+                Submission.STATUS.REJECTED,
+            ))\
+            .select_related('submission__exercise__course_module__course_instance__course')\
+            .order_by('-submission_id')
+        by_profile = {}
+        submissions = {}
+        exercises = {}
+        for row in submitters:
+            submission = submissions.setdefault(row.submission_id, row.submission)
+            # The submissions of an exercise share one exercise object.
+            submission.exercise = exercises.setdefault(
+                submission.exercise_id, submission.exercise)
+            submission.notification_counts = [0, 0]
+            by_profile.setdefault(row.userprofile_id, []).append(submission)
+        # The URLs of the submissions need the parents of the exercises.
+        LearningObject.objects.set_parents(list(exercises.values()))
+        for notification in Notification.objects\
+                .filter(submission_id__in=submissions.keys())\
+                .values('submission_id', 'seen'):
+            counts = submissions[notification['submission_id']].notification_counts
+            counts[0] += 1
+            counts[1] += 0 if notification['seen'] else 1
+        return by_profile
+
+    @classmethod
+    def _is_stale(cls, data, content):
+        return data is None or data['created'] < content.created()
 
     def _needs_generation(self, data):
-        return data is None or data['created'] < self.content.created()
+        return self._is_stale(data, self.content)
 
     def _generate_data(self, instance, user, data=None):
         data = deepcopy(self.content.data)
@@ -67,12 +129,14 @@ class CachedPoints(ContentMixin, CachedAbstract):
 
         # Augment submission data.
         if user.is_authenticated():
-            for submission in user.userprofile.submissions\
-                  .exclude_errors()\
-                  .filter(exercise__course_module__course_instance=instance):
-                  #.prefetch_related("notifications"): breaks things
+            submissions = self.submissions
+            if submissions is None:
+                profile_id = user.userprofile.id
+                submissions = self._submissions_by_profile(instance, [profile_id])\
+                    .get(profile_id, [])
+            for submission in submissions:
                 try:
-                    tree = self._by_idx(modules, exercise_index[submission.exercise.id])
+                    tree = self._by_idx(modules, exercise_index[submission.exercise_id])
                 except KeyError:
                     self.dirty = True
                     continue
@@ -111,9 +175,10 @@ class CachedPoints(ContentMixin, CachedAbstract):
                         'graded': submission.status == Submission.STATUS.READY,
                         'unofficial': unofficial,
                     })
-                if submission.notifications.count() > 0:
+                counts = submission.notification_counts
+                if counts[0] > 0:
                     entry['notified'] = True
-                    if submission.notifications.filter(seen=False).count() > 0:
+                    if counts[1] > 0:
                         entry['unseen'] = True
 
         # Confirm points.
@@ -0,0 +1,52 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from lib.pagination import decode_cursor, encode_cursor
+
+
+def changed_after(queryset, changed=None, last_id=None, until=None):
+    """
+    Filters the submissions created or graded after the watermark and
+    orders them by change. The change time is the grading time or, before
+    grading, the submission time, and equal times are ordered by id. The
+    change time and the id of the last seen submission continue the
+    sequence where it was left.
+    """
+    queryset = queryset.annotate(changed=Coalesce('grading_time', 'submission_time'))
+    if changed is not None:
+        queryset = queryset.filter(
+            # Indexed columns narrow the rows before the exact comparison.
+            Q(grading_time__gte=changed) | Q(submission_time__gte=changed)
+        ).filter(
+            Q(changed__gt=changed) | Q(changed=changed, id__gt=last_id or 0)
+        )
+    if until is not None:
+        queryset = queryset.filter(changed__lte=until)
+    return queryset.order_by('changed', 'id')
+
+
+def submission_changes(queryset, cursor=None, limit=100):
+    """
+    Returns a page of submissions from the queryset that were created or
+    graded after the cursor, the cursor of the following page and whether
+    more changes are waiting.
+
+    Changes younger than SUBMISSION_CHANGES_DELAY seconds are held back:
+    a transaction that has not committed yet may still write a change time
+    older than the last returned one, and the cursor would skip it.
+    """
+    changed, last_id = decode_cursor(cursor) if cursor else (None, None)
+    until = timezone.now() - datetime.timedelta(seconds=settings.SUBMISSION_CHANGES_DELAY)
+    submissions = list(
+        changed_after(queryset, changed, last_id, until)[:limit + 1]
+    )
+    more = len(submissions) > limit
+    submissions = submissions[:limit]
+    if submissions:
+        last = submissions[-1]
+        cursor = encode_cursor(last.changed, last.id)
+    return submissions, cursor, more
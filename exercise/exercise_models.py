@@ -1,11 +1,14 @@
 import datetime
+from collections import OrderedDict
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
+from django.core.signals import request_finished
 from django.core.urlresolvers import reverse
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.db.models import signals
 from django.db.models.signals import post_delete, post_save
 from django.template import loader, Context
@@ -31,6 +34,7 @@ from lib.helpers import (
     roman_numeral,
 )
 from lib.models import UrlMixin
+from lib.write_buffer import WriteBuffer
 from userprofile.models import UserProfile
 
 from .cache.exercise import ExerciseCache
@@ -46,6 +50,22 @@ class LearningObjectManager(models.Manager):
             .select_related('course_module', 'course_module__course_instance',
                 'course_module__course_instance__course', 'category')
 
+    def set_parents(self, learning_objects):
+        """
+        Sets the parent lists, which the names and URLs of learning objects
+        need, from one query for the learning objects of their modules.
+        """
+        module_ids = set(o.course_module_id for o in learning_objects)
+        by_id = { o.id: o for o in self.filter(course_module_id__in=module_ids) }
+        for obj in learning_objects:
+            parents = [obj]
+            parent_id = obj.parent_id
+            while parent_id is not None:
+                parent = by_id[parent_id]
+                parents.insert(0, parent)
+                parent_id = parent.parent_id
+            obj._parents = parents
+
     def find_enrollment_exercise(self, course_instance, profile):
         exercise = None
         if profile.is_external:
@@ -266,13 +286,138 @@ post_save.connect(invalidate_exercise, sender=LearningObject)
 post_delete.connect(invalidate_exercise, sender=LearningObject)
 
 
+class LearningObjectDisplayManager(models.Manager):
+
+    def add(self, learning_object, profile):
+        """
+        Records a view of the learning object. The record is written behind
+        in bulk, but the last view of the user on the course is available
+        right away from last_view.
+        """
+        display = self.model(learning_object=learning_object, profile=profile,
+            timestamp=timezone.now())
+        cache.set(
+            self._last_view_key(profile.id, learning_object.course_module.course_instance_id),
+            (learning_object.id, display.timestamp),
+            settings.DISPLAY_LAST_VIEW_TIMEOUT,
+        )
+        display_buffer.add(display)
+
+    def last_view(self, profile, course_instance, cached=True):
+        """
+        Returns the id of the learning object that the user viewed last on
+        the course and the time of the view, or None. Only the views of
+        ready learning objects are searched unless the cached view is used.
+        """
+        last = None
+        if cached:
+            last = cache.get(self._last_view_key(profile.id, course_instance.id))
+        if last is None:
+            last = self.filter(
+                profile=profile,
+                learning_object__status=LearningObject.STATUS.READY,
+                learning_object__course_module__course_instance=course_instance,
+            ).order_by('-timestamp').values_list('learning_object_id', 'timestamp').first()
+        return last
+
+    def _last_view_key(self, profile_id, course_instance_id):
+        return 'lastview:{:d}:{:d}'.format(profile_id, course_instance_id)
+
+
 class LearningObjectDisplay(models.Model):
     """
     Records views of learning objects.
     """
     learning_object = models.ForeignKey(LearningObject)
     profile = models.ForeignKey(UserProfile)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the view is recorded, not when the buffered row is saved.
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    objects = LearningObjectDisplayManager()
+
+
+display_buffer = WriteBuffer(LearningObjectDisplay,
+    size=lambda: settings.DISPLAY_BUFFER_SIZE,
+    seconds=lambda: settings.DISPLAY_BUFFER_SECONDS)
+
+
+def _flush_display_buffer(sender, **kwargs):
+    display_buffer.flush_due()
+request_finished.connect(_flush_display_buffer)
+
+
+class LearningObjectErrorReportManager(models.Manager):
+
+    def add(self, learning_object, signature, **fields):
+        """
+        Counts an error occurrence into the report of the same learning
+        object and error signature or creates a new report for it.
+        """
+        now = timezone.now()
+        reports = self.filter(learning_object=learning_object, signature=signature)
+        if reports.update(count=models.F('count') + 1, last_time=now):
+            return
+        try:
+            with transaction.atomic():
+                self.create(learning_object=learning_object,
+                    signature=signature, first_time=now, last_time=now,
+                    **fields)
+        except IntegrityError:
+            reports.update(count=models.F('count') + 1, last_time=now)
+
+    def send_digests(self):
+        """
+        Emails the collected reports as a single digest per learning object
+        and removes the sent reports. Returns the number of handled digests.
+        """
+        from lib.email_messages import email_course_error_digest
+        by_object = OrderedDict()
+        for report in self.select_related(
+                'learning_object',
+                'learning_object__course_module__course_instance__course')\
+                .order_by('learning_object_id', 'first_time'):
+            by_object.setdefault(report.learning_object_id, []).append(report)
+
+        sent = 0
+        for reports in by_object.values():
+            exercise = reports[0].learning_object.as_leaf_class()
+            if not email_course_error_digest(exercise, reports):
+                continue
+            sent += 1
+            for report in reports:
+                # Keep occurrences that were added while sending.
+                if not self.filter(id=report.id, count=report.count).delete()[0]:
+                    self.filter(id=report.id).update(
+                        count=models.F('count') - report.count,
+                        first_time=report.last_time,
+                    )
+        return sent
+
+
+class LearningObjectErrorReport(models.Model):
+    """
+    Collects repeating errors of a learning object that are emailed to the
+    course staff as periodic digests.
+    """
+    learning_object = models.ForeignKey(LearningObject,
+        related_name="error_reports", on_delete=models.CASCADE)
+    signature = models.CharField(max_length=40)
+    message = models.TextField()
+    error_trace = models.TextField(blank=True)
+    request_fields = models.TextField(blank=True)
+    exercise_url = models.CharField(max_length=255, blank=True)
+    course_edit_url = models.CharField(max_length=255, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    first_time = models.DateTimeField(default=timezone.now)
+    last_time = models.DateTimeField(default=timezone.now)
+
+    objects = LearningObjectErrorReportManager()
+
+    class Meta:
+        unique_together = ("learning_object", "signature")
+
+    def __str__(self):
+        return "{} x{:d}: {}".format(self.learning_object, self.count, self.message)
 
 
 class CourseChapter(LearningObject):
@@ -458,14 +603,14 @@ class BaseExercise(LearningObject):
         #    return False, warnings, students
 
         # Check enrollment requirements.
-        enrollment = self.course_instance.get_enrollment_for(profile.user)
+        roles = self.course_instance.get_roles(profile.user)
         if self.status in (
             LearningObject.STATUS.ENROLLMENT,
             LearningObject.STATUS.ENROLLMENT_EXTERNAL,
         ):
             if not self.course_instance.is_enrollable(profile.user):
                 return False, [_('You cannot enroll in the course.')], students
-        elif not enrollment:
+        elif not roles.is_student:
             # TODO Provide button to enroll, should there be option to auto-enroll
             return self.course_instance.is_course_staff(profile.user), [_('You must enroll at course home to submit exercises.')], students
 
@@ -482,8 +627,8 @@ class BaseExercise(LearningObject):
                     ).first()
             except ValueError:
                 pass
-        elif enrollment and enrollment.selected_group:
-            group = enrollment.selected_group
+        elif roles.selected_group_id:
+            group = StudentGroup.objects.filter(id=roles.selected_group_id).first()
 
         # Check groups cannot be changed after submitting.
         submissions = list(self.get_submissions_for_student(profile))
@@ -1,7 +1,5 @@
-from django.db.models import Max
-
 from course.models import StudentGroup
-from .models import BaseExercise, Submission
+from .models import BaseExercise, ExerciseResult, Submission
 
 
 class UserExerciseSummary(object):
@@ -27,6 +25,8 @@ class UserExerciseSummary(object):
             self.submissions = list(exercise.get_submissions_for_student(
                 user.userprofile))
             for s in self.submissions:
+                # The URLs of the submissions resolve the path of the exercise once.
+                s.exercise = exercise
                 if not s.status in (
                     Submission.STATUS.ERROR,
                     Submission.STATUS.REJECTED,
@@ -148,18 +148,14 @@ class ResultTable:
         Helper for the __init__.
         This method puts the data from the database in to the results table.
         """
-        submissions = list(Submission.objects \
-            .filter(
-                exercise__course_module__course_instance=self.course_instance,
-                status=Submission.STATUS.READY
-            ).values("submitters", "exercise", "exercise__category") \
-            .annotate(best=Max("grade")) \
-            .order_by()) # Remove default ordering.
-        for submission in submissions:
-            student_id = submission["submitters"]
+        results = ExerciseResult.objects \
+            .filter(course_instance=self.course_instance, graded=True) \
+            .values("profile", "exercise", "exercise__category", "points")
+        for result in results:
+            student_id = result["profile"]
             if student_id in self.results:
-                self.results[student_id][submission["exercise"]] = submission["best"]
-                self.results_by_category[student_id][submission["exercise__category"]] += submission["best"]
+                self.results[student_id][result["exercise"]] = result["points"]
+                self.results_by_category[student_id][result["exercise__category"]] += result["points"]
 
 
     def results_for_template(self):
@@ -0,0 +1,74 @@
+import os
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from ...models import SubmittedFile, SubmittedFileContent
+
+
+class Command(BaseCommand):
+    help = "Move submitted files to the deduplicated content store and report the disk use."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--dry-run', action='store_true',
+                            help="Only report the space that would be reclaimed.")
+        parser.add_argument('-r', '--report', action='store_true',
+                            help="Only report the current disk use.")
+
+    def handle(self, *args, **options):
+        if not options['report']:
+            self.deduplicate(options['dry_run'])
+        self.report()
+
+    def deduplicate(self, dry_run):
+        stored = set(SubmittedFileContent.objects.values_list('sha256', flat=True))
+        moved = duplicates = missing = reclaimed = 0
+        legacy = SubmittedFile.objects.filter(content__isnull=True)
+        for sfile in legacy.iterator():
+            path = sfile.file_object.path
+            if not os.path.exists(path):
+                missing += 1
+                continue
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                file = File(f)
+                sha256 = SubmittedFileContent.objects.hash_file(file)
+                if dry_run:
+                    created = sha256 not in stored
+                    stored.add(sha256)
+                else:
+                    with transaction.atomic():
+                        content, created = SubmittedFileContent.objects.store(file, sha256)
+                        sfile.original_name = sfile.filename
+                        sfile.file_object = content.file_object.name
+                        sfile.content = content
+                        sfile.save()
+            if not dry_run:
+                default_storage.delete(path)
+            moved += 1
+            if not created:
+                duplicates += 1
+                reclaimed += size
+
+        self.stdout.write(
+            "{} {:d} files of which {:d} were duplicates, reclaimed {:d} bytes. "
+            "{:d} files were missing from the disk.".format(
+                "Would move" if dry_run else "Moved",
+                moved, duplicates, reclaimed, missing))
+
+    def report(self):
+        contents = SubmittedFileContent.objects.aggregate(size=Sum('size'))
+        references = SubmittedFile.objects.filter(content__isnull=False)\
+            .aggregate(size=Sum('content__size'))
+        stored = contents['size'] or 0
+        referenced = references['size'] or 0
+        self.stdout.write(
+            "Content store: {:d} files referenced by {:d} submitted files, "
+            "{:d} bytes stored for {:d} bytes submitted, {:d} bytes saved. "
+            "{:d} submitted files are stored separately.".format(
+                SubmittedFileContent.objects.count(),
+                SubmittedFile.objects.filter(content__isnull=False).count(),
+                stored, referenced, referenced - stored,
+                SubmittedFile.objects.filter(content__isnull=True).count()))
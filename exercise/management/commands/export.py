@@ -1,124 +1,393 @@
-import json, re
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
 from course.models import CourseInstance, LearningObjectCategory
-from ...models import BaseExercise, LearningObjectDisplay
+from ...api.csv.submission_sheet import iter_submissions
+from ...change_feed import submission_changes
+from ...models import BaseExercise, LearningObjectDisplay, Submission
 from ...exercise_summary import ResultTable
 
 
+EXERCISE_FIELDS = ['EID', 'Exercise', 'Time', 'UID', 'Student ID', 'Email', 'Status', 'Grade']
+COURSE_FIELDS = ['Time', 'UID', 'Email', 'MID', 'Module', 'EID', 'Exercise', 'Status', 'Grade']
+JSON_FIELDS = COURSE_FIELDS + ['Submission data', 'Grading data']
+VIEW_FIELDS = ['Time', 'UID', 'Email', 'MID', 'Module', 'EID', 'Exercise']
+CHANGE_FIELDS = ['SID', 'Changed', 'Time', 'Graded', 'UID', 'Email', 'EID',
+                 'Status', 'Grade', 'Submission data']
+
+
+class Echo(object):
+    def write(self, value):
+        return value
+
+
+class CommandOutput(object):
+    """
+    Writes text to the output of a command without adding line endings.
+    """
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, text):
+        self.stdout.write(text, ending='')
+
+
+class RowWriter(object):
+    """
+    Serializes the rows (dicts) as CSV, a JSON array or JSON Lines. The rows
+    of a continued writer follow rows written elsewhere, see copy.
+    """
+    separator = ','
+
+    def __init__(self, fmt, header, continued=False):
+        self.fmt = fmt
+        self.header = header
+        self.csv = csv.writer(Echo(), lineterminator='\n')
+        self.count = 1 if continued else 0
+
+    def header_line(self):
+        if self.fmt == 'csv':
+            return self.csv.writerow(self.header)
+        if self.fmt == 'json':
+            return '[\n'
+        return ''
+
+    def line(self, row):
+        if self.fmt == 'csv':
+            text = self.csv.writerow([row.get(key) for key in self.header])
+        else:
+            text = json.dumps(row, default=str) + '\n'
+            if self.fmt == 'json' and self.count:
+                text = self.separator + text
+        self.count += 1
+        return text
+
+    def footer_line(self):
+        if self.fmt == 'json':
+            return ']\n'
+        return ''
+
+    def copy(self, f, out, count):
+        """
+        Copies the count rows that a continued writer wrote to the file f.
+        """
+        if self.fmt == 'json' and count and not self.count:
+            f.read(len(self.separator))
+        shutil.copyfileobj(f, out)
+        self.count += count
+
+
+def submission_rows(kind, exercise_id, students, fields):
+    """
+    Yields the rows for the submissions of an exercise whose first
+    submitter is a student. The submissions are read in chunks.
+    """
+    exercise = BaseExercise.objects.select_related('course_module').get(id=exercise_id)
+    module = exercise.course_module
+    if kind == 'exercise' and exercise.parent:
+        name = "{} {}".format(exercise.parent, exercise)
+    else:
+        name = str(exercise)
+    queryset = Submission.objects.filter(exercise_id=exercise_id)\
+        .prefetch_related('submitters__user')
+
+    for submission in iter_submissions(queryset):
+        profiles = submission.submitters.all()
+        profile = profiles[0] if profiles else None
+        if profile is None or not profile.id in students:
+            continue
+        if kind == 'exercise':
+            row = OrderedDict([
+                ('EID', exercise.id),
+                ('Exercise', name),
+                ('Time', str(submission.submission_time)),
+                ('UID', profile.id),
+                ('Student ID', profile.student_id or ""),
+                ('Email', profile.user.email or ""),
+                ('Status', submission.status),
+                ('Grade', submission.grade),
+            ])
+            values = OrderedDict((field, []) for field in fields)
+            for key,val in submission.submission_data or []:
+                if key in values:
+                    values[key].append(str(val))
+            for field in fields:
+                row[field] = ';'.join(values[field])
+        else:
+            row = OrderedDict([
+                ('Time', str(submission.submission_time)),
+                ('UID', profile.id),
+                ('Email', profile.user.email),
+                ('MID', module.id),
+                ('Module', str(module)),
+                ('EID', exercise.id),
+                ('Exercise', name),
+                ('Status', submission.status),
+                ('Grade', submission.grade),
+            ])
+            if kind == 'json':
+                row['Submission data'] = submission.submission_data or []
+                row['Grading data'] = submission.grading_data or {}
+        yield row
+
+
+def export_exercise_to_file(task):
+    """
+    Writes the serialized rows of an exercise to a temporary file in a
+    worker process. Returns the path of the file and the number of rows.
+    """
+    kind, exercise_id, students, fields, fmt, header = task
+    writer = RowWriter(fmt, header, continued=True)
+    count = 0
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.export',
+            delete=False) as f:
+        for row in submission_rows(kind, exercise_id, students, fields):
+            f.write(writer.line(row))
+            count += 1
+    return f.name, count
+
+
+def chunked(queryset, chunk_size=2000):
+    """
+    Iterates the queryset in primary key order one chunk query at a time.
+    """
+    queryset = queryset.order_by('id')
+    last_id = None
+    while True:
+        chunk = list((queryset.filter(id__gt=last_id) if last_id else queryset)[:chunk_size])
+        for obj in chunk:
+            yield obj
+        if len(chunk) < chunk_size:
+            break
+        last_id = chunk[-1].id
+
+
 class Command(BaseCommand):
-    args = 'exercise/exercises/category/course/json/views/results id(s)'
-    help = 'Exports submission data.'
+    help = 'Exports submission data as CSV, JSON or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=[
+            'exercise', 'exercises', 'category', 'course', 'json', 'views', 'results',
+            'changes',
+        ], help="Exercise (or exercises, category) submissions, course submissions, "
+                "course submissions with data (json), views, results or the course "
+                "submissions created or graded after the cursor (changes).")
+        parser.add_argument('ids', nargs='+', type=int,
+                            help="Exercise, category or course instance id(s).")
+        parser.add_argument('-f', '--format', choices=['csv', 'json', 'jsonl'],
+                            help="Output format, csv by default. The json target is "
+                                 "a JSON document by default and may use JSON Lines.")
+        parser.add_argument('-o', '--output', metavar="FILE",
+                            help="Write to the file instead of the standard output.")
+        parser.add_argument('-z', '--gzip', action='store_true',
+                            help="Compress the output with gzip. Without --output the "
+                                 "compressed bytes are written to the binary stream "
+                                 "of the standard output.")
+        parser.add_argument('-w', '--workers', metavar="N", type=int, default=1,
+                            help="Export N exercises in parallel processes.")
+        parser.add_argument('-c', '--cursor',
+                            help="Cursor from the previous changes export. The cursor "
+                                 "to continue from is written to the standard error.")
 
     def handle(self, *args, **options):
-        if len(args) < 2:
-            raise CommandError('Missing arguments: ' + self.args)
-        if args[0] == 'exercise':
-            self.export_exercise(args[1])
-        elif args[0] == 'exercises':
-            self.export_exercises(args[1:])
-        elif args[0] == 'category':
-            self.export_category(args[1])
-        elif args[0] == 'course':
-            self.export_course(args[1])
-        elif args[0] == 'json':
-            self.export_json(args[1])
-        elif args[0] == 'views':
-            self.export_views(args[1])
-        elif args[0] == 'results':
-            self.export_results(args[1])
-        else:
-            raise CommandError('Unknown argument!')
+        target = options['target']
+        ids = options['ids']
+        fmt = options['format'] or ('json' if target == 'json' else 'csv')
+        if target == 'json' and fmt == 'csv':
+            raise CommandError('The json target is written as json or jsonl.')
+        self.progress = options['verbosity'] > 0
 
-    def export_exercises(self, eids):
-        fields = set()
-        for eid in eids:
-            exercise = BaseExercise.objects.get(id=eid)
-            for s in exercise.submissions.all():
-                if s.submission_data:
-                    for key,val in s.submission_data:
-                        fields.add(key)
-        fields = sorted(fields)
-        n = 0
-        for eid in eids:
-            self.export_exercise(eid, n == 0, fields)
-            n += 1
-
-    def export_category(self, cid):
-        category = LearningObjectCategory.objects.get(id=cid)
-        self.export_exercises(list(e.id for e in category.learning_objects.all()))
-
-    def export_exercise(self, eid, print_header=True, fields=None):
-        exercise = BaseExercise.objects.filter(id=eid).first()
-        if not exercise:
-            raise CommandError('Exercise {} not found.'.format(eid))
-
-        students = [u['id'] for u in exercise.course_module.course_instance.students.values('id')]
-        submissions = [s for s in exercise.submissions.all() if s.submitters.first().id in students]
-
-        if fields is None:
-            fields = set()
-            for s in submissions:
-                if s.submission_data:
-                    for key,val in s.submission_data:
-                        fields.add(key)
-            fields = sorted(fields)
-
-        header = [ 'EID', 'Exercise', 'Time', 'UID', 'Student ID', 'Email', 'Status', 'Grade']#, 'Feedback', 'A.Feedback' ]
-        header += fields
-        if print_header:
-            self.print_row(header)
-
-        for submission in submissions:
-            profile = submission.submitters.first()
-            data = [
-                str(exercise.id),
-                '"' + ((str(exercise.parent) + ' ' + str(exercise)) if exercise.parent else str(exercise)) + '"',
-                str(submission.submission_time),
-                str(profile.id),
-                profile.student_id or "",
-                profile.user.email or "",
-                submission.status,
-                str(submission.grade),
-                #self.strip_html_tags(submission.feedback),
-                #submission.assistant_feedback,
-            ]
-            values = [[] for field in fields]
-            if submission.submission_data:
-                for key,val in submission.submission_data:
-                    values[fields.index(key)].append(val.replace('"','\'').replace('\n','\\n').replace('\r',''))
-            data += ['"' + (';'.join(v)) + '"' for v in values]
-            self.print_row(data)
-
-    def export_course(self, cid):
-        instance = CourseInstance.objects.filter(id=cid).first()
+        with ExitStack() as stack:
+            out = self.open_output(stack, options['output'], options['gzip'],
+                options.get('stdout') or sys.stdout)
+            if target in ('exercise', 'exercises', 'category'):
+                if target == 'category':
+                    category = LearningObjectCategory.objects.filter(id=ids[0]).first()
+                    if not category:
+                        raise CommandError('Category not found.')
+                    exercises = BaseExercise.objects.filter(category=category)
+                else:
+                    exercises = BaseExercise.objects.filter(id__in=ids)
+                    missing = set(ids) - set(e.id for e in exercises)
+                    if missing:
+                        raise CommandError('Exercise {} not found.'.format(missing.pop()))
+                self.export_submissions(out, 'exercise', exercises, fmt, options['workers'])
+            elif target in ('course', 'json'):
+                instance = self.get_instance(ids[0])
+                exercises = BaseExercise.objects.filter(course_module__course_instance=instance)
+                self.export_submissions(out, target, exercises, fmt, options['workers'])
+            elif target == 'changes':
+                self.export_changes(out, self.get_instance(ids[0]), fmt, options['cursor'])
+            elif target == 'views':
+                self.export_views(out, self.get_instance(ids[0]), fmt)
+            else:
+                self.export_results(out, self.get_instance(ids[0]), fmt)
+
+    def open_output(self, stack, path, compress, stream):
+        """
+        Opens the file or, without a path, the output of the command. The
+        compressed output is written to the binary stream of a text stream.
+        """
+        if compress:
+            if path:
+                return stack.enter_context(
+                    gzip.open(path, 'wt', encoding='utf-8', newline=''))
+            return stack.enter_context(io.TextIOWrapper(
+                gzip.GzipFile(fileobj=getattr(stream, 'buffer', stream), mode='wb'),
+                encoding='utf-8', newline=''))
+        if path:
+            return stack.enter_context(open(path, 'w', encoding='utf-8', newline=''))
+        return CommandOutput(self.stdout)
+
+    def get_instance(self, instance_id):
+        instance = CourseInstance.objects.filter(id=instance_id).first()
         if not instance:
             raise CommandError('Course instance not found.')
-        students = [u['id'] for u in instance.students.values('id')]
+        return instance
+
+    def write(self, out, text):
+        if text:
+            out.write(text)
+
+    def report(self, message):
+        if self.progress:
+            self.stderr.write(message)
+
+    def submitted_fields(self, exercise_ids):
+        """
+        Collects the submitted data keys without loading the submissions.
+        """
+        fields = set()
+        data = Submission.objects.filter(exercise_id__in=exercise_ids)\
+            .order_by().values_list('submission_data', flat=True)
+        for submission_data in data.iterator():
+            for key,val in submission_data or []:
+                fields.add(key)
+        return sorted(fields)
+
+    def export_submissions(self, out, kind, exercises, fmt, workers):
+        exercises = list(exercises.select_related('course_module').order_by('id'))
+        exercise_ids = [e.id for e in exercises]
+        fields = self.submitted_fields(exercise_ids) if kind == 'exercise' else []
+        header = {
+            'exercise': EXERCISE_FIELDS + fields,
+            'course': COURSE_FIELDS,
+            'json': JSON_FIELDS,
+        }[kind]
+        writer = RowWriter(fmt, header)
+        self.write(out, writer.header_line())
 
-        self.print_row([ 'Time', 'UID', 'Email', 'MID', 'Module', 'EID', 'Exercise', 'Status', 'Grade' ])
+        students = {}
+        tasks = []
+        for exercise in exercises:
+            instance_id = exercise.course_module.course_instance_id
+            if not instance_id in students:
+                students[instance_id] = frozenset(CourseInstance.objects\
+                    .get(id=instance_id).students.values_list('id', flat=True))
+            tasks.append((kind, exercise.id, students[instance_id], fields, fmt, header))
 
-        for exercise in BaseExercise.objects.filter(course_module__course_instance=instance).all():
-            module = exercise.course_module
-            submissions = [s for s in exercise.submissions.all() if s.submitters.first().id in students]
+        total = 0
+        if workers > 1:
+            # Forked workers must open database connections of their own.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(export_exercise_to_file, tasks)
+                for i,(path, count) in enumerate(results):
+                    with open(path, 'r', encoding='utf-8', newline='') as f:
+                        writer.copy(f, out, count)
+                    os.remove(path)
+                    total += count
+                    self.report_exercise(i, tasks, count)
+        else:
+            for i,task in enumerate(tasks):
+                count = 0
+                for row in submission_rows(*task[:4]):
+                    self.write(out, writer.line(row))
+                    count += 1
+                total += count
+                self.report_exercise(i, tasks, count)
+        self.write(out, writer.footer_line())
+        self.report("Exported {:d} rows.".format(total))
+
+    def report_exercise(self, i, tasks, count):
+        self.report("[{:d}/{:d}] exercise {:d}: {:d} rows".format(
+            i + 1, len(tasks), tasks[i][1], count))
+
+    def export_changes(self, out, instance, fmt, cursor):
+        writer = RowWriter(fmt, CHANGE_FIELDS)
+        self.write(out, writer.header_line())
+        queryset = Submission.objects\
+            .filter(exercise__course_module__course_instance=instance)\
+            .prefetch_related('submitters__user')
+        count = 0
+        more = True
+        while more:
+            try:
+                submissions, cursor, more = submission_changes(queryset, cursor, 2000)
+            except ValueError:
+                raise CommandError('Invalid cursor.')
             for submission in submissions:
-                profile = submission.submitters.first()
-                self.print_row([
-                    str(submission.submission_time),
-                    str(profile.id),
-                    profile.user.email,
-                    str(module.id),
-                    str(module),
-                    str(exercise.id),
-                    str(exercise),
-                    submission.status,
-                    str(submission.grade),
-                ])
-
-    def export_results(self, cid):
-        instance = CourseInstance.objects.filter(id=cid).first()
-        if not instance:
-            raise CommandError('Course instance not found.')
+                profiles = submission.submitters.all()
+                self.write(out, writer.line(OrderedDict([
+                    ('SID', submission.id),
+                    ('Changed', str(submission.changed)),
+                    ('Time', str(submission.submission_time)),
+                    ('Graded', str(submission.grading_time or '')),
+                    ('UID', ';'.join(str(p.id) for p in profiles)),
+                    ('Email', ';'.join(p.user.email for p in profiles)),
+                    ('EID', submission.exercise_id),
+                    ('Status', submission.status),
+                    ('Grade', submission.grade),
+                    ('Submission data', submission.submission_data or []),
+                ])))
+            count += len(submissions)
+        self.write(out, writer.footer_line())
+        self.report("Exported {:d} rows.".format(count))
+        if cursor:
+            self.stderr.write("Cursor: {}".format(cursor))
+
+    def export_views(self, out, instance, fmt):
+        students = set(instance.students.values_list('id', flat=True))
+        writer = RowWriter(fmt, VIEW_FIELDS)
+        self.write(out, writer.header_line())
+        names = {}
+        displays = LearningObjectDisplay.objects\
+            .filter(learning_object__course_module__course_instance=instance)\
+            .select_related('profile__user', 'learning_object__course_module')
+        count = 0
+        for d in chunked(displays):
+            if not d.profile_id in students:
+                continue
+            lobject = d.learning_object
+            module = lobject.course_module
+            if not lobject.id in names:
+                names[lobject.id] = (str(module), str(lobject))
+            module_name, lobject_name = names[lobject.id]
+            self.write(out, writer.line(OrderedDict([
+                ('Time', str(d.timestamp)),
+                ('UID', d.profile_id),
+                ('Email', d.profile.user.email),
+                ('MID', module.id),
+                ('Module', module_name),
+                ('EID', lobject.id),
+                ('Exercise', lobject_name),
+            ])))
+            count += 1
+        self.write(out, writer.footer_line())
+        self.report("Exported {:d} rows.".format(count))
+
+    def export_results(self, out, instance, fmt):
         table = ResultTable(instance)
 
         difficulties = set()
@@ -132,83 +401,26 @@ class Command(BaseCommand):
         labels.extend(difficulties)
         def label(exercise):
             return "{} ({})".format(str(exercise), exercise.difficulty)
-        labels.extend([label(e) for e in table.exercises])
-        self.print_row(labels)
+        exercise_labels = [label(e) for e in table.exercises]
+        labels.extend(exercise_labels)
+        writer = RowWriter(fmt, labels)
+        self.write(out, writer.header_line())
 
         for student in table.students:
             points = [table.results[student.id][exercise.id] or 0 for exercise in table.exercises]
-            row = [
-                str(student.id),
-                student.student_id or '',
-                student.user.email,
-                student.user.first_name + ' ' + student.user.last_name,
-                '/'.join([t.name for t in student.taggings.tags_for_instance(instance)]),
-                str(sum(points)),
-            ]
+            row = OrderedDict([
+                ('UID', student.id),
+                ('Student ID', student.student_id or ''),
+                ('Email', student.user.email),
+                ('Name', student.user.first_name + ' ' + student.user.last_name),
+                ('Tags', '/'.join([t.name for t in student.taggings.tags_for_instance(instance)])),
+                ('Total', sum(points)),
+            ])
             for c in table.categories:
-                row.append(str(table.results_by_category[student.id][c.id]))
+                row[c.name] = table.results_by_category[student.id][c.id]
             for d in difficulties:
-                row.append(str(sum(p for i,p in enumerate(points) if table.exercises[i].difficulty == d)))
-            row.extend([str(p) for p in points])
-            self.print_row(row)
-
-    def export_json(self, cid):
-        instance = CourseInstance.objects.filter(id=cid).first()
-        if not instance:
-            raise CommandError('Course instance not found.')
-        students = [u['id'] for u in instance.students.values('id')]
-
-        data = []
-        for exercise in BaseExercise.objects.filter(course_module__course_instance=instance).all():
-            module = exercise.course_module
-            submissions = [s for s in exercise.submissions.all() if s.submitters.first().id in students]
-            for submission in submissions:
-                profile = submission.submitters.first()
-                data.append({
-                    'Time': str(submission.submission_time),
-                    'UID': str(profile.id),
-                    'Email': profile.user.email,
-                    'MID': str(module.id),
-                    'Module': str(module),
-                    'EID': str(exercise.id),
-                    'Exercise': str(exercise),
-                    'Status': submission.status,
-                    'Grade': str(submission.grade),
-                    'Submission data': submission.submission_data or [],
-                    'Grading data': submission.grading_data or {},
-                })
-        print(json.dumps(data))
-
-    def export_views(self, cid):
-        instance = CourseInstance.objects.filter(id=cid).first()
-        if not instance:
-            raise CommandError('Course instance not found.')
-
-        students = [u['id'] for u in instance.students.values('id')]
-        displays = [d for d in LearningObjectDisplay.objects.prefetch_related('profile', 'learning_object').all() if d.profile.id in students]
-
-        self.print_row(['Time', 'UID', 'Email', 'MID', 'Module', 'EID', 'Exercise'])
-        for d in displays:
-            module = d.learning_object.course_module
-            self.print_row([
-                str(d.timestamp),
-                str(d.profile.id),
-                d.profile.user.email,
-                str(module.id),
-                str(module),
-                str(d.learning_object.id),
-                str(d.learning_object),
-            ])
-
-    def print_row(self, fields, quote=False):
-        if quote:
-            fields = ['"{}"'.format(self.quote(f)) for f in fields]
-        print(','.join(fields))
-
-    def quote(self, value):
-        for m,s in [('"','\''),('\n','\\n'),('\r','\\r'),('\t','\\t')]:
-            value = value.replace(m, s)
-        return value
-
-    def strip_html_tags(self, value):
-        return re.sub('<[^>+?]>', '', value)
+                row[d] = sum(p for i,p in enumerate(points) if table.exercises[i].difficulty == d)
+            for l,p in zip(exercise_labels, points):
+                row[l] = p
+            self.write(out, writer.line(row))
+        self.write(out, writer.footer_line())
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from course.models import CourseInstance
+from ...models import BaseExercise, ExerciseResult
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored exercise results from the submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-c', '--course', metavar="ID", type=int,
+                            help="Rebuild only the course instance.")
+        parser.add_argument('-e', '--exercise', metavar="ID", type=int,
+                            help="Rebuild only the exercise.")
+
+    def handle(self, *args, **options):
+        exercises = BaseExercise.objects.all()
+        if options['course']:
+            if not CourseInstance.objects.filter(id=options['course']).exists():
+                raise CommandError("Course instance {:d} not found.".format(options['course']))
+            exercises = exercises.filter(course_module__course_instance_id=options['course'])
+        if options['exercise']:
+            exercises = exercises.filter(id=options['exercise'])
+            if not exercises.exists():
+                raise CommandError("Exercise {:d} not found.".format(options['exercise']))
+        count = ExerciseResult.objects.rebuild(exercises.order_by('id'))
+        self.stdout.write("Stored {:d} results.".format(count))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+
+from ...models import LearningObjectErrorReport
+
+
+class Command(BaseCommand):
+    help = "Email the queued exercise errors to course staff as digests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-l', '--loop', metavar="SECONDS", type=int, default=0,
+                            help="Keep running and send digests every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent = LearningObjectErrorReport.objects.send_digests()
+            if sent:
+                self.stdout.write("Sent {:d} error digests.".format(sent))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
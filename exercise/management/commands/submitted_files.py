@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from course.models import CourseModule
+from ...models import BaseExercise
+from ...submission_archive import submitted_files_archive
+
+
+class Command(BaseCommand):
+    help = "Write a ZIP archive of the files submitted to an exercise or a module."
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('-e', '--exercise', metavar="ID", type=int,
+                            help="Archive the files of the exercise.")
+        target.add_argument('-m', '--module', metavar="ID", type=int,
+                            help="Archive the files of the exercises in the module.")
+        parser.add_argument('-b', '--best', action='store_true',
+                            help="Include only the best submission of each student.")
+        parser.add_argument('-o', '--output', metavar="FILE", required=True,
+                            help="Path of the written ZIP file.")
+
+    def handle(self, *args, **options):
+        if options['exercise']:
+            exercises = BaseExercise.objects.filter(id=options['exercise'])
+            if not exercises.exists():
+                raise CommandError("Exercise {:d} not found.".format(options['exercise']))
+        else:
+            module = CourseModule.objects.filter(id=options['module']).first()
+            if not module:
+                raise CommandError("Module {:d} not found.".format(options['module']))
+            exercises = BaseExercise.objects.filter(course_module=module)
+
+        size = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in submitted_files_archive(exercises, best=options['best']):
+                f.write(chunk)
+                size += len(chunk)
+        self.stdout.write("Wrote {:d} bytes to {}.".format(size, options['output']))
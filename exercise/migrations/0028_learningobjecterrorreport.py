@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 22:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0027_learningobject_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearningObjectErrorReport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(max_length=40)),
+                ('message', models.TextField()),
+                ('error_trace', models.TextField(blank=True)),
+                ('request_fields', models.TextField(blank=True)),
+                ('exercise_url', models.CharField(blank=True, max_length=255)),
+                ('course_edit_url', models.CharField(blank=True, max_length=255)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('first_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('learning_object', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='error_reports', to='exercise.LearningObject')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='learningobjecterrorreport',
+            unique_together=set([('learning_object', 'signature')]),
+        ),
+    ]
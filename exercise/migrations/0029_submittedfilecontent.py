@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 22:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import exercise.submission_models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0028_learningobjecterrorreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmittedFileContent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('file_object', models.FileField(max_length=255, upload_to=exercise.submission_models.build_content_path)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submittedfile',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='submittedfile',
+            name='content',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='files', to='exercise.SubmittedFileContent'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 22:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0029_submittedfilecontent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='grading_time',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='submission_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 22:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def summarize_submissions(submissions, points_to_pass):
+    # A frozen copy of exercise.submission_models.summarize_submissions.
+    best = None
+    count = 0
+    last_time = None
+    for s in submissions:
+        if s['status'] in ('error', 'rejected'):
+            continue
+        if s['status'] != 'unofficial':
+            count += 1
+        if last_time is None or s['submission_time'] > last_time:
+            last_time = s['submission_time']
+        if s['status'] == 'ready':
+            if best is None or best['status'] != 'ready' or s['grade'] > best['grade']:
+                best = s
+        elif s['status'] == 'unofficial' and best is None:
+            best = s
+    if last_time is None:
+        return None
+    unofficial = best is not None and best['status'] == 'unofficial'
+    points = best['grade'] if best else 0
+    return {
+        'best_submission_id': best['id'] if best else None,
+        'points': points,
+        'submission_count': count,
+        'graded': best is not None and not unofficial,
+        'unofficial': unofficial,
+        'passed': not unofficial and points >= points_to_pass,
+        'last_submission_time': last_time,
+    }
+
+
+def fill_results(apps, schema_editor):
+    BaseExercise = apps.get_model('exercise', 'BaseExercise')
+    Submission = apps.get_model('exercise', 'Submission')
+    ExerciseResult = apps.get_model('exercise', 'ExerciseResult')
+    for exercise in BaseExercise.objects.select_related('course_module'):
+        by_submitter = {}
+        for s in Submission.objects.filter(exercise=exercise)\
+                .values('id', 'status', 'grade', 'submission_time', 'submitters')\
+                .order_by('id'):
+            if s['submitters'] is not None:
+                by_submitter.setdefault(s['submitters'], []).append(s)
+        results = []
+        for profile_id, submissions in by_submitter.items():
+            summary = summarize_submissions(submissions, exercise.points_to_pass)
+            if summary is not None:
+                results.append(ExerciseResult(
+                    course_instance_id=exercise.course_module.course_instance_id,
+                    exercise=exercise,
+                    profile_id=profile_id,
+                    **summary
+                ))
+        ExerciseResult.objects.bulk_create(results)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprofile', '0003_auto_20160728_1139'),
+        ('course', '0038_coursehook_delivery'),
+        ('exercise', '0030_submission_change_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(default=0)),
+                ('submission_count', models.IntegerField(default=0)),
+                ('graded', models.BooleanField(default=False)),
+                ('unofficial', models.BooleanField(default=False)),
+                ('passed', models.BooleanField(default=False)),
+                ('last_submission_time', models.DateTimeField(blank=True, null=True)),
+                ('best_submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='exercise.Submission')),
+                ('course_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercise_results', to='course.CourseInstance')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='exercise.BaseExercise')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercise_results', to='userprofile.UserProfile')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='exerciseresult',
+            unique_together=set([('exercise', 'profile')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='exerciseresult',
+            index_together=set([('course_instance', 'profile')]),
+        ),
+        migrations.RunPython(fill_results, reverse_code=migrations.RunPython.noop),
+    ]
@@ -6,24 +6,28 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.db.models import F
-from django.http.response import JsonResponse, Http404
+from django.http.response import JsonResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from course.viewbase import CourseInstanceBaseView, CourseInstanceMixin
+from course.models import UserTagging
+from course.viewbase import CourseInstanceBaseView, CourseInstanceMixin, \
+    CourseModuleMixin
 from deviations.models import MaxSubmissionsRuleDeviation
-from lib.helpers import settings_text
+from lib.helpers import settings_text, safe_file_name
+from lib.pagination import keyset_page
 from lib.viewbase import BaseRedirectView, BaseFormView, BaseView
 from notification.models import Notification
 from authorization.permissions import ACCESS
 from .exercise_summary import ResultTable
-from .models import LearningObject
+from .models import BaseExercise, LearningObject
 from .forms import (
     SubmissionReviewForm,
     SubmissionCreateAndReviewForm,
     EditSubmittersForm,
 )
+from .submission_archive import submitted_files_archive
 from .submission_models import Submission
 from .viewbase import (
     ExerciseBaseView,
@@ -40,6 +44,7 @@ class ListSubmissionsView(ExerciseBaseView):
     access_mode = ACCESS.ASSISTANT
     template_name = "exercise/staff/list_submissions.html"
     ajax_template_name = "exercise/staff/_submissions_table.html"
+    rows_template_name = "exercise/staff/_submissions_rows.html"
     default_limit = 50
 
     def get_common_objects(self):
@@ -48,11 +53,27 @@ class ListSubmissionsView(ExerciseBaseView):
             raise Http404()
         qs = self.exercise.submissions\
             .defer("feedback", "submission_data", "grading_data")\
-            .prefetch_related('submitters').all()
-        self.all = self.request.GET.get('all', None)
-        self.all_url = self.exercise.get_submission_list_url() + "?all=yes"
-        self.submissions = qs if self.all else qs[:self.default_limit]
-        self.note("all", "all_url", "submissions", "default_limit")
+            .prefetch_related('submitters__user', UserTagging.objects.prefetch(
+                'submitters__taggings', self.instance))
+        self.cursor = self.request.GET.get('cursor', None)
+        try:
+            self.submissions, next_cursor = keyset_page(
+                qs, self.cursor, self.default_limit)
+        except ValueError:
+            raise Http404()
+        self.next_url = (
+            self.exercise.get_submission_list_url() + "?cursor=" + next_cursor
+            if next_cursor else None
+        )
+        # Following pages loaded with AJAX only add rows to the table.
+        self.rows_only = bool(self.cursor) and self.request.is_ajax()
+        self.count = None if self.rows_only else self.exercise.submissions.count()
+        self.note("submissions", "next_url", "count", "default_limit")
+
+    def get_template_names(self):
+        if self.rows_only:
+            return [self.rows_template_name]
+        return super().get_template_names()
 
 
 class SubmissionsSummaryView(ExerciseBaseView):
@@ -60,6 +81,39 @@ class SubmissionsSummaryView(ExerciseBaseView):
     template_name = "exercise/staff/submissions_summary.html"
 
 
+def submitted_files_response(request, exercises, name):
+    """
+    Streams a ZIP archive of the submitted files. The query parameter
+    best=yes limits the archive to the best submission of each student.
+    """
+    best = request.GET.get('best') == 'yes'
+    response = StreamingHttpResponse(
+        submitted_files_archive(exercises, best=best),
+        content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="{}{}.zip"'.format(
+        safe_file_name(name), '_best' if best else '')
+    return response
+
+
+class SubmittedFilesArchiveView(ExerciseMixin, BaseView):
+    access_mode = ACCESS.ASSISTANT
+
+    def get(self, request, *args, **kwargs):
+        if not self.exercise.is_submittable:
+            raise Http404()
+        return submitted_files_response(request, [self.exercise],
+            "{}_{}".format(self.instance.course.code, self.exercise.id))
+
+
+class ModuleSubmittedFilesArchiveView(CourseModuleMixin, BaseView):
+    access_mode = ACCESS.ASSISTANT
+
+    def get(self, request, *args, **kwargs):
+        exercises = BaseExercise.objects.filter(course_module=self.module)
+        return submitted_files_response(request, exercises,
+            "{}_{}".format(self.instance.course.code, self.module.url))
+
+
 class InspectSubmissionView(SubmissionBaseView):
     access_mode = ACCESS.ASSISTANT
     template_name = "exercise/staff/inspect_submission.html"
@@ -0,0 +1,99 @@
+import csv
+import os
+import tempfile
+
+from lib.helpers import safe_file_name
+from lib.zipstream import zip_stream
+from .api.csv.submission_sheet import iter_submissions
+from .submission_models import Submission
+
+
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_FIELDS = [
+    'Path', 'UserIDs', 'StudentIDs', 'Emails', 'ExerciseID', 'Exercise',
+    'SubmissionID', 'Time', 'Status', 'Grade', 'Field', 'Size',
+]
+
+
+def _safe_name(value):
+    return safe_file_name(str(value).replace(' ', '_')) or '_'
+
+
+def _submitters_dir(profiles):
+    """
+    Names the directory of the submitters by student ids or, when missing,
+    by user names. Group submissions have a directory of their own.
+    """
+    return '-'.join(
+        _safe_name(p.student_id or p.user.username) for p in profiles
+    ) or '_'
+
+
+def submitted_files_entries(submissions):
+    """
+    Generates the archive entries for the files of the submissions followed
+    by a manifest that describes every file. The manifest is collected in a
+    temporary file.
+    """
+    manifest = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='',
+        suffix='.csv', delete=False)
+    try:
+        with manifest:
+            writer = csv.writer(manifest)
+            writer.writerow(MANIFEST_FIELDS)
+            exercise_names = {}
+            for submission in submissions:
+                profiles = list(submission.submitters.all())
+                exercise = submission.exercise
+                if exercise.id not in exercise_names:
+                    exercise_names[exercise.id] = str(exercise)
+                directory = '/'.join((
+                    _submitters_dir(profiles),
+                    '{:d}_{}'.format(exercise.id, _safe_name(exercise.name)),
+                    '{:d}'.format(submission.id),
+                ))
+                for submitted_file in submission.files.all():
+                    path = submitted_file.file_object.path
+                    if not os.path.exists(path):
+                        continue
+                    name = '{}/{}_{}'.format(directory,
+                        _safe_name(submitted_file.param_name),
+                        submitted_file.filename)
+                    yield (name, path)
+                    writer.writerow([
+                        name,
+                        '-'.join(str(p.id) for p in profiles),
+                        '-'.join(p.student_id or '' for p in profiles),
+                        '-'.join(p.user.email or '' for p in profiles),
+                        exercise.id,
+                        exercise_names[exercise.id],
+                        submission.id,
+                        submission.submission_time.isoformat(),
+                        submission.status,
+                        submission.grade,
+                        submitted_file.param_name,
+                        os.path.getsize(path),
+                    ])
+        yield (MANIFEST_NAME, manifest.name)
+    finally:
+        os.remove(manifest.name)
+
+
+def submitted_files_archive(exercises, best=False):
+    """
+    Generates a ZIP archive of the files submitted to the exercises. Only
+    the best submission of each student is included if best is set. The
+    submissions are read in chunks, so the memory use does not grow with
+    their number.
+    """
+    exercise_ids = [e.id for e in exercises]
+    if best:
+        queryset = Submission.objects.best(exercises=exercise_ids)
+    else:
+        queryset = Submission.objects.exclude_errors()\
+            .filter(exercise_id__in=exercise_ids)
+    # Each chunk of submissions is fetched with its files and submitters.
+    submissions = iter_submissions(queryset
+        .select_related('exercise__course_module__course_instance')
+        .prefetch_related('submitters__user', 'files'))
+    return zip_stream(submitted_files_entries(submissions))
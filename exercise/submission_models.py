@@ -1,9 +1,13 @@
+import hashlib
 import logging
 import os
 
+from django.conf import settings
 from django.core.files.storage import default_storage
-from django.db import models, DatabaseError
-from django.db.models.signals import post_delete
+from django.db import connection, models, transaction, DatabaseError
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_save, pre_delete
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from mimetypes import guess_type
@@ -19,6 +23,29 @@ from . import exercise_models
 logger = logging.getLogger('aplus.exercise')
 
 
+class InSubquery(RawSQL):
+    """
+    Raw SQL subquery for an __in lookup, which adds the parentheses itself.
+    Parenthesized twice the subquery would be a scalar value.
+    """
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def has_window_functions(connection):
+    """
+    Tells whether the database supports window functions, such as
+    ROW_NUMBER() OVER (...). SQLite has them from 3.25 and MySQL from 8.0.
+    """
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 25, 0)
+    if connection.vendor == 'mysql':
+        version = connection.mysql_version
+        # MariaDB versions start from 10 and have window functions from 10.2.
+        return version >= (10, 2) if version >= (10,) else version >= (8, 0)
+    return connection.vendor in ('postgresql', 'oracle')
+
+
 class SubmissionManager(models.Manager):
 
     def get_queryset(self):
@@ -46,6 +73,77 @@ class SubmissionManager(models.Manager):
             Submission.STATUS.REJECTED,
         ))
 
+    def best(self, exercises=None, submitters=None):
+        """
+        Returns the best submission of each submitter in each exercise,
+        selected in the database by the rules of CachedPoints: the highest
+        graded ready submission (the oldest of equals) or, when none is
+        ready, the oldest unofficial submission. Exercises and submitters
+        may be lists of ids or querysets of ids. Without window functions
+        in the database each submission is compared with the other
+        submissions of the submitter instead, which is slower.
+        """
+        qn = connection.ops.quote_name
+        through = Submission.submitters.through._meta
+        submission_column = qn(through.get_field('submission').column)
+        profile_column = qn(through.get_field('userprofile').column)
+        where = ["s.status IN (%s, %s)"]
+        params = [Submission.STATUS.READY, Submission.STATUS.UNOFFICIAL]
+        for column, values in (
+            ("s.exercise_id", exercises),
+            ("ss." + profile_column, submitters),
+        ):
+            if values is None:
+                continue
+            if isinstance(values, models.QuerySet):
+                sql, values_params = values.query.sql_with_params()
+                where.append("{} IN ({})".format(column, sql))
+                params.extend(values_params)
+            else:
+                values = list(values) or [None]
+                where.append("{} IN ({})".format(column, ", ".join(["%s"] * len(values))))
+                params.extend(values)
+        names = {
+            'profile': profile_column,
+            'submission': qn(Submission._meta.db_table),
+            'through': qn(through.db_table),
+            'submission_id': submission_column,
+            'where': " AND ".join(where),
+        }
+        ready = Submission.STATUS.READY
+        if has_window_functions(connection):
+            sql = (
+                "SELECT best.id FROM ("
+                    "SELECT s.id, ROW_NUMBER() OVER ("
+                        "PARTITION BY s.exercise_id, ss.{profile} "
+                        "ORDER BY CASE WHEN s.status = %s THEN 0 ELSE 1 END, "
+                        "CASE WHEN s.status = %s THEN s.grade ELSE 0 END DESC, s.id"
+                    ") AS best_rank "
+                    "FROM {submission} s JOIN {through} ss ON ss.{submission_id} = s.id "
+                    "WHERE {where}"
+                ") best WHERE best.best_rank = 1"
+            ).format(**names)
+            params = [ready, ready] + params
+        else:
+            # No better submission of the submitter to the exercise exists.
+            sql = (
+                "SELECT s.id "
+                "FROM {submission} s JOIN {through} ss ON ss.{submission_id} = s.id "
+                "WHERE {where} AND NOT EXISTS ("
+                    "SELECT 1 "
+                    "FROM {submission} t JOIN {through} ts ON ts.{submission_id} = t.id "
+                    "WHERE t.exercise_id = s.exercise_id AND ts.{profile} = ss.{profile} "
+                    "AND t.status IN (%s, %s) AND ("
+                        "(t.status = %s AND s.status <> %s) "
+                        "OR (t.status = s.status AND t.status = %s "
+                            "AND (t.grade > s.grade OR (t.grade = s.grade AND t.id < s.id))) "
+                        "OR (t.status = s.status AND t.status <> %s AND t.id < s.id)"
+                    ")"
+                ")"
+            ).format(**names)
+            params = params + [ready, Submission.STATUS.UNOFFICIAL] + [ready] * 4
+        return self.filter(id__in=InSubquery(sql, params))
+
 
 class Submission(UrlMixin, models.Model):
     """
@@ -59,7 +157,7 @@ class Submission(UrlMixin, models.Model):
         ('REJECTED', 'rejected', _("Rejected")), # missing fields etc
         ('UNOFFICIAL', 'unofficial', _("Unofficial")), # graded after closing
     ])
-    submission_time = models.DateTimeField(auto_now_add=True)
+    submission_time = models.DateTimeField(auto_now_add=True, db_index=True)
     hash = models.CharField(max_length=32, default=get_random_string)
 
     # Relations
@@ -76,7 +174,7 @@ class Submission(UrlMixin, models.Model):
     status = models.CharField(max_length=32,
         choices=STATUS.choices, default=STATUS.INITIALIZED)
     grade = models.IntegerField(default=0)
-    grading_time = models.DateTimeField(blank=True, null=True)
+    grading_time = models.DateTimeField(blank=True, null=True, db_index=True)
     late_penalty_applied = PercentField(blank=True, null=True)
 
     # Points received from assessment, before scaled to grade
@@ -92,6 +190,7 @@ class Submission(UrlMixin, models.Model):
     class Meta:
         app_label = 'exercise'
         ordering = ['-id']
+        index_together = [('exercise', 'submission_time')]
 
     def __str__(self):
         return str(self.id)
@@ -114,10 +213,20 @@ class Submission(UrlMixin, models.Model):
         """
         for key in files:
             for uploaded_file in files.getlist(key):
-                self.files.create(
-                    file_object=uploaded_file,
-                    param_name=key,
-                )
+                if settings.SUBMITTED_FILE_DEDUPLICATION:
+                    with transaction.atomic():
+                        content,_ = SubmittedFileContent.objects.store(uploaded_file)
+                        self.files.create(
+                            file_object=content.file_object.name,
+                            content=content,
+                            original_name=safe_file_name(uploaded_file.name),
+                            param_name=key,
+                        )
+                else:
+                    self.files.create(
+                        file_object=uploaded_file,
+                        param_name=key,
+                    )
 
     def get_post_parameters(self, request, url):
         """
@@ -219,7 +328,7 @@ class Submission(UrlMixin, models.Model):
         if self.status != self.STATUS.UNOFFICIAL:
             self.status = self.STATUS.READY
 
-        # Fire set hooks.
+        # Queue set hooks for asynchronous delivery.
         for hook in self.exercise.course_module.course_instance \
                 .course_hooks.filter(hook_type="post-grading"):
             hook.trigger({ "submission_id": self.id })
@@ -264,6 +373,72 @@ def build_upload_dir(instance, filename):
     )
 
 
+def build_content_path(instance, filename):
+    """
+    Returns the content addressed path of a SubmittedFileContent file,
+    relative to MEDIA_ROOT directory.
+    """
+    return "submissions/content/{}/{}/{}".format(
+        instance.sha256[:2],
+        instance.sha256[2:4],
+        instance.sha256
+    )
+
+
+class SubmittedFileContentManager(models.Manager):
+
+    def hash_file(self, file):
+        digest = hashlib.sha256()
+        for chunk in file.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def store(self, file, sha256=None):
+        """
+        Returns (content, created) for the file contents, which are written
+        to the disk only if not stored already. Must be called in a
+        transaction that also saves the referring SubmittedFile: the
+        content row is locked so that it is not released meanwhile.
+        """
+        content, created = self.select_for_update().get_or_create(
+            sha256=sha256 or self.hash_file(file),
+            defaults={ "size": file.size },
+        )
+        if not content.file_object:
+            content.file_object.save(content.sha256, file, save=True)
+        return content, created
+
+    def release(self, content_id):
+        """
+        Deletes the content and its file when no SubmittedFile refers to it.
+        """
+        with transaction.atomic():
+            content = self.select_for_update().filter(id=content_id).first()
+            if content and not content.files.exists():
+                name = content.file_object.name
+                content.delete()
+                if name:
+                    transaction.on_commit(lambda: default_storage.delete(name))
+
+
+class SubmittedFileContent(models.Model):
+    """
+    Stores the contents of identical submitted files once. The submitted
+    files referring to the content act as its reference count.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    file_object = models.FileField(upload_to=build_content_path, max_length=255)
+
+    objects = SubmittedFileContentManager()
+
+    class Meta:
+        app_label = 'exercise'
+
+    def __str__(self):
+        return self.sha256
+
+
 class SubmittedFile(UrlMixin, models.Model):
     """
     Represents a file submitted by the student as a solution to an exercise.
@@ -275,6 +450,9 @@ class SubmittedFile(UrlMixin, models.Model):
     submission = models.ForeignKey(Submission, related_name="files")
     param_name = models.CharField(max_length=128)
     file_object = models.FileField(upload_to=build_upload_dir, max_length=255)
+    content = models.ForeignKey(SubmittedFileContent, related_name="files",
+        on_delete=models.PROTECT, blank=True, null=True)
+    original_name = models.CharField(max_length=255, blank=True)
 
     class Meta:
         app_label = 'exercise'
@@ -282,12 +460,13 @@ class SubmittedFile(UrlMixin, models.Model):
     @property
     def filename(self):
         """
-        Returns the actual name of the file on the disk.
+        Returns the name of the submitted file. Files that share a stored
+        content remember their name, others use the actual name on the disk.
         """
-        return os.path.basename(self.file_object.path)
+        return self.original_name or os.path.basename(self.file_object.path)
 
     def get_mime(self):
-        return guess_type(self.file_object.path)[0]
+        return guess_type(self.filename)[0]
 
     def is_passed(self):
         return self.get_mime() in SubmittedFile.PASS_MIME
@@ -305,7 +484,210 @@ class SubmittedFile(UrlMixin, models.Model):
 def _delete_file(sender, instance, **kwargs):
     """
     Deletes the actual submission files after the submission in database is
-    removed.
+    removed. Shared contents are deleted after their last reference.
     """
-    default_storage.delete(instance.file_object.path)
+    if instance.content_id:
+        SubmittedFileContent.objects.release(instance.content_id)
+    else:
+        default_storage.delete(instance.file_object.path)
 post_delete.connect(_delete_file, SubmittedFile)
+
+
+def summarize_submissions(submissions, points_to_pass):
+    """
+    Summarizes the submissions of a submitter in an exercise by the rules
+    of CachedPoints. The submissions are dicts of id, status, grade and
+    submission_time in the order of id. Returns None if no submission
+    counts.
+    """
+    best = None
+    count = 0
+    last_time = None
+    for s in submissions:
+        if s['status'] in (Submission.STATUS.ERROR, Submission.STATUS.REJECTED):
+            continue
+        if s['status'] != Submission.STATUS.UNOFFICIAL:
+            count += 1
+        if last_time is None or s['submission_time'] > last_time:
+            last_time = s['submission_time']
+        if s['status'] == Submission.STATUS.READY:
+            if (
+                best is None
+                or best['status'] != Submission.STATUS.READY
+                or s['grade'] > best['grade']
+            ):
+                best = s
+        elif s['status'] == Submission.STATUS.UNOFFICIAL and best is None:
+            best = s
+    if last_time is None:
+        return None
+    unofficial = best is not None and best['status'] == Submission.STATUS.UNOFFICIAL
+    points = best['grade'] if best else 0
+    return {
+        'best_submission_id': best['id'] if best else None,
+        'points': points,
+        'submission_count': count,
+        'graded': best is not None and not unofficial,
+        'unofficial': unofficial,
+        'passed': not unofficial and points >= points_to_pass,
+        'last_submission_time': last_time,
+    }
+
+
+class ExerciseResultManager(models.Manager):
+
+    def _submissions_by_submitter(self, exercise, profile_ids=None):
+        submissions = Submission.objects.filter(exercise=exercise)
+        if profile_ids is not None:
+            submissions = submissions.filter(submitters__in=profile_ids)
+        by_submitter = {}
+        for s in submissions.prefetch_related(None)\
+                .values('id', 'status', 'grade', 'submission_time', 'submitters')\
+                .order_by('id'):
+            if s['submitters'] is not None:
+                by_submitter.setdefault(s['submitters'], []).append(s)
+        return by_submitter
+
+    def update_results(self, exercise, profile_ids):
+        """
+        Recomputes the results of the submitters in the exercise.
+        """
+        profile_ids = set(profile_ids)
+        if not profile_ids:
+            return
+        instance_id = exercise.course_module.course_instance_id
+        with transaction.atomic():
+            # Concurrent gradings of a submitter wait here for each other, so
+            # that the later one reads the submissions the earlier committed.
+            list(UserProfile.objects.select_for_update()
+                .filter(id__in=profile_ids).order_by('id')
+                .values_list('id', flat=True))
+            by_submitter = self._submissions_by_submitter(exercise, profile_ids)
+            for profile_id in profile_ids:
+                summary = summarize_submissions(
+                    by_submitter.get(profile_id, []), exercise.points_to_pass)
+                if summary is None:
+                    self.filter(exercise=exercise, profile_id=profile_id).delete()
+                else:
+                    self.update_or_create(
+                        exercise=exercise,
+                        profile_id=profile_id,
+                        defaults=dict(course_instance_id=instance_id, **summary),
+                    )
+
+    def rebuild(self, exercises):
+        """
+        Replaces the results in the exercises with ones recomputed from the
+        submissions. Returns the number of results.
+        """
+        count = 0
+        for exercise in exercises.select_related('course_module'):
+            results = []
+            for profile_id, submissions in \
+                    self._submissions_by_submitter(exercise).items():
+                summary = summarize_submissions(submissions, exercise.points_to_pass)
+                if summary is not None:
+                    results.append(ExerciseResult(
+                        course_instance_id=exercise.course_module.course_instance_id,
+                        exercise=exercise,
+                        profile_id=profile_id,
+                        **summary
+                    ))
+            with transaction.atomic():
+                self.filter(exercise=exercise).delete()
+                self.bulk_create(results)
+            count += len(results)
+        return count
+
+
+class ExerciseResult(models.Model):
+    """
+    The best points of a submitter in an exercise, maintained from the
+    submissions so that course wide results are read from a single table.
+    """
+    course_instance = models.ForeignKey('course.CourseInstance',
+        related_name="exercise_results")
+    exercise = models.ForeignKey(exercise_models.BaseExercise,
+        related_name="results")
+    profile = models.ForeignKey(UserProfile, related_name="exercise_results")
+    best_submission = models.ForeignKey(Submission, related_name="+",
+        on_delete=models.SET_NULL, blank=True, null=True)
+    points = models.IntegerField(default=0)
+    submission_count = models.IntegerField(default=0)
+    graded = models.BooleanField(default=False)
+    unofficial = models.BooleanField(default=False)
+    passed = models.BooleanField(default=False)
+    last_submission_time = models.DateTimeField(blank=True, null=True)
+
+    objects = ExerciseResultManager()
+
+    class Meta:
+        app_label = 'exercise'
+        unique_together = ('exercise', 'profile')
+        index_together = [('course_instance', 'profile')]
+
+
+def _update_results(sender, instance, **kwargs):
+    """
+    Updates the results of the submitters when a submission changes.
+    """
+    ExerciseResult.objects.update_results(instance.exercise,
+        (p.id for p in instance.submitters.all()))
+post_save.connect(_update_results, Submission)
+
+
+def _remember_submitters(sender, instance, **kwargs):
+    instance._result_profile_ids = [p.id for p in instance.submitters.all()]
+pre_delete.connect(_remember_submitters, Submission)
+
+
+def _update_deleted_results(sender, instance, **kwargs):
+    ExerciseResult.objects.update_results(instance.exercise,
+        getattr(instance, '_result_profile_ids', []))
+post_delete.connect(_update_deleted_results, Submission)
+
+
+def _update_submitter_results(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Updates the results when the submitters of a submission change.
+    """
+    if action == 'pre_clear':
+        if reverse:
+            instance._result_submission_ids = list(
+                instance.submissions.values_list('id', flat=True))
+        else:
+            instance._result_profile_ids = [p.id for p in instance.submitters.all()]
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance,
+            '_result_submission_ids' if reverse else '_result_profile_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        for submission in Submission.objects.filter(id__in=pk_set)\
+                .select_related('exercise__course_module'):
+            ExerciseResult.objects.update_results(submission.exercise, [instance.id])
+    else:
+        ExerciseResult.objects.update_results(instance.exercise, pk_set)
+m2m_changed.connect(_update_submitter_results, Submission.submitters.through)
+
+
+def _update_exercise_results(sender, instance, **kwargs):
+    """
+    Updates the passed flags when the points to pass of an exercise change.
+    """
+    points_to_pass = instance.points_to_pass
+    results = ExerciseResult.objects.filter(exercise_id=instance.id)
+    results.exclude(passed=False).filter(
+        models.Q(unofficial=True) | models.Q(points__lt=points_to_pass)
+    ).update(passed=False)
+    results.filter(passed=False, unofficial=False,
+        points__gte=points_to_pass).update(passed=True)
+# The signal is sent with the concrete exercise class as the sender.
+for exercise_class in (
+    exercise_models.BaseExercise,
+    exercise_models.LTIExercise,
+    exercise_models.StaticExercise,
+    exercise_models.ExerciseWithAttachment,
+):
+    post_save.connect(_update_exercise_results, exercise_class)
@@ -1,13 +1,18 @@
+import hashlib
 import json
 from django import template
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Max, Min
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.utils.translation import ugettext_lazy as _
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language, ugettext_lazy as _
 
 from course.models import CourseModule
 from lib.errors import TagUsageError
 from ..cache.content import CachedContent
+from ..cache.hierarchy import NoSuchContent
 from ..cache.points import CachedPoints
 from ..exercise_summary import UserExerciseSummary
 from ..models import LearningObjectDisplay, LearningObject, Submission, BaseExercise
@@ -50,18 +55,51 @@ def _get_toc(context, student=None):
     return context
 
 
-@register.inclusion_tag("exercise/_user_results.html", takes_context=True)
+def _cached_toc(name, context, student=None, is_course_staff=None):
+    """
+    Renders the template with the table of contents of the points. The
+    result is cached by the versions of the points and the content, the
+    language, the staff flag and the current opening states of the modules.
+    """
+    points = _prepare_context(context, student)
+    if is_course_staff is None:
+        is_course_staff = context.get('is_course_staff', False)
+    key = "fragment:{}:{}".format(name, hashlib.md5(repr((
+        context['instance'].id,
+        points.user.pk,
+        points.created(),
+        get_language(),
+        is_course_staff,
+        points.module_states(context['now']),
+    )).encode('utf-8')).hexdigest())
+    html = cache.get(key)
+    if html is None:
+        values = _get_toc(context, student)
+        values['is_course_staff'] = is_course_staff
+        if name == 'user_results':
+            values['total_json'] = json.dumps(values['total'])
+        html = render_to_string("exercise/_{}.html".format(name), values)
+        # Data that could not be stored would create a new key each time.
+        if not getattr(points, 'dirty', False) \
+                and not getattr(context['content'], 'dirty', False):
+            cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+    return mark_safe(html)
+
+
+@register.simple_tag(takes_context=True)
 def user_results(context, student=None):
-    values = _get_toc(context, student)
-    values['total_json'] = json.dumps(values['total'])
-    if student:
-        values['is_course_staff'] = False
-    return values
+    if context.get('is_course_staff', False) and not student:
+        # The staff columns include live submitter counts.
+        values = _get_toc(context)
+        values['total_json'] = json.dumps(values['total'])
+        return mark_safe(render_to_string("exercise/_user_results.html", values))
+    return _cached_toc('user_results', context, student,
+        False if student else None)
 
 
-@register.inclusion_tag("exercise/_user_toc.html", takes_context=True)
+@register.simple_tag(takes_context=True)
 def user_toc(context, student=None):
-    return _get_toc(context, student)
+    return _cached_toc('user_toc', context, student)
 
 
 @register.inclusion_tag("exercise/_user_last.html", takes_context=True)
@@ -69,26 +107,29 @@ def user_last(context):
     user = context['request'].user
     points = _prepare_context(context)
     if user.is_authenticated():
-        last = LearningObjectDisplay.objects.filter(
-            profile=user.userprofile,
-            learning_object__status=LearningObject.STATUS.READY,
-            learning_object__course_module__course_instance=context['instance'],
-        ).select_related('learning_object').order_by('-timestamp').first()
-        if last:
-            entry,_,_,_ = points.find(last.learning_object)
-            return {
-                'last': entry,
-                'last_time': last.timestamp,
-            }
+        for cached in (True, False):
+            last = LearningObjectDisplay.objects.last_view(
+                user.userprofile, context['instance'], cached=cached)
+            if not last:
+                break
+            try:
+                entry,_,_,_ = points.find({'type': 'exercise', 'id': last[0]})
+            except NoSuchContent:
+                continue
+            if entry['status'] == LearningObject.STATUS.READY:
+                return {
+                    'last': entry,
+                    'last_time': last[1],
+                }
     return {
         'begin': points.begin(),
         'instance': context['instance'],
     }
 
 
-@register.inclusion_tag("exercise/_category_points.html", takes_context=True)
+@register.simple_tag(takes_context=True)
 def category_points(context, student=None):
-    return _get_toc(context, student)
+    return _cached_toc('category_points', context, student)
 
 
 @register.inclusion_tag("exercise/_submission_list.html", takes_context=True)
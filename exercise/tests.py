@@ -1,29 +1,51 @@
 from datetime import datetime, timedelta
+import csv
+import gzip
+import io
 import json
 import os.path
+import smtplib
 import urllib
+import zipfile
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.core.signals import request_finished
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.datastructures import MultiValueDict
+from rest_framework.test import APIClient
 
 from course.models import Course, CourseInstance, CourseHook, CourseModule, \
     LearningObjectCategory
 from deviations.models import DeadlineRuleDeviation, \
     MaxSubmissionsRuleDeviation
+from exercise.api.csv.submission_sheet import iter_submissions
 from exercise.exercise_summary import UserExerciseSummary
 from exercise.models import BaseExercise, StaticExercise, \
-    ExerciseWithAttachment, Submission, SubmittedFile, LearningObject
+    ExerciseWithAttachment, Submission, SubmittedFile, LearningObject, \
+    LearningObjectDisplay, LearningObjectErrorReport, SubmittedFileContent
+from exercise.exercise_models import display_buffer
 from exercise.protocol.exercise_page import ExercisePage
+from exercise.submission_archive import submitted_files_archive
+from lib.email_messages import email_course_error
+from lib import query_budget
+from lib.query_budget import Budget, Route
 
 
 class ExerciseTest(TestCase):
     def setUp(self):
+        # Views buffered by a test are saved before its changes are rolled back.
+        self.addCleanup(display_buffer.flush)
         self.user = User(username="testUser", first_name="First", last_name="Last")
         self.user.set_password("testPassword")
         self.user.save()
@@ -659,6 +681,49 @@ class ExerciseTest(TestCase):
         response = self.client.get(list_submissions_url)
         self.assertEqual(response.status_code, 403)
 
+    def test_submission_list_pages(self):
+        for i in range(60):
+            Submission.objects.create(exercise=self.base_exercise)\
+                .submitters.add(self.user.userprofile)
+        expected = list(self.base_exercise.submissions\
+            .order_by('-submission_time', '-id').values_list('id', flat=True))
+        self.client.login(username="staff", password="staffPassword")
+        response = self.client.get(self.base_exercise.get_submission_list_url())
+        self.assertEqual(response.context['count'], len(expected))
+        self.assertNotContains(response, "filtered-table")
+        ids = [s.id for s in response.context['submissions']]
+        self.assertEqual(len(ids), 50)
+        url = response.context['next_url']
+        # Without JavaScript the next page is a whole page.
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, "exercise/staff/list_submissions.html")
+        self.assertEqual(response.context['count'], len(expected))
+        self.assertContains(response, "filtered-table")
+        while url:
+            response = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertTemplateUsed(response, "exercise/staff/_submissions_rows.html")
+            ids.extend(s.id for s in response.context['submissions'])
+            url = response.context['next_url']
+        self.assertEqual(ids, expected)
+
+        client = APIClient()
+        client.force_authenticate(user=self.teacher)
+        url = '/api/v2/exercises/{:d}/submissions/?limit=25'.format(self.base_exercise.id)
+        api_ids = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            api_ids.extend(int(s['url'].rstrip('/').split('/')[-1])
+                for s in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(api_ids, expected)
+        response = client.get('/api/v2/exercises/{:d}/submissions/'.format(
+            self.base_exercise.id))
+        self.assertEqual(len(response.data), len(expected))
+        response = client.get('/api/v2/exercises/{:d}/submissions/?cursor=x'.format(
+            self.base_exercise.id))
+        self.assertEqual(response.status_code, 400)
+
     def test_uploading_and_viewing_file(self):
         exercise = BaseExercise.objects.create(
             order=4,
@@ -714,4 +779,330 @@ class ExerciseTest(TestCase):
         self.assertEqual(response["Content-Type"], "application/octet-stream")
         self.assertTrue(response["Content-Disposition"].startswith("attachment; filename="))
 
+        etag = response["ETag"]
+        response = self.client.get(files[1].get_absolute_url() + "?download=1",
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(files[1].get_absolute_url() + "?download=1",
+            HTTP_RANGE="bytes=7-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"],
+            "bytes 7-9/{:d}".format(files[1].file_object.size))
+        with open(files[1].file_object.path, "rb") as f:
+            self.assertEqual(b"".join(response.streaming_content), f.read()[7:10])
+
+        response = self.client.get(exercise.get_url("submission-files"))
+        self.assertEqual(response.status_code, 403)
+        sub.set_points(40, 50)
+        sub.set_ready()
+        sub.save()
+        self.client.login(username="grader", password="graderPassword")
+        response = self.client.get(exercise.get_url("submission-files") + "?best=yes")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[-1], "manifest.csv")
+        self.assertTrue(names[0].startswith("testUser/{:d}_".format(exercise.id)))
+        self.assertEqual(archive.read(names[0]), png)
+        manifest = archive.read("manifest.csv").decode("utf-8").splitlines()
+        self.assertEqual(len(manifest), 3)
+        self.assertTrue(manifest[2].startswith(names[1]))
+
         exercise.delete()
+
+    def test_submitted_files_archive_chunks(self):
+        submissions = (self.submission, self.submission_with_two_submitters,
+            self.late_submission)
+        for i, submission in enumerate(submissions):
+            submission.add_files(MultiValueDict({
+                "file1": [SimpleUploadedFile("f{:d}.txt".format(i), b"content")],
+            }))
+        # Two submissions per chunk, so the files span two chunks.
+        with patch("exercise.submission_archive.iter_submissions",
+                lambda queryset: iter_submissions(queryset, chunk_size=2)):
+            data = b"".join(submitted_files_archive([self.base_exercise]))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        names = archive.namelist()
+        self.assertEqual(names[-1], "manifest.csv")
+        self.assertEqual(
+            [name.rsplit("/", 2)[1] for name in names[:-1]],
+            [str(s.id) for s in submissions])
+        manifest = archive.read("manifest.csv").decode("utf-8").splitlines()
+        self.assertEqual(len(manifest), 4)
+        self.assertTrue(manifest[2].startswith(names[1]))
+        for submitted_file in SubmittedFile.objects.all():
+            submitted_file.file_object.delete(save=False)
+
+    @override_settings(SUBMITTED_FILE_DEDUPLICATION=True)
+    def test_deduplicated_submitted_files(self):
+        def upload(name):
+            return MultiValueDict({
+                "file1": [SimpleUploadedFile(name, b"print('Hello')\n")],
+            })
+        self.submission.add_files(upload("hello.py"))
+        self.submission_with_two_submitters.add_files(upload("other.py"))
+        file_a = self.submission.files.first()
+        file_b = self.submission_with_two_submitters.files.first()
+        self.assertEqual(SubmittedFileContent.objects.count(), 1)
+        self.assertEqual(file_a.content_id, file_b.content_id)
+        self.assertEqual(file_a.file_object.name, file_b.file_object.name)
+        self.assertEqual(file_a.filename, "hello.py")
+        self.assertEqual(file_b.filename, "other.py")
+        self.assertTrue(os.path.exists(file_a.file_object.path))
+
+        # The test transaction is never committed: run the callbacks by hand.
+        path = file_a.file_object.path
+        callbacks = []
+        with patch("exercise.submission_models.transaction.on_commit",
+                side_effect=callbacks.append):
+            file_a.delete()
+            self.assertEqual(SubmittedFileContent.objects.count(), 1)
+            self.assertEqual(callbacks, [])
+            file_b.delete()
+            self.assertEqual(SubmittedFileContent.objects.count(), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(os.path.exists(path))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(path))
+
+    def test_deduplicate_submitted_files_command(self):
+        def upload(name, data):
+            return MultiValueDict({ "file1": [SimpleUploadedFile(name, data)] })
+        self.submission.add_files(upload("a.py", b"same\n"))
+        self.submission_with_two_submitters.add_files(upload("b.py", b"same\n"))
+        self.late_submission.add_files(upload("c.py", b"other\n"))
+        files = list(SubmittedFile.objects.order_by("id"))
+        paths = [f.file_object.path for f in files]
+
+        out = io.StringIO()
+        call_command("deduplicate_submitted_files", "--dry-run", stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            "Would move 3 files of which 1 were duplicates, reclaimed 5 bytes. "
+            "0 files were missing from the disk.",
+            "Content store: 0 files referenced by 0 submitted files, "
+            "0 bytes stored for 0 bytes submitted, 0 bytes saved. "
+            "3 submitted files are stored separately.",
+        ])
+        self.assertEqual(SubmittedFileContent.objects.count(), 0)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        out = io.StringIO()
+        with override_settings(SUBMITTED_FILE_DEDUPLICATION=True):
+            call_command("deduplicate_submitted_files", stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            "Moved 3 files of which 1 were duplicates, reclaimed 5 bytes. "
+            "0 files were missing from the disk.",
+            "Content store: 2 files referenced by 3 submitted files, "
+            "11 bytes stored for 16 bytes submitted, 5 bytes saved. "
+            "0 submitted files are stored separately.",
+        ])
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        moved = list(SubmittedFile.objects.order_by("id"))
+        self.assertEqual([f.filename for f in moved], ["a.py", "b.py", "c.py"])
+        self.assertEqual(moved[0].content_id, moved[1].content_id)
+        self.assertNotEqual(moved[0].content_id, moved[2].content_id)
+        with moved[0].file_object as f:
+            self.assertEqual(f.read(), b"same\n")
+
+        out = io.StringIO()
+        call_command("deduplicate_submitted_files", "--report", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+        stored = [f.content.file_object.path for f in moved]
+        callbacks = []
+        with patch("exercise.submission_models.transaction.on_commit",
+                side_effect=callbacks.append):
+            SubmittedFile.objects.all().delete()
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(os.path.exists(path) for path in stored))
+
+    def test_export_command(self):
+        self.course_instance.enroll_student(self.user)
+        self.submission.submission_data = [["a", "1"], ["a", "2"], ["b", 'x"y\nz']]
+        self.submission.save()
+
+        out = io.StringIO()
+        call_command("export", "exercise", str(self.base_exercise.id),
+            stdout=out, stderr=io.StringIO())
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0][-3:], ["Grade", "a", "b"])
+        self.assertEqual(len(rows), 4)
+        row = [r for r in rows if r[-2] == "1;2"][0]
+        self.assertEqual(row[-1], 'x"y\nz')
+
+        path = os.path.join(settings.MEDIA_ROOT, "export_test.jsonl.gz")
+        call_command("export", "json", str(self.course_instance.id),
+            format="jsonl", output=path, gzip=True, stderr=io.StringIO())
+        with gzip.open(path, "rt") as f:
+            lines = [json.loads(line) for line in f]
+        os.remove(path)
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(set(l["UID"] for l in lines), {self.user.userprofile.id})
+        self.assertIn(["b", 'x"y\nz'], [d for l in lines for d in l["Submission data"]])
+
+        out = io.BytesIO()
+        call_command("export", "json", str(self.course_instance.id),
+            gzip=True, stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(gzip.decompress(out.getvalue()).decode("utf-8")), lines)
+
+        out = io.StringIO()
+        call_command("export", "views", str(self.course_instance.id),
+            format="json", stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(out.getvalue()), [])
+
+    def test_parallel_export_to_stdout(self):
+        class InProcessExecutor(object):
+            # Forked workers would not see the test database.
+            def __init__(self, max_workers):
+                pass
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                pass
+            def map(self, function, tasks):
+                return map(function, tasks)
+
+        self.course_instance.enroll_student(self.user)
+        # Longer than the chunks in which the worker files are copied.
+        self.submission.submission_data = [["a", "x" * 40000]]
+        self.submission.save()
+
+        def export(workers):
+            out = io.StringIO()
+            call_command("export", "json", str(self.course_instance.id),
+                workers=workers, stdout=out, stderr=io.StringIO())
+            return out.getvalue()
+
+        with patch("exercise.management.commands.export.ProcessPoolExecutor",
+                InProcessExecutor):
+            parallel = export(2)
+        self.assertEqual(parallel, export(1))
+        self.assertEqual(len(json.loads(parallel)), 6)
+
+    def test_course_error_digest(self):
+        self.teacher.email = "teacher@localhost"
+        self.teacher.save()
+        request = RequestFactory().get(self.base_exercise.get_absolute_url())
+        for i in range(3):
+            email_course_error(request, self.base_exercise,
+                "Failed to request http://grader/?token={:d}".format(i), False)
+        email_course_error(request, self.base_exercise, "Other error", False)
+        self.assertEqual(LearningObjectErrorReport.objects.count(), 2)
+        report = LearningObjectErrorReport.objects.get(message__startswith="Failed")
+        self.assertEqual(report.count, 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # The reports are kept when sending fails.
+        with patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                side_effect=smtplib.SMTPException("Unavailable")):
+            self.assertEqual(LearningObjectErrorReport.objects.send_digests(), 0)
+        self.assertEqual(LearningObjectErrorReport.objects.count(), 2)
+
+        self.assertEqual(LearningObjectErrorReport.objects.send_digests(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["teacher@localhost"])
+        self.assertIn("Occurred 3 time(s)", mail.outbox[0].body)
+        self.assertIn("Other error", mail.outbox[0].body)
+        self.assertEqual(LearningObjectErrorReport.objects.count(), 0)
+
+    def test_display_buffer(self):
+        profile = self.user.userprofile
+        self.client.login(username="testUser", password="testPassword")
+        time = timezone.now()
+        with override_settings(DISPLAY_BUFFER_SIZE=10):
+            self.client.get(self.static_exercise.get_absolute_url())
+            self.assertEqual(LearningObjectDisplay.objects.count(), 0)
+            last = LearningObjectDisplay.objects.last_view(profile, self.course_instance)
+            self.assertEqual(last[0], self.static_exercise.id)
+
+            self.assertEqual(display_buffer.flush(), 1)
+            display = LearningObjectDisplay.objects.get()
+            self.assertEqual(display.profile, profile)
+            self.assertEqual(display.timestamp, last[1])
+            self.assertGreaterEqual(display.timestamp, time)
+            self.assertEqual(LearningObjectDisplay.objects.last_view(
+                profile, self.course_instance, cached=False), last)
+
+            LearningObjectDisplay.objects.add(self.base_exercise, profile)
+            request_finished.send(sender=None)
+            self.assertEqual(LearningObjectDisplay.objects.count(), 1)
+            with override_settings(DISPLAY_BUFFER_SECONDS=0):
+                request_finished.send(sender=None)
+            self.assertEqual(LearningObjectDisplay.objects.count(), 2)
+
+            for i in range(10):
+                LearningObjectDisplay.objects.add(self.base_exercise, profile)
+            self.assertEqual(LearningObjectDisplay.objects.count(), 12)
+            self.assertEqual(display_buffer.pending(), [])
+
+    def test_exercise_view_query_count(self):
+        self.course_instance.enroll_student(self.user)
+        self.client.login(username="testUser", password="testPassword")
+        url = self.static_exercise.get_absolute_url()
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 25)
+        # The course roles of the user are resolved once per request.
+        roles = [q for q in queries.captured_queries
+            if "course_enrollment" in q['sql'] or "_assistants" in q['sql']]
+        self.assertEqual(len(roles), 1)
+
+
+def first_submission(course):
+    return Submission.objects.filter(
+        exercise__course_module__course_instance=course.instance).first()
+
+
+class ExerciseQueryBudgetTest(query_budget.QueryBudgetTestCase):
+    routes = (
+        Route("exercise", 'student', lambda c: c.exercises[0].get_absolute_url(),
+            Budget(32), Budget(46, learning_objects=3)),
+        Route("table of contents", 'student', lambda c: c.instance.get_url('toc'),
+            Budget(8), Budget(21, learning_objects=3)),
+        Route("results", 'student', lambda c: c.instance.get_url('results'),
+            Budget(10), Budget(23, learning_objects=3)),
+        # Each exercise queries its learning object and course again.
+        Route("all results", 'teacher', lambda c: c.instance.get_url('all-results'),
+            Budget(12, exercises=5), Budget(21, learning_objects=3, exercises=5)),
+        Route("user results", 'teacher',
+            lambda c: c.instance.get_url('user-results', user_id=c.student.id),
+            Budget(16), Budget(28, learning_objects=3)),
+        Route("submission list", 'teacher',
+            lambda c: c.exercises[0].get_url('submission-list'),
+            Budget(23), Budget(32, learning_objects=3)),
+        Route("submission list for assistant", 'assistant',
+            lambda c: c.exercises[0].get_url('submission-list'),
+            Budget(23), Budget(32, learning_objects=3)),
+        Route("submission summary", 'teacher',
+            lambda c: c.exercises[0].get_url('submission-summary'),
+            Budget(19), Budget(28, learning_objects=3)),
+        Route("inspect submission", 'teacher',
+            lambda c: first_submission(c).get_url('submission-inspect'),
+            Budget(32), Budget(41, learning_objects=3)),
+        Route("analytics", 'teacher', lambda c: c.instance.get_url('analytics'),
+            Budget(9), Budget(18, learning_objects=3)),
+        Route("submission admin", 'superuser',
+            lambda c: '/admin/exercise/submission/'
+                '?exercise__course_module__course_instance__id__exact={:d}'.format(c.instance.id),
+            Budget(13)),
+        Route("exercise admin", 'superuser',
+            lambda c: '/admin/exercise/baseexercise/'
+                '?course_module__course_instance__id__exact={:d}'.format(c.instance.id),
+            Budget(8)),
+    )
+
+    def before_capture(self):
+        # Views buffered by earlier requests would be saved on the way.
+        display_buffer.flush()
+
+    def test_query_budgets(self):
+        self.addCleanup(display_buffer.flush)
+        super().test_query_budgets()
+
@@ -1,9 +1,17 @@
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from unittest.mock import patch
+
 from lib.testdata import CourseTestCase
 from course.models import CourseModule, LearningObjectCategory
+from notification.models import Notification
 from .cache.content import CachedContent
 from .cache.hierarchy import PreviousIterator
 from .cache.points import CachedPoints
-from .models import BaseExercise, StaticExercise, Submission
+from .models import BaseExercise, ExerciseResult, StaticExercise, Submission
 
 
 class CachedContentTest(CourseTestCase):
@@ -139,6 +147,23 @@ class CachedPointsTest(CourseTestCase):
         self.assertEqual(c.created(), created[1])
         self.assertNotEqual(p.created(), created)
 
+    def test_query_count(self):
+        def count_queries():
+            c = CachedContent(self.instance)
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                CachedPoints(self.instance, self.student, c)
+            return len(context)
+        queries = count_queries()
+        for i in range(5):
+            for exercise in (self.exercise, self.exercise2):
+                submission = Submission.objects.create(exercise=exercise)
+                submission.submitters.add(self.student.userprofile)
+                Notification.objects.create(submission=submission,
+                    course_instance=self.instance, recipient=self.student.userprofile,
+                    sender=self.teacher.userprofile, subject="test", notification="test")
+        self.assertEqual(count_queries(), queries)
+
     def test_accumulation(self):
         self.submission2.set_points(2,2)
         self.submission2.save()
@@ -175,6 +200,117 @@ class CachedPointsTest(CourseTestCase):
         module = p.modules()[1]
         self.assertTrue(module['passed'])
 
+    def test_best_submissions(self):
+        def best_ids():
+            c = CachedContent(self.instance)
+            expected = set()
+            for user in (self.student, self.user):
+                p = CachedPoints(self.instance, user, c)
+                for exercise in (self.exercise, self.exercise2):
+                    entry,_,_,_ = p.find(exercise)
+                    if entry['best_submission']:
+                        expected.add(entry['best_submission'])
+            for window_functions in (True, False):
+                with patch("exercise.submission_models.has_window_functions",
+                        return_value=window_functions):
+                    best = Submission.objects.best(
+                        exercises=[self.exercise.id, self.exercise2.id])
+                    self.assertEqual(set(s.id for s in best), expected)
+            return expected
+
+        self.assertEqual(best_ids(), {self.submission.id})
+
+        # Equal ready grades: the older submission is the best.
+        self.submission2.set_points(1,2)
+        self.submission2.set_ready()
+        self.submission2.save()
+        self.assertEqual(best_ids(), {self.submission.id})
+        self.submission2.set_points(2,2)
+        self.submission2.save()
+        self.assertEqual(best_ids(), {self.submission2.id})
+
+        # Unofficial submissions count only without ready ones.
+        self.submission3.set_points(2,2)
+        self.submission3.status = Submission.STATUS.UNOFFICIAL
+        self.submission3.save()
+        submission4 = Submission.objects.create(exercise=self.exercise2)
+        submission4.submitters.add(self.student.userprofile)
+        submission4.set_points(1,2)
+        submission4.status = Submission.STATUS.UNOFFICIAL
+        submission4.save()
+        self.assertEqual(best_ids(), {self.submission2.id, self.submission3.id})
+        submission4.status = Submission.STATUS.READY
+        submission4.save()
+        self.assertEqual(best_ids(), {
+            self.submission2.id, self.submission3.id, submission4.id})
+        self.assertEqual(
+            Submission.objects.best(submitters=[self.user.userprofile.id]).count(), 1)
+        with patch("exercise.submission_models.has_window_functions", return_value=False):
+            self.assertEqual(
+                Submission.objects.best(submitters=[self.user.userprofile.id]).count(), 1)
+
+    def test_exercise_results(self):
+        def check():
+            c = CachedContent(self.instance)
+            stored = {
+                (r.profile_id, r.exercise_id): r
+                for r in ExerciseResult.objects.filter(course_instance=self.instance)
+            }
+            for user in (self.student, self.user):
+                p = CachedPoints(self.instance, user, c)
+                for exercise in (self.exercise, self.exercise2):
+                    entry,_,_,_ = p.find(exercise)
+                    result = stored.pop((user.userprofile.id, exercise.id), None)
+                    if not entry['submissions']:
+                        self.assertIsNone(result)
+                        continue
+                    self.assertEqual(result.best_submission_id, entry['best_submission'])
+                    self.assertEqual(result.points, entry['points'])
+                    self.assertEqual(result.passed, entry['passed'])
+                    self.assertEqual(result.unofficial, entry['unofficial'])
+                    self.assertEqual(result.submission_count, entry['submission_count'])
+            self.assertEqual(stored, {})
+
+        check()
+        self.submission2.set_points(2,2)
+        self.submission2.set_ready()
+        self.submission2.save()
+        check()
+        self.submission3.set_points(2,2)
+        self.submission3.status = Submission.STATUS.UNOFFICIAL
+        self.submission3.save()
+        check()
+        self.submission3.submitters.add(self.user.userprofile)
+        check()
+        self.user.userprofile.submissions.clear()
+        self.assertFalse(ExerciseResult.objects.filter(profile=self.user.userprofile).exists())
+        CachedPoints.invalidate(self.instance, self.user)
+        check()
+        self.exercise.points_to_pass = 100
+        self.exercise.save()
+        check()
+        self.submission2.delete()
+        CachedPoints.invalidate(self.instance, self.student)
+        check()
+
+        ExerciseResult.objects.all().delete()
+        ExerciseResult.objects.rebuild(BaseExercise.objects.all())
+        check()
+
+    def test_exercise_result_points_to_pass(self):
+        def passed():
+            return ExerciseResult.objects.get(exercise=self.exercise,
+                profile=self.student.userprofile).passed
+
+        self.assertEqual(self.submission.grade, 50)
+        self.assertTrue(passed())
+        self.exercise.points_to_pass = 60
+        self.exercise.save()
+        self.assertFalse(passed())
+        self.exercise.points_to_pass = 50
+        self.exercise.save()
+        self.assertTrue(passed())
+
     def test_unconfirmed(self):
         self.category2 = LearningObjectCategory.objects.create(
             course_instance=self.instance,
@@ -236,3 +372,36 @@ class CachedPointsTest(CourseTestCase):
         self.assertTrue(entry['graded'])
         self.assertFalse(entry['unofficial'])
         self.assertEqual(entry['points'], 50)
+
+
+class FragmentCacheTest(CourseTestCase):
+
+    def render(self, tag, is_course_staff=False):
+        request = RequestFactory().get('/')
+        request.user = self.student
+        return Template("{% load exercise %}{% " + tag + " %}").render(Context({
+            'request': request,
+            'instance': self.instance,
+            'is_course_staff': is_course_staff,
+        }))
+
+    def test_cached(self):
+        cache.clear()
+        for tag in ('user_toc', 'user_results', 'category_points'):
+            html = self.render(tag)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.render(tag), html)
+            self.assertEqual(len(queries), 0)
+
+    def test_invalidation(self):
+        html = self.render('user_results')
+        self.assertEqual(self.render('user_results'), html)
+        self.submission.set_points(2, 2)
+        self.submission.save()
+        changed = self.render('user_results')
+        self.assertNotEqual(changed, html)
+        self.assertNotEqual(self.render('user_toc', is_course_staff=True),
+            self.render('user_toc'))
+        self.module.opening_time = self.tomorrow
+        self.module.save()
+        self.assertNotEqual(self.render('user_results'), changed)
@@ -40,6 +40,9 @@ urlpatterns = [
     url(EXERCISE_URL_PREFIX + r'submissions/summary/$',
         staff_views.SubmissionsSummaryView.as_view(),
         name="submission-summary"),
+    url(EXERCISE_URL_PREFIX + r'submissions/files/$',
+        staff_views.SubmittedFilesArchiveView.as_view(),
+        name="submission-files"),
     url(EXERCISE_URL_PREFIX + r'submissions/create_and_assess/$',
         staff_views.CreateSubmissionView.as_view(),
         name="submission-create"),
@@ -67,6 +70,9 @@ urlpatterns = [
     url(EDIT_URL_PREFIX + r'participants/(?P<user_id>[\d]+)$',
         staff_views.UserResultsView.as_view(),
         name="user-results"),
+    url(EDIT_URL_PREFIX + r'submitted-files/(?P<module_slug>[\w\d\-\.]+)/$',
+        staff_views.ModuleSubmittedFilesArchiveView.as_view(),
+        name="module-submitted-files"),
     url(EDIT_URL_PREFIX + r'fetch-metadata/$',
         staff_views.FetchMetadataView.as_view(),
         name="exercise-metadata"),
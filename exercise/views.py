@@ -13,6 +13,7 @@ from authorization.permissions import ACCESS
 from course.models import CourseModule
 from course.viewbase import CourseInstanceBaseView
 from lib.remote_page import request_for_response
+from lib.sendfile import serve_file
 from lib.viewbase import BaseRedirectMixin, BaseView
 from .models import LearningObject, LearningObjectDisplay
 from .protocol.exercise_page import ExercisePage
@@ -85,7 +86,7 @@ class ExerciseView(BaseRedirectMixin, ExerciseBaseView):
             url_name=self.post_url_name)
 
         if self.profile:
-            LearningObjectDisplay.objects.create(learning_object=self.exercise, profile=self.profile)
+            LearningObjectDisplay.objects.add(self.exercise, self.profile)
 
         return super().get(request, *args, page=page, students=students, **kwargs)
 
@@ -239,19 +240,14 @@ class SubmittedFileView(SubmissionMixin, BaseView):
             raise Http404()
 
     def get(self, request, *args, **kwargs):
-        with open(self.file.file_object.path, "rb") as f:
-            bytedata = f.read()
+        path = self.file.file_object.path
 
         # Download the file.
         if request.GET.get("download", False):
-            response = HttpResponse(bytedata,
-                content_type="application/octet-stream")
-            response["Content-Disposition"] = 'attachment; filename="{}"'\
-                .format(self.file.filename)
-            return response
+            return serve_file(request, path, "application/octet-stream",
+                filename=self.file.filename)
 
         if self.file.is_passed():
-            return HttpResponse(bytedata, content_type=self.file.get_mime())
+            return serve_file(request, path, self.file.get_mime())
 
-        return HttpResponse(bytedata.decode('utf-8', 'ignore'),
-            content_type='text/plain; charset="UTF-8"')
+        return serve_file(request, path, 'text/plain; charset="UTF-8"')
@@ -27,7 +27,16 @@ class GraderAuthentication(BaseAuthentication):
 
         # Make sure that remote address matches service address
         service_url = user._exercise.service_url
-        ips = get_url_ip_address_list(service_url)
+        try:
+            ips = get_url_ip_address_list(service_url)
+        except OSError as e:
+            logger.error(
+                "Could not resolve exercise service URL: %s (%s)",
+                e,
+                service_url,
+                extra={'request': request},
+            )
+            raise AuthenticationFailed("Could not resolve service address.")
         ip = request.META["REMOTE_ADDR"]
         if ip not in ips:
             logger.error(
@@ -1,3 +1,11 @@
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
 class ListSerializerMixin(object):
     # FIXME: use rest_framework_extensions.mixins.DetailSerializerMixin
     def get_serializer_class(self):
@@ -16,3 +24,54 @@ class MeUserMixin(object):
         if value and self.me_user_value == value:
             kwargs[kw] = request.user.id if request.user.is_authenticated else None
         return super(MeUserMixin, self).dispatch(request, *args, **kwargs)
+
+
+class NotModified(Exception):
+    pass
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers GET requests with 304 Not Modified when the client already has
+    the current version of the response. Views return the versions that
+    the response depends on from get_etag_parts, or None when they have no
+    validator for the action. The parts are resolved after the permission
+    checks and before any serialization.
+    """
+
+    def get_etag_parts(self):
+        return None
+
+    def get_etag(self, request):
+        parts = self.get_etag_parts()
+        if parts is None:
+            return None
+        # The response varies by the user, the query and the format.
+        key = repr((
+            request.user.pk,
+            request.get_full_path(),
+            request.accepted_media_type,
+            parts,
+        ))
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        if request.method in ('GET', 'HEAD'):
+            self.etag = self.get_etag(request)
+            matches = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+            if self.etag and (self.etag in matches or '*' in matches):
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (200, 304):
+            response['ETag'] = quote_etag(self.etag)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from lib.pagination import keyset_page
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages the results newest first by a time field and the id when the
+    request has one of the GET parameters cursor (from the next link) and
+    limit. Without them the results are not paged.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    max_limit = 1000
+    field = 'submission_time'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if not (self.cursor_query_param in request.query_params
+                or self.limit_query_param in request.query_params):
+            return None
+        try:
+            limit = int(request.query_params.get(
+                self.limit_query_param, api_settings.PAGE_SIZE))
+            rows, self.cursor = keyset_page(
+                queryset,
+                request.query_params.get(self.cursor_query_param),
+                max(1, min(limit, self.max_limit)),
+                self.field,
+            )
+        except ValueError:
+            raise ParseError("Invalid cursor or limit.")
+        return rows
+
+    def get_next_link(self):
+        if self.cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+            self.cursor_query_param, self.cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
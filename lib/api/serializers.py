@@ -106,6 +106,42 @@ class AplusSerializerMeta(metaclass=AplusSerializerMetaMetaclass):
     pass
 
 
+def get_field_path(serializer):
+    """
+    Returns the field names from the root serializer to the serializer.
+    A serializer that is created separately for a field of another one
+    gets the path of that field in context['field_path'].
+    """
+    path = []
+    node = serializer
+    while node.parent is not None:
+        if node.field_name:
+            path.append(node.field_name)
+        node = node.parent
+    return tuple(serializer.context.get('field_path', ())) + tuple(reversed(path))
+
+
+def get_requested_fields(serializer, param='fields'):
+    """
+    Returns the names of the fields that the fields GET parameter requests
+    from the serializer, or None when all of them are requested. Nested
+    fields are requested with dotted names, e.g. fields=id,exercise.url,
+    and naming a nested serializer alone requests all of its fields.
+    """
+    request = serializer.context.get('request')
+    value = request.GET.get(param) if request is not None else None
+    if not value:
+        return None
+    path = get_field_path(serializer)
+    depth = len(path)
+    names = set()
+    for name in value.split(','):
+        parts = tuple(name.strip().split('.'))
+        if len(parts) > depth and parts[:depth] == path:
+            names.add(parts[depth])
+    return names or None
+
+
 class AplusModelSerializerBase(NestedHyperlinkedModelSerializer):
     url_field_name = 'url'
     html_url_field_name = 'html_url'
@@ -115,6 +151,11 @@ class AplusModelSerializerBase(NestedHyperlinkedModelSerializer):
         extra_kwargs = getattr(self.Meta, 'extra_kwargs', {})
         if self.url_field_name not in fields and self.url_field_name in extra_kwargs:
             fields.insert(0, self.url_field_name)
+        # Fields that are not requested are not even built, which saves
+        # the hyperlinks from being reversed for every object.
+        requested = get_requested_fields(self)
+        if requested is not None:
+            fields = [name for name in fields if name in requested]
         return fields
 
     def build_unknown_field(self, field_name, model_class):
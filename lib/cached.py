@@ -1,9 +1,15 @@
 from django.core.cache import cache
 import logging
+import time
+
+from lib import profiling
 
 
 logger = logging.getLogger("cached")
 
+# Marks that the cached data has not been read yet.
+NOT_FETCHED = object()
+
 
 class CachedAbstract(object):
     KEY_PREFIX = 'abstract'
@@ -21,15 +27,29 @@ class CachedAbstract(object):
         logger.debug("Invalidating cached data for {}".format(cache_key))
         cache.delete(cache_key)
 
-    def __init__(self, *models, modifiers=[]):
+    @classmethod
+    def get_many_data(cls, model_lists, modifiers=[]):
+        """
+        Reads the cached data for many combinations of models with a single
+        cache request. Returns the data, or None when missing, in order.
+        """
+        keys = [cls._key(*models, modifiers=modifiers) for models in model_lists]
+        found = cache.get_many(keys)
+        return [found.get(key) for key in keys]
+
+    def __init__(self, *models, modifiers=[], prefetched=NOT_FETCHED):
         cache_key = self.__class__._key(*models, modifiers=modifiers)
-        data = cache.get(cache_key)
+        data = cache.get(cache_key) if prefetched is NOT_FETCHED else prefetched
         if self._needs_generation(data):
             logger.debug("Generating cached data for {}".format(cache_key))
+            start = time.monotonic()
             self.dirty = False
             data = self._generate_data(*models, data=data)
             if not self.dirty:
                 cache.set(cache_key, data, None)
+            profiling.record_cache(False, time.monotonic() - start)
+        else:
+            profiling.record_cache(True)
         self.data = data
 
     def _needs_generation(self, data):
@@ -1,4 +1,7 @@
+import hashlib
 import logging
+import re
+import sys
 import traceback
 from django.conf import settings
 from django.core.mail import send_mail
@@ -7,33 +10,79 @@ from django.core.urlresolvers import reverse
 logger = logging.getLogger('lib.email_messages')
 
 
+def error_signature(message, exception=None):
+    """
+    Identifies repeating errors by the message without url query parameters
+    (tokens, submission ids) and the exception type.
+    """
+    key = re.sub(r'\?\S*', '', message)
+    if exception is not None:
+        key += "\n" + exception.__name__
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
 def email_course_error(request, exercise, message, exception=True):
     """
-    Sends error message to course teachers or technical support emails if set.
+    Queues error message to course teachers or technical support emails.
+    Repeating errors are collected and sent as a digest by the
+    send_error_digests management command.
     """
+    from exercise.models import LearningObjectErrorReport
     instance = exercise.course_instance
-    if instance.technical_error_emails:
-        recipients = instance.technical_error_emails.split(",")
-    else:
-        recipients = (p.user.email for p in instance.course.teachers.all() if p.user.email)
 
     error_trace = "-"
+    exception_type = None
     if exception:
         error_trace = traceback.format_exc()
+        exception_type = sys.exc_info()[0]
+
+    try:
+        LearningObjectErrorReport.objects.add(
+            exercise,
+            error_signature(message, exception_type),
+            message=message,
+            error_trace=error_trace,
+            request_fields=repr(request),
+            exercise_url=request.build_absolute_uri(
+                exercise.get_absolute_url()),
+            course_edit_url=request.build_absolute_uri(
+                instance.get_url('course-details')),
+        )
+    except Exception as e:
+        logger.exception('Failed to queue error email.')
+
+
+def email_course_error_digest(exercise, reports):
+    """
+    Sends collected error reports to course teachers or technical support
+    emails if set. Returns False if the reports should be sent again later.
+    """
+    instance = exercise.course_instance
+    if instance.technical_error_emails:
+        recipients = instance.technical_error_emails.split(",")
+    else:
+        recipients = [p.user.email for p in instance.course.teachers.all() if p.user.email]
+    if not recipients:
+        return True
 
     subject = settings.EXERCISE_ERROR_SUBJECT.format(
         course=instance.course.code,
         exercise=str(exercise))
-    body = settings.EXERCISE_ERROR_DESCRIPTION.format(
-        message=message,
-        exercise_url=request.build_absolute_uri(
-            exercise.get_absolute_url()),
-        course_edit_url=request.build_absolute_uri(
-            instance.get_url('course-details')),
-        error_trace=error_trace,
-        request_fields=repr(request))
-    if recipients:
-        try:
-            send_mail(subject, body, settings.SERVER_EMAIL, recipients, True)
-        except Exception as e:
-            logger.exception('Failed to send error emails.')
+    body = "\n\n".join(
+        settings.EXERCISE_ERROR_DESCRIPTION.format(
+            message="{}\n\nOccurred {:d} time(s) between {} and {}.".format(
+                report.message, report.count,
+                report.first_time, report.last_time),
+            exercise_url=report.exercise_url,
+            course_edit_url=report.course_edit_url,
+            error_trace=report.error_trace,
+            request_fields=report.request_fields)
+        for report in reports
+    )
+    try:
+        send_mail(subject, body, settings.SERVER_EMAIL, recipients,
+            fail_silently=False)
+    except Exception:
+        logger.exception('Failed to send error emails.')
+        return False
+    return True
@@ -1,8 +1,6 @@
-import socket
 import string
 import functools
 import warnings
-from cachetools import cached, TTLCache
 from collections import OrderedDict
 from urllib.parse import urlsplit, urlencode
 from PIL import Image
@@ -11,6 +9,8 @@ from django.utils.crypto import get_random_string as django_get_random_string
 from django.utils.deprecation import RemovedInNextVersionWarning
 from django.utils.translation import get_language
 
+from .resolver import HostResolver
+
 
 def deprecated(message):
     '''
@@ -115,18 +115,24 @@ def settings_text(key):
     return get('{}_{}'.format(key, get_language().upper())) or get(key)
 
 
-@cached(TTLCache(100, ttl=30))
+host_resolver = HostResolver(
+    ttl=settings.DNS_CACHE_TTL,
+    failure_ttl=settings.DNS_FAILURE_CACHE_TTL,
+    timeout=settings.DNS_RESOLVE_TIMEOUT,
+)
+
+
 def get_url_ip_address_list(url):
     """
     This function takes a full URL as a parameter and returns the IP addresses
-    of the host as a string.
+    of the host as a tuple. Raises OSError if the host can not be resolved.
 
-    It will cache results for 30 seconds, so repeated calls return fast
+    Results are cached and refreshed in the background, so only the first
+    call for a host waits for DNS (see lib.resolver).
     """
     hostname = urlsplit(url).hostname
     assert hostname, "Invalid url: no hostname found"
-    ips = (a[4][0] for a in socket.getaddrinfo(hostname, None, 0, socket.SOCK_STREAM, socket.IPPROTO_TCP))
-    return tuple(set(ips))
+    return host_resolver.resolve(hostname)
 
 
 def get_font_color_for_background(background_color):
@@ -10,8 +10,15 @@ The normal behavior can be restored by giving any request parameter value with t
 string "restore table" in it.
 """
 
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import HttpResponseServerError
 
+from lib import profiling
+
+
 class SqlInjectionMiddleware(object):
 
     def process_request(self, request):
@@ -26,3 +33,32 @@ class SqlInjectionMiddleware(object):
             return HttpResponseServerError("Traceback (most recent call last):\nFile \"egg.py\", line 1337, in aplus\nDatabaseIntegrityError: aHR0cDovL3hrY2QuY29tLzMyNy8= is not a valid base64 table identifier", content_type="text/plain")
 
         return None
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles a random PROFILING_SAMPLE_RATE share of the requests, see
+    lib.profiling. The middleware is left out when the rate is zero.
+    """
+
+    def __init__(self):
+        self.rate = settings.PROFILING_SAMPLE_RATE
+        if not self.rate:
+            raise MiddlewareNotUsed()
+
+    def process_request(self, request):
+        if random.random() < self.rate:
+            profiling.start()
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = profiling.current()
+        if profile is not None and request.resolver_match:
+            profile.view = request.resolver_match.view_name
+        return None
+
+    def process_response(self, request, response):
+        record = profiling.stop(response.status_code)
+        if record is not None:
+            profiling.save(record)
+        return response
@@ -0,0 +1,107 @@
+import os
+from email.utils import encode_rfc2231
+from uuid import uuid4
+
+
+def format_header_param(name, value):
+    """
+    Formats a Content-Disposition parameter like urllib3 (used by requests)
+    does: plain ascii values are quoted and others are encoded by RFC 2231.
+    """
+    if not any(c in value for c in '"\\\r\n'):
+        try:
+            value.encode('ascii')
+            return '{}="{}"'.format(name, value)
+        except UnicodeEncodeError:
+            pass
+    return '{}*={}'.format(name, encode_rfc2231(value, 'utf-8'))
+
+
+class MultipartStream(object):
+    """
+    A file-like multipart/form-data request body. The submitted files are
+    read from the disk in chunks while the request is sent, so only a
+    bounded buffer is held in memory. Accepts the data and files arguments
+    in the format of requests.post.
+
+    Usage:
+        body = MultipartStream(data, files)
+        requests.post(url, data=body,
+            headers={'Content-Type': body.content_type})
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, data=None, files=None, boundary=None):
+        self.boundary = boundary or uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+        self._parts = []
+        for key, values in (data or {}).items():
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            for value in values:
+                if value is None:
+                    continue
+                if not isinstance(value, bytes):
+                    value = str(value).encode('utf-8')
+                self._add_part(self._part_header(key), value)
+        for key, spec in (files or {}).items():
+            filename, fileobj = spec[0], spec[1]
+            content_type = spec[2] if len(spec) > 2 else None
+            self._add_part(
+                self._part_header(key, filename, content_type),
+                fileobj,
+            )
+        self._parts.append(
+            '--{}--\r\n'.format(self.boundary).encode('ascii')
+        )
+        self.len = sum(self._part_length(p) for p in self._parts)
+        self._index = 0
+
+    def _part_header(self, name, filename=None, content_type=None):
+        disposition = 'form-data; ' + format_header_param('name', name)
+        if filename is not None:
+            disposition += '; ' + format_header_param('filename', filename)
+        header = '--{}\r\nContent-Disposition: {}\r\n'.format(
+            self.boundary, disposition)
+        if content_type:
+            header += 'Content-Type: {}\r\n'.format(content_type)
+        return (header + '\r\n').encode('utf-8')
+
+    def _add_part(self, header, content):
+        if not isinstance(content, bytes):
+            content.seek(0)
+        self._parts.extend((header, content, b'\r\n'))
+
+    @staticmethod
+    def _part_length(part):
+        if isinstance(part, bytes):
+            return len(part)
+        return os.fstat(part.fileno()).st_size - part.tell()
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        """
+        Returns the next at most size bytes of the body. Without size only
+        the next chunk is returned to keep the memory use bounded.
+        """
+        if size is None or size < 0:
+            size = self.CHUNK_SIZE
+        chunks = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[:size]
+                rest = part[size:]
+                if rest:
+                    self._parts[self._index] = rest
+                else:
+                    self._index += 1
+            else:
+                chunk = part.read(size)
+                if len(chunk) < size:
+                    self._index += 1
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
@@ -0,0 +1,51 @@
+"""
+Keyset pagination over a time field and the id. A page continues after
+the last row of the previous one, so every page costs the same and new
+rows do not shift the pages.
+"""
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(time, row_id):
+    """
+    Encodes a time and a row id as an opaque cursor.
+    """
+    delta = time - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return "{:d}-{:d}".format(micros, row_id)
+
+
+def decode_cursor(cursor):
+    """
+    Returns the time and the row id of a cursor or raises ValueError for a
+    malformed cursor.
+    """
+    micros, row_id = (int(part) for part in cursor.split('-'))
+    if micros < 0 or row_id < 0:
+        raise ValueError("Negative cursor value.")
+    return EPOCH + datetime.timedelta(microseconds=micros), row_id
+
+
+def keyset_page(queryset, cursor=None, size=50, field='submission_time'):
+    """
+    Returns the rows after the cursor, newest first, and the cursor of the
+    next page or None on the last page. Raises ValueError for a malformed
+    cursor.
+    """
+    queryset = queryset.order_by('-' + field, '-id')
+    if cursor:
+        time, row_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{field + '__lt': time}) | Q(**{field: time, 'id__lt': row_id})
+        )
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(getattr(rows[-1], field), rows[-1].id)
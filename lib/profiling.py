@@ -0,0 +1,174 @@
+"""
+Sampled profiling of requests. A sampled request records its wall time,
+the number and time of its database queries, the hits, misses and
+generation time of the CachedAbstract caches and the time spent fetching
+remote pages. The record is logged as JSON to the aplus.profiling logger
+and added to per view totals in the cache, which superusers can read from
+the profiling report. Requests that are not sampled only draw one random
+number.
+"""
+import itertools
+import json
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+
+logger = logging.getLogger('aplus.profiling')
+
+VIEWS_KEY = 'profiling:views'
+VIEW_KEY = 'profiling:view:{}'
+NO_VIEW = '(unresolved)'
+
+# Summed over the sampled requests of a view.
+TOTALS = (
+    'wall_seconds',
+    'queries',
+    'query_seconds',
+    'cache_hits',
+    'cache_misses',
+    'cache_seconds',
+    'remote_fetches',
+    'remote_seconds',
+)
+
+_local = threading.local()
+
+
+class RequestProfile(object):
+
+    def __init__(self):
+        self.view = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_seconds = 0.0
+        self.remote_fetches = 0
+        self.remote_seconds = 0.0
+        # The debug cursor logs the queries with their times.
+        self._queries = {}
+        for connection in connections.all():
+            self._queries[connection.alias] = (
+                connection.force_debug_cursor,
+                len(connection.queries_log),
+            )
+            connection.force_debug_cursor = True
+        self._start = time.monotonic()
+
+    def finish(self, status=None):
+        """
+        Stops the profile and returns its record.
+        """
+        wall = time.monotonic() - self._start
+        queries = 0
+        query_seconds = 0.0
+        for connection in connections.all():
+            debug, first = self._queries.get(connection.alias, (False, None))
+            if first is None:
+                continue
+            connection.force_debug_cursor = debug
+            for query in itertools.islice(connection.queries_log, first, None):
+                queries += 1
+                query_seconds += float(query['time'])
+        return {
+            'view': self.view or NO_VIEW,
+            'status': status,
+            'wall_seconds': wall,
+            'queries': queries,
+            'query_seconds': query_seconds,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_seconds': self.cache_seconds,
+            'remote_fetches': self.remote_fetches,
+            'remote_seconds': self.remote_seconds,
+        }
+
+
+def start():
+    """
+    Starts profiling the request of the current thread.
+    """
+    stop()
+    _local.profile = RequestProfile()
+    return _local.profile
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def stop(status=None):
+    """
+    Stops profiling the current thread and returns the record, or None
+    when the thread was not profiled.
+    """
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    return profile.finish(status)
+
+
+def record_cache(hit, seconds=0.0):
+    profile = current()
+    if profile is not None:
+        if hit:
+            profile.cache_hits += 1
+        else:
+            profile.cache_misses += 1
+            profile.cache_seconds += seconds
+
+
+def record_remote(seconds):
+    profile = current()
+    if profile is not None:
+        profile.remote_fetches += 1
+        profile.remote_seconds += seconds
+
+
+def save(record):
+    """
+    Logs the record and adds it to the totals of its view. Concurrent
+    workers may overwrite each other's totals, so the report is a sample
+    of the sample.
+    """
+    logger.info(json.dumps(record, sort_keys=True))
+    view = record['view']
+    key = VIEW_KEY.format(view)
+    totals = cache.get(key) or dict.fromkeys(TOTALS + ('requests', 'max_wall_seconds'), 0)
+    totals['requests'] += 1
+    for field in TOTALS:
+        totals[field] += record[field]
+    totals['max_wall_seconds'] = max(totals['max_wall_seconds'], record['wall_seconds'])
+    cache.set(key, totals, None)
+    views = cache.get(VIEWS_KEY) or set()
+    if view not in views:
+        views.add(view)
+        cache.set(VIEWS_KEY, views, None)
+
+
+def report():
+    """
+    Returns the totals and the means per request of the profiled views,
+    the slowest views in total first.
+    """
+    views = cache.get(VIEWS_KEY) or ()
+    found = cache.get_many([VIEW_KEY.format(view) for view in views])
+    rows = []
+    for view in views:
+        totals = found.get(VIEW_KEY.format(view))
+        if not totals:
+            continue
+        row = dict(totals, view=view)
+        for field in TOTALS:
+            row['mean_' + field] = totals[field] / totals['requests']
+        rows.append(row)
+    rows.sort(key=lambda row: row['wall_seconds'], reverse=True)
+    return rows
+
+
+def reset():
+    views = cache.get(VIEWS_KEY) or ()
+    cache.delete_many([VIEW_KEY.format(view) for view in views] + [VIEWS_KEY])
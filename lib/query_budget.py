@@ -0,0 +1,151 @@
+"""
+Query budgets for views and APIs. A test case declares the routes and the
+number of database queries each may run as a function of the data size.
+The routes are requested on a base synthetic course and on variants of it
+that each grow one dimension of the data, with empty caches (cold) and
+again with the caches filled (warm). A route fails when it runs more
+queries than its budget allows on any course or when its query count grows
+from the base course faster than the budget of the grown dimension.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .testdata import generate_course
+
+
+def course_sizes(course):
+    """
+    Returns the sizes of a SyntheticCourse that the budgets refer to.
+    """
+    return {
+        'students': len(course.student_profile_ids),
+        'modules': len(course.modules),
+        'exercises': len(course.exercises),
+        'learning_objects': len(course.chapters) + len(course.exercises),
+        'submissions': course.submissions,
+    }
+
+
+class Budget(object):
+    """
+    At most `base` queries plus `per[size]` queries per item of the size,
+    for example Budget(10) is O(1) and Budget(10, students=1) grows by one
+    query per student. The sizes are those of course_sizes.
+    """
+
+    def __init__(self, base, **per):
+        self.base = base
+        self.per = per
+
+    def limit(self, sizes):
+        return self.base + sum(n * sizes[size] for size, n in self.per.items())
+
+    def growth(self, small, large):
+        return sum(n * (large[size] - small[size]) for size, n in self.per.items())
+
+    def __str__(self):
+        return " + ".join(["{:d}".format(self.base)] + [
+            "{} x {}".format(n, size) for size, n in sorted(self.per.items())
+        ])
+
+
+class Route(object):
+    """
+    A page requested as the role ('student', 'assistant', 'teacher' or
+    'superuser'). The url is a function of the SyntheticCourse. The cold
+    budget defaults to the warm one.
+    """
+
+    def __init__(self, name, role, url, warm, cold=None):
+        self.name = name
+        self.role = role
+        self.url = url
+        self.warm = warm
+        self.cold = cold or warm
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Checks the query budgets of the routes. The base course is generated
+    with these arguments of lib.testdata.generate_course and each variation
+    replaces some of them. Generating the content cache takes about three
+    queries per learning object, which the cold budgets allow.
+    """
+    routes = ()
+    base = dict(students=4, modules=2, chapters=1, exercises=2, groups=2,
+        deviations=2, notifications=2, tags=1, submissions=20)
+    variations = (
+        dict(students=12),
+        dict(submissions=200),
+        dict(modules=3, chapters=2, exercises=3),
+        dict(groups=6, deviations=6, notifications=6, tags=3),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create(username="budget-superuser",
+            is_staff=True, is_superuser=True)
+        cls.courses = [generate_course(url="budget-base", **cls.base)] + [
+            generate_course(url="budget-{:d}".format(i), **dict(cls.base, **variation))
+            for i, variation in enumerate(cls.variations, 1)
+        ]
+        cls.sizes = [course_sizes(course) for course in cls.courses]
+
+    def get_user(self, course, role):
+        if role == 'superuser':
+            return self.superuser
+        return getattr(course, role)
+
+    def before_capture(self):
+        """
+        Called before each captured request, for example to save the writes
+        that earlier requests buffered.
+        """
+        pass
+
+    def count_queries(self, route, course):
+        """
+        Returns the query counts of the route with empty and with filled
+        caches.
+        """
+        self.client.force_login(self.get_user(course, route.role),
+            backend='django.contrib.auth.backends.ModelBackend')
+        url = route.url(course)
+        cache.clear()
+        counts = []
+        for state in ('cold', 'warm'):
+            self.before_capture()
+            # The query log holds a limited number of queries.
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200,
+                "{} returned {:d}".format(url, response.status_code))
+            counts.append(len(queries))
+        return counts
+
+    def test_query_budgets(self):
+        failures = []
+        for route in self.routes:
+            counts = [self.count_queries(route, c) for c in self.courses]
+            for i, state, budget in ((0, 'cold', route.cold), (1, 'warm', route.warm)):
+                name = "{} ({})".format(route.name, state)
+                for sizes, n in zip(self.sizes, (c[i] for c in counts)):
+                    if n > budget.limit(sizes):
+                        failures.append("{}: {:d} queries, budget {} = {:g}".format(
+                            name, n, budget, budget.limit(sizes)))
+                n_base = counts[0][i]
+                for variation, sizes, n in zip(
+                        self.variations, self.sizes[1:], (c[i] for c in counts[1:])):
+                    if n - n_base > budget.growth(self.sizes[0], sizes):
+                        failures.append(
+                            "{}: {:d} queries grew to {:d} with more {}, "
+                            "budget {}".format(name, n_base, n,
+                                ", ".join(sorted(variation)), budget))
+        if failures:
+            self.fail("Query budgets exceeded:\n" + "\n".join(failures))
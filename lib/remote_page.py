@@ -9,6 +9,9 @@ from django.utils.http import parse_http_date_safe
 from django.utils.translation import ugettext_lazy as _
 from urllib.parse import urlparse, urljoin
 
+from . import profiling
+from .multipart import MultipartStream
+
 
 logger = logging.getLogger("aplus.remote_page")
 
@@ -30,18 +33,29 @@ def parse_expires(response):
 
 
 def request_for_response(url, post=False, data=None, files=None, stamp=None):
+    fetch_time = time.monotonic()
     try:
         last_retry = len(settings.EXERCISE_HTTP_RETRIES) - 1
         n = 0
         while n <= last_retry:
             try:
                 request_time = time.time()
-                if post:
+                if post and files:
+                    logger.info("POST %s", url)
+                    # Stream the files from the disk instead of building
+                    # the whole multipart body in memory.
+                    body = MultipartStream(data, files)
+                    response = requests.post(
+                        url,
+                        data=body,
+                        headers={'Content-Type': body.content_type},
+                        timeout=settings.EXERCISE_HTTP_TIMEOUT
+                    )
+                elif post:
                     logger.info("POST %s", url)
                     response = requests.post(
                         url,
                         data=data,
-                        files=files,
                         timeout=settings.EXERCISE_HTTP_TIMEOUT
                     )
                 else:
@@ -75,6 +89,8 @@ def request_for_response(url, post=False, data=None, files=None, stamp=None):
         assert False
     except requests.exceptions.RequestException:
         raise RemotePageException(_("Connecting to the course service failed!"))
+    finally:
+        profiling.record_remote(time.monotonic() - fetch_time)
 
 
 class RemotePage:
@@ -0,0 +1,144 @@
+"""
+A thread-safe host name resolver cache. Resolved addresses are served
+from the cache and refreshed in the background when they expire, so only
+the very first lookup of a host waits for DNS. Failed lookups are cached
+briefly, and a lookup waits for the resolver at most a timeout.
+"""
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+logger = logging.getLogger('aplus.resolver')
+
+
+class ResolverEntry(object):
+    __slots__ = ('ips', 'error', 'expires', 'pending')
+
+    def __init__(self):
+        self.ips = None
+        self.error = None
+        self.expires = 0
+        self.pending = None
+
+
+class HostResolver(object):
+
+    def __init__(self, ttl=30, failure_ttl=5, timeout=2, max_size=100, workers=4):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.timeout = timeout
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'failure_hits': 0,
+            'misses': 0,
+            'timeouts': 0,
+            'resolutions': 0,
+            'failures': 0,
+            'resolution_seconds': 0.0,
+            'max_resolution_seconds': 0.0,
+        }
+
+    def resolve(self, hostname):
+        """
+        Returns the IP addresses of the host as a tuple. Raises OSError when
+        the host can not be resolved or the resolver does not answer in
+        time.
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(hostname)
+            if entry is not None and entry.ips is not None:
+                if now < entry.expires:
+                    self._stats['hits'] += 1
+                else:
+                    self._stats['stale_hits'] += 1
+                    self._refresh(hostname, entry)
+                return entry.ips
+            if entry is not None and entry.error is not None and now < entry.expires:
+                self._stats['failure_hits'] += 1
+                raise entry.error
+            self._stats['misses'] += 1
+            if entry is None:
+                entry = self._add(hostname)
+            pending = self._refresh(hostname, entry)
+        try:
+            return pending.result(self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise socket.timeout("Resolving {} timed out.".format(hostname))
+
+    def stats(self):
+        """
+        Returns the counters of the cache and the resolutions. Superusers
+        see them in the profiling report.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        done = stats['resolutions'] + stats['failures']
+        stats['mean_resolution_seconds'] = (
+            stats['resolution_seconds'] / done if done else 0.0
+        )
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _add(self, hostname):
+        entry = ResolverEntry()
+        self._entries[hostname] = entry
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _refresh(self, hostname, entry):
+        # Called with the lock held. One resolution per host at a time.
+        if entry.pending is None:
+            entry.pending = self._executor.submit(self._resolve, hostname, entry)
+        return entry.pending
+
+    def _resolve(self, hostname, entry):
+        start = time.monotonic()
+        try:
+            ips = tuple(set(
+                a[4][0] for a in socket.getaddrinfo(
+                    hostname, None, 0, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+            ))
+            error = None
+        except OSError as e:
+            ips = None
+            error = e
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._stats['resolution_seconds'] += elapsed
+            self._stats['max_resolution_seconds'] = max(
+                self._stats['max_resolution_seconds'], elapsed)
+            entry.pending = None
+            if error is None:
+                self._stats['resolutions'] += 1
+                entry.ips = ips
+                entry.error = None
+                entry.expires = time.monotonic() + self.ttl
+            else:
+                self._stats['failures'] += 1
+                # Addresses that are already known are served until the
+                # resolver recovers, and the lookup is retried later.
+                entry.error = error
+                entry.expires = time.monotonic() + self.failure_ttl
+        logger.debug("Resolved %s in %.3f s: %s", hostname, elapsed, ips or error)
+        if error is not None:
+            if entry.ips is None:
+                raise error
+            logger.warning("Resolving %s failed, using the previous addresses: %s",
+                hostname, error)
+        return ips if ips is not None else entry.ips
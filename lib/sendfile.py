@@ -0,0 +1,105 @@
+import os
+import re
+from django.conf import settings
+from django.http.response import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, parse_etags
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat):
+    return "{:x}-{:x}".format(int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Parses a single byte range of the Range header. Returns (start, end)
+    where end is inclusive, None for a header that should be ignored and
+    False for a range that can not be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes, none of which an empty file has.
+        length = int(end)
+        if length == 0 or size == 0:
+            return False
+        return (max(size - length, 0), size - 1)
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return False
+    return (start, end)
+
+
+def read_range(path, start, length, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(block_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_file(request, path, content_type, filename=None):
+    """
+    Responds with the file without reading it into memory. Supports
+    conditional GET (ETag and Last-Modified) and single byte ranges. The
+    settings SENDFILE_MODE 'xsendfile' (Apache mod_xsendfile) or 'nginx'
+    (X-Accel-Redirect) delegate sending the file to the web server.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    response = get_conditional_response(request,
+        etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, path, stat, etag, content_type)
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if filename:
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
+
+
+def _file_response(request, path, stat, etag, content_type):
+    mode = getattr(settings, 'SENDFILE_MODE', None)
+    if mode == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+    if mode == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.SENDFILE_URL + \
+            os.path.relpath(path, settings.MEDIA_ROOT)
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method in ('GET', 'HEAD'):
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or etag in parse_etags(if_range):
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{:d}'.format(size)
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(path, start, end - start + 1),
+            status=206, content_type=content_type)
+        response['Content-Range'] = 'bytes {:d}-{:d}/{:d}'.format(start, end, size)
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        # Opened file allows the WSGI server to use its file wrapper.
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
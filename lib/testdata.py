@@ -1,19 +1,33 @@
+import random
 from datetime import timedelta
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.test import TestCase
 from django.utils import timezone
+from django.utils.crypto import get_random_string
 
 from course.models import (
     Course,
     CourseInstance,
     CourseModule,
+    Enrollment,
     LearningObjectCategory,
+    StudentGroup,
+    UserTag,
+    UserTagging,
 )
+from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
+from diploma.models import CourseDiplomaDesign
 from exercise.models import (
     BaseExercise,
+    CourseChapter,
+    ExerciseResult,
     StaticExercise,
     Submission,
 )
+from notification.models import Notification
+from userprofile.models import UserProfile
 
 
 class CourseTestCase(TestCase):
@@ -162,3 +176,204 @@ class CourseTestCase(TestCase):
         )
         self.submission3.submitters.add(self.student.userprofile)
         self.submission3.submitters.add(self.user.userprofile)
+
+
+SYNTHETIC_PASSWORD = 'synthetic'
+
+
+class SyntheticCourse(object):
+    """
+    The generated objects of a synthetic course. The students are the users
+    `{url}-s0` to `{url}-s{students-1}`, with the teacher `{url}-teacher`
+    and the assistant `{url}-assistant`, all with SYNTHETIC_PASSWORD.
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _bulk_ids(model, objects, key, batch=500):
+    """
+    Inserts the objects in bulk and returns their ids in order. The ids are
+    set by bulk_create on PostgreSQL and otherwise read back by the field
+    `key`, whose values must be unique among the rows of the model.
+    """
+    ids = []
+    for start in range(0, len(objects), batch):
+        chunk = objects[start:start + batch]
+        model.objects.bulk_create(chunk)
+        if all(obj.pk is not None for obj in chunk):
+            ids.extend(obj.pk for obj in chunk)
+        else:
+            values = [getattr(obj, key) for obj in chunk]
+            found = dict(model.objects.filter(**{key + '__in': values})\
+                .values_list(key, 'id'))
+            ids.extend(found[value] for value in values)
+    return ids
+
+
+def generate_course(url='synthetic', students=100, modules=5, chapters=2,
+        exercises=3, categories=2, groups=10, deviations=10, notifications=10,
+        tags=3, submissions=1000, seed=1):
+    """
+    Generates a course instance of the given size and returns it as a
+    SyntheticCourse. There are `chapters` chapters per module, each holding
+    `exercises` exercises in a nested sub chapter. Groups, deviations,
+    notifications, tags and submissions are given to random students, and
+    the exercise results are computed from the submissions.
+
+    Students and submissions are inserted in bulk without signals, so the
+    caches of earlier courses with the same ids must be cleared.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(SYNTHETIC_PASSWORD)
+
+    def user(username):
+        return User.objects.create(username=username, password=password,
+            email="{}@example.com".format(username))
+
+    with transaction.atomic():
+        course = Course.objects.create(name="Synthetic {}".format(url),
+            code=url.upper(), url=url)
+        teacher = user(url + "-teacher")
+        course.teachers.add(teacher.userprofile)
+        instance = CourseInstance.objects.create(course=course, url="i",
+            instance_name="Synthetic", starting_time=now - timedelta(days=30),
+            ending_time=now + timedelta(days=60))
+        assistant = user(url + "-assistant")
+        instance.assistants.add(assistant.userprofile)
+
+        category_objects = [
+            LearningObjectCategory.objects.create(course_instance=instance,
+                name="Category {:d}".format(i), points_to_pass=i * 10)
+            for i in range(categories)
+        ]
+        module_objects = []
+        chapter_objects = []
+        exercise_objects = []
+        for m in range(modules):
+            module = CourseModule.objects.create(course_instance=instance,
+                url="m{:d}".format(m), name="Module {:d}".format(m),
+                order=m + 1, points_to_pass=50,
+                opening_time=now - timedelta(days=30) + timedelta(days=7 * m),
+                closing_time=now + timedelta(days=7 * m))
+            module_objects.append(module)
+            for c in range(chapters):
+                chapter = CourseChapter.objects.create(course_module=module,
+                    category=category_objects[0], url="c{:d}".format(c),
+                    name="Chapter {:d}.{:d}".format(m, c), order=c + 1)
+                part = CourseChapter.objects.create(course_module=module,
+                    category=category_objects[0], parent=chapter, url="p",
+                    name="Part {:d}.{:d}".format(m, c), order=1)
+                chapter_objects.extend((chapter, part))
+                for e in range(exercises):
+                    exercise_objects.append(StaticExercise.objects.create(
+                        course_module=module,
+                        category=category_objects[e % categories],
+                        parent=part, url="e{:d}".format(e),
+                        name="Exercise {:d}.{:d}.{:d}".format(m, c, e),
+                        order=e + 1, max_points=100, points_to_pass=50,
+                        max_submissions=10,
+                        exercise_page_content="<p>Exercise {:d}</p>".format(e),
+                        submission_page_content="<p>Received</p>"))
+        exercise_ids = [e.id for e in exercise_objects]
+
+        user_ids = _bulk_ids(User, [
+            User(username="{}-s{:d}".format(url, i), password=password,
+                first_name="Student", last_name=str(i),
+                email="{}-s{:d}@example.com".format(url, i))
+            for i in range(students)
+        ], 'username')
+        profiles = _bulk_ids(UserProfile, [
+            UserProfile(user_id=u, student_id=str(100000 + i))
+            for i, u in enumerate(user_ids)
+        ], 'user_id')
+        Enrollment.objects.bulk_create([
+            Enrollment(course_instance=instance, user_profile_id=p)
+            for p in profiles
+        ])
+
+        group_ids = [
+            StudentGroup.objects.create(course_instance=instance).id
+            for i in range(groups)
+        ]
+        members = StudentGroup.members.through
+        members.objects.bulk_create([
+            members(studentgroup_id=g, userprofile_id=p)
+            for g in group_ids
+            for p in rng.sample(profiles, min(len(profiles), rng.randint(2, 3)))
+        ])
+
+        tag_objects = [
+            UserTag.objects.create(course_instance=instance,
+                name="Tag {:d}".format(i), visible_to_students=i % 2 == 0)
+            for i in range(tags)
+        ]
+        UserTagging.objects.bulk_create([
+            UserTagging(tag=tag, user_id=p, course_instance=instance)
+            for i, tag in enumerate(tag_objects)
+            for p in profiles if rng.random() < 1 / (i + 2)
+        ])
+
+        pairs = set()
+        while len(pairs) < min(deviations, len(profiles) * len(exercise_ids)):
+            pairs.add((rng.choice(exercise_ids), rng.choice(profiles)))
+        pairs = sorted(pairs)
+        DeadlineRuleDeviation.objects.bulk_create([
+            DeadlineRuleDeviation(exercise_id=e, submitter_id=p, extra_minutes=60)
+            for e, p in pairs[::2]
+        ])
+        MaxSubmissionsRuleDeviation.objects.bulk_create([
+            MaxSubmissionsRuleDeviation(exercise_id=e, submitter_id=p, extra_submissions=5)
+            for e, p in pairs[1::2]
+        ])
+
+        Notification.objects.bulk_create([
+            Notification(course_instance=instance, sender=teacher.userprofile,
+                recipient_id=rng.choice(profiles),
+                subject="Notification {:d}".format(i),
+                notification="<p>Synthetic</p>", seen=rng.random() < 0.5)
+            for i in range(notifications)
+        ])
+
+        submitters = Submission.submitters.through
+        batch = 10000
+        for start in range(0, submissions, batch):
+            size = min(batch, submissions - start)
+            submission_ids = _bulk_ids(Submission, [
+                Submission(exercise_id=rng.choice(exercise_ids), status='ready',
+                    grade=rng.randint(0, 100), grading_time=now,
+                    service_points=rng.randint(0, 10), service_max_points=10,
+                    submission_data=[["answer", str(rng.random())]],
+                    hash=get_random_string(32))
+                for i in range(size)
+            ], 'hash')
+            submitters.objects.bulk_create([
+                submitters(submission_id=s, userprofile_id=rng.choice(profiles))
+                for s in submission_ids
+            ])
+        ExerciseResult.objects.rebuild(
+            BaseExercise.objects.filter(id__in=exercise_ids).order_by('id'))
+
+        max_points = 100 * len(exercise_objects)
+        diploma = CourseDiplomaDesign.objects.create(course=instance,
+            title="Synthetic", date="2017",
+            point_limits=[max_points * k // 10 for k in range(5, 10)])
+
+    return SyntheticCourse(
+        url=url,
+        course=course,
+        instance=instance,
+        teacher=teacher,
+        assistant=assistant,
+        categories=category_objects,
+        modules=module_objects,
+        chapters=chapter_objects,
+        exercises=exercise_objects,
+        tags=tag_objects,
+        diploma=diploma,
+        student=User.objects.get(id=user_ids[0]) if user_ids else None,
+        student_profile_ids=profiles,
+        submissions=submissions,
+    )
@@ -0,0 +1,191 @@
+import socket
+import threading
+from tempfile import TemporaryFile
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, TestCase
+from requests import Request
+
+from lib.multipart import MultipartStream
+from lib.resolver import HostResolver
+from lib.sendfile import parse_range
+from lib.testdata import generate_course
+
+
+class MultipartStreamTest(SimpleTestCase):
+
+    def setUp(self):
+        self.file = TemporaryFile()
+        self.file.write(b'0123456789' * 10000)
+        self.file.seek(0)
+        self.data = {'key': ['value', 'Hyyppö'], 'other': ['1']}
+        self.files = {'file1': ('test.py', self.file)}
+
+    def tearDown(self):
+        self.file.close()
+
+    def read_all(self, body, size):
+        chunks = []
+        while True:
+            chunk = body.read(size)
+            if not chunk:
+                return b''.join(chunks)
+            self.assertLessEqual(len(chunk), size)
+            chunks.append(chunk)
+
+    def test_body_equals_requests_encoding(self):
+        request = Request('POST', 'http://localhost/',
+            data=self.data, files=self.files).prepare()
+        boundary = request.headers['Content-Type'].split('boundary=')[1]
+        body = MultipartStream(self.data, self.files, boundary=boundary)
+        self.assertEqual(body.content_type, request.headers['Content-Type'])
+        content = self.read_all(body, 8192)
+        self.assertEqual(len(content), len(body))
+        self.assertEqual(content, request.body)
+
+    def test_body_is_rewound(self):
+        body = MultipartStream(self.data, self.files, boundary='b')
+        first = self.read_all(body, 1000)
+        body = MultipartStream(self.data, self.files, boundary='b')
+        self.assertEqual(self.read_all(body, 333), first)
+
+
+class ParseRangeTest(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+        self.assertFalse(parse_range("bytes=100-", 100))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+        self.assertIsNone(parse_range("lines=1-2", 100))
+        self.assertFalse(parse_range("bytes=-10", 0))
+        self.assertFalse(parse_range("bytes=0-", 0))
+
+
+class HostResolverTest(SimpleTestCase):
+
+    def setUp(self):
+        self.answers = []
+        self.calls = 0
+        patcher = patch('lib.resolver.socket.getaddrinfo', self.getaddrinfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def getaddrinfo(self, host, *args):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, threading.Event):
+            answer.wait(5)
+            answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return [(0, 0, 0, '', (answer, 0))]
+
+    def wait_refresh(self, resolver, host):
+        pending = resolver._entries[host].pending
+        if pending is not None:
+            pending.exception(5)
+
+    def test_cached(self):
+        resolver = HostResolver(ttl=30)
+        self.answers = ['10.0.0.1']
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.1',))
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.1',))
+        self.assertEqual(self.calls, 1)
+        stats = resolver.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (1, 1))
+        self.assertEqual(stats['resolutions'], 1)
+
+    def test_stale_while_revalidate(self):
+        resolver = HostResolver(ttl=0)
+        slow = threading.Event()
+        self.answers = ['10.0.0.1', slow, '10.0.0.2']
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.1',))
+        # The expired address is served while the refresh waits for DNS.
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.1',))
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.1',))
+        slow.set()
+        self.wait_refresh(resolver, 'a.test')
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.2',))
+        self.assertEqual(resolver.stats()['stale_hits'], 3)
+
+    def test_failures(self):
+        resolver = HostResolver(ttl=0, failure_ttl=30)
+        self.answers = [socket.gaierror('fail')]
+        with self.assertRaises(OSError):
+            resolver.resolve('a.test')
+        with self.assertRaises(OSError):
+            resolver.resolve('a.test')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(resolver.stats()['failure_hits'], 1)
+
+        # Known addresses survive a failing refresh.
+        self.answers = ['10.0.0.1', socket.gaierror('fail')]
+        self.assertEqual(resolver.resolve('b.test'), ('10.0.0.1',))
+        resolver.resolve('b.test')
+        self.wait_refresh(resolver, 'b.test')
+        self.assertEqual(resolver.resolve('b.test'), ('10.0.0.1',))
+        self.assertEqual(self.calls, 3)
+
+    def test_timeout(self):
+        resolver = HostResolver(timeout=0.01)
+        slow = threading.Event()
+        self.answers = [slow, '10.0.0.1']
+        with self.assertRaises(socket.timeout):
+            resolver.resolve('a.test')
+        slow.set()
+        self.wait_refresh(resolver, 'a.test')
+        self.assertEqual(resolver.resolve('a.test'), ('10.0.0.1',))
+        self.assertEqual(resolver.stats()['timeouts'], 1)
+
+
+class SyntheticCourseTest(TestCase):
+
+    def test_generate_course(self):
+        from course.models import UserTagging
+        from exercise.models import ExerciseResult, Submission
+        course = generate_course(students=20, modules=2, chapters=2,
+            exercises=3, groups=4, deviations=6, notifications=5, tags=2,
+            submissions=300)
+        instance = course.instance
+        self.assertEqual(instance.students.count(), 20)
+        self.assertEqual(len(course.exercises), 12)
+        self.assertEqual(course.exercises[0].parent.parent, course.chapters[0])
+        self.assertEqual(instance.groups.count(), 4)
+        self.assertTrue(UserTagging.objects.filter(course_instance=instance).exists())
+        submissions = Submission.objects.filter(
+            exercise__course_module__course_instance=instance)
+        self.assertEqual(submissions.count(), 300)
+        self.assertEqual(submissions.filter(submitters=None).count(), 0)
+        self.assertEqual(
+            ExerciseResult.objects.filter(course_instance=instance).count(),
+            submissions.values('exercise', 'submitters').distinct().count())
+        self.assertTrue(instance.is_teacher(course.teacher))
+        self.assertTrue(instance.is_student(course.student))
+
+    def test_generate_course_after_deletes(self):
+        # SQLite and PostgreSQL do not reuse the ids of deleted rows, so the
+        # ids of the students do not follow the largest id before them.
+        def delete_next(sender, instance, created, **kwargs):
+            if created and instance.username.endswith("-assistant"):
+                User.objects.create(username="deleted").delete()
+        post_save.connect(delete_next, sender=User)
+        try:
+            course = generate_course(students=5, modules=1, chapters=1,
+                exercises=2, groups=2, submissions=20)
+        finally:
+            post_save.disconnect(delete_next, sender=User)
+        instance = course.instance
+        self.assertEqual(
+            sorted(course.student_profile_ids),
+            sorted(instance.students.values_list('id', flat=True)))
+        self.assertEqual(
+            [p.user.username for p in instance.students.order_by('id')],
+            ["synthetic-s{:d}".format(i) for i in range(5)])
+        self.assertEqual(instance.groups.count(), 2)
+        self.assertEqual(sum(
+            e.submissions.filter(submitters__in=course.student_profile_ids).count()
+            for e in course.exercises), 20)
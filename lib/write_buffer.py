@@ -0,0 +1,85 @@
+"""
+Write-behind buffering of model instances that are only ever inserted.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.db import DatabaseError, transaction
+
+
+logger = logging.getLogger('aplus.write_buffer')
+
+
+class WriteBuffer(object):
+    """
+    Collects unsaved instances of a model and saves them with one
+    bulk_create when `size` instances are waiting or the oldest of them has
+    waited `seconds`. The limits may also be functions that return them, for
+    example to read the settings at use time. The age is checked when an
+    instance is added and by flush_due, which the owner calls for example
+    when a request finishes, so that an idle process does not hold the
+    instances. The buffer is also flushed when the process exits, so a
+    crashing process loses at most the instances of one such window.
+    """
+
+    def __init__(self, model, size=100, seconds=10):
+        self.model = model
+        self._size = size
+        self._seconds = seconds
+        self._lock = threading.Lock()
+        self._objects = []
+        self._oldest = None
+        atexit.register(self.flush)
+
+    @property
+    def size(self):
+        return self._size() if callable(self._size) else self._size
+
+    @property
+    def seconds(self):
+        return self._seconds() if callable(self._seconds) else self._seconds
+
+    def add(self, obj):
+        with self._lock:
+            if not self._objects:
+                self._oldest = time.monotonic()
+            self._objects.append(obj)
+            due = (
+                len(self._objects) >= self.size
+                or time.monotonic() - self._oldest >= self.seconds
+            )
+        if due:
+            self.flush()
+
+    def flush_due(self):
+        """
+        Saves the waiting instances if the oldest of them has waited
+        `seconds`. Returns their number.
+        """
+        with self._lock:
+            due = (
+                bool(self._objects)
+                and time.monotonic() - self._oldest >= self.seconds
+            )
+        return self.flush() if due else 0
+
+    def flush(self):
+        """
+        Saves the waiting instances and returns their number.
+        """
+        with self._lock:
+            objects, self._objects = self._objects, []
+        if objects:
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create(objects)
+            except DatabaseError:
+                logger.exception("Failed to save %d buffered %s rows.",
+                    len(objects), self.model.__name__)
+        return len(objects)
+
+    def pending(self):
+        with self._lock:
+            return list(self._objects)
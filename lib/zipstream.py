@@ -0,0 +1,69 @@
+import os
+import time
+import zipfile
+
+
+class _WriteBuffer(object):
+    """
+    Unseekable file-like target for ZipFile that collects the written bytes
+    until they are popped. ZipFile uses data descriptors for unseekable
+    targets so that no entry has to be rewritten afterwards.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _zip_info(name, timestamp, compression):
+    info = zipfile.ZipInfo(name, time.localtime(max(timestamp, 315532800))[:6])
+    info.compress_type = compression
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def zip_stream(entries, compression=zipfile.ZIP_DEFLATED, chunk_size=64 * 1024):
+    """
+    Generates a ZIP archive in chunks. The entries are pairs of an archive
+    name and either a path of a file on the disk or the content as bytes.
+    Files are read in chunks so the memory use does not depend on the
+    sizes of the files. The entries may be a generator.
+    """
+    buffer = _WriteBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, source in entries:
+            if isinstance(source, bytes):
+                archive.writestr(_zip_info(name, time.time(), compression), source)
+            else:
+                stat = os.stat(source)
+                info = _zip_info(name, stat.st_mtime, compression)
+                # Known size lets zipfile decide on the zip64 extensions.
+                info.file_size = stat.st_size
+                with open(source, 'rb') as src, archive.open(info, 'w') as dest:
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = buffer.pop()
+                        if data:
+                            yield data
+            data = buffer.pop()
+            if data:
+                yield data
+    yield buffer.pop()
@@ -1,7 +1,7 @@
 from django.test import TestCase
 from course.models import Course, CourseInstance, CourseModule,\
     LearningObjectCategory
-from exercise.exercise_models import StaticExercise
+from exercise.exercise_models import StaticExercise, display_buffer
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
@@ -10,6 +10,7 @@ from datetime import timedelta
 class RedirectTest(TestCase):
 
     def setUp(self):
+        self.addCleanup(display_buffer.flush)
         self.user = User(username="testUser")
         self.user.set_password("testPassword")
         self.user.save()